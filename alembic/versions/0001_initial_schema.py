@@ -0,0 +1,109 @@
+"""Initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 12:00:00.000000
+
+Схема справочника в том виде, в каком её создавали прежние версии приложения
+(Base.metadata.create_all при старте): здания, виды деятельности, организации
+и таблицы связей. Всё остальное добавляют следующие миграции, поэтому база,
+созданная прежней версией, обновляется обычным alembic upgrade main@head: уже
+существующие таблицы миграция не создаёт повторно.
+
+Ревизия начинает основную ветку миграций main; секционирование - отдельная
+необязательная ветка geo_partitioning (0011).
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from geoalchemy2 import Geography
+
+
+revision = '0001'
+down_revision = None
+branch_labels = ('main',)
+depends_on = None
+
+
+BASELINE_TABLES = (
+    'buildings', 'activities', 'organizations', 'organization_phones', 'organization_activities'
+)
+
+
+def _existing_tables() -> set:
+    """Таблицы, уже созданные прежними версиями приложения (Base.metadata.create_all при старте)"""
+    if op.get_context().as_sql:
+        return set()
+    inspector = sa.inspect(op.get_bind())
+    return {table for table in BASELINE_TABLES if inspector.has_table(table)}
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS postgis")
+    existing = _existing_tables()
+
+    if 'buildings' not in existing:
+        op.create_table(
+            'buildings',
+            sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+            sa.Column('address', sa.String(length=500), nullable=False),
+            sa.Column('latitude', sa.String(length=20), nullable=False),
+            sa.Column('longitude', sa.String(length=20), nullable=False),
+            sa.Column(
+                'coordinates',
+                Geography(geometry_type='POINT', srid=4326, spatial_index=False),
+                nullable=False
+            ),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('address'),
+        )
+        op.create_index('idx_buildings_coordinates', 'buildings', ['coordinates'], postgresql_using='gist')
+
+    if 'activities' not in existing:
+        op.create_table(
+            'activities',
+            sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+            sa.Column('name', sa.String(length=200), nullable=False),
+            sa.Column('parent_id', postgresql.UUID(as_uuid=True), nullable=True),
+            sa.Column('level', sa.Integer(), nullable=False),
+            sa.CheckConstraint('level <= 3', name='max_level_check'),
+            sa.ForeignKeyConstraint(['parent_id'], ['activities.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+
+    if 'organizations' not in existing:
+        op.create_table(
+            'organizations',
+            sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+            sa.Column('name', sa.String(length=300), nullable=False),
+            sa.Column('building_id', postgresql.UUID(as_uuid=True), nullable=False),
+            sa.ForeignKeyConstraint(['building_id'], ['buildings.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+
+    if 'organization_phones' not in existing:
+        op.create_table(
+            'organization_phones',
+            sa.Column('organization_id', postgresql.UUID(as_uuid=True), nullable=False),
+            sa.Column('phone', sa.String(length=20), nullable=False),
+            sa.ForeignKeyConstraint(['organization_id'], ['organizations.id']),
+            sa.PrimaryKeyConstraint('organization_id', 'phone'),
+        )
+
+    if 'organization_activities' not in existing:
+        op.create_table(
+            'organization_activities',
+            sa.Column('organization_id', postgresql.UUID(as_uuid=True), nullable=False),
+            sa.Column('activity_id', postgresql.UUID(as_uuid=True), nullable=False),
+            sa.ForeignKeyConstraint(['activity_id'], ['activities.id']),
+            sa.ForeignKeyConstraint(['organization_id'], ['organizations.id']),
+            sa.PrimaryKeyConstraint('organization_id', 'activity_id'),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('organization_activities')
+    op.drop_table('organization_phones')
+    op.drop_table('organizations')
+    op.drop_table('activities')
+    op.drop_table('buildings')
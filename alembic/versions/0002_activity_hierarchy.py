@@ -0,0 +1,150 @@
+"""Activity hierarchy maintained by the database
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 12:30:00.000000
+
+Материализованный путь видов деятельности (activities.path - ID предков через "/"),
+уровень и путь вычисляются триггером activities_hierarchy по parent_id, он же
+запрещает циклы и превышение глубины (settings.max_activity_levels). Существующие
+строки заполняются одним рекурсивным UPDATE; если в данных есть цикл или дерево
+глубже допустимого, миграция прерывается с описанием проблемы.
+
+Миграции - единственный источник функций и триггеров схемы: их изменения
+оформляются новыми миграциями.
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.config import settings
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+ACTIVITIES_HIERARCHY_SQL = """
+CREATE OR REPLACE FUNCTION activities_maintain_hierarchy() RETURNS trigger AS $$
+DECLARE
+    max_levels integer := TG_ARGV[0]::integer;
+    parent_level integer;
+    parent_path text;
+BEGIN
+    IF NEW.parent_id IS NULL THEN
+        NEW.level := 1;
+        NEW.path := NEW.id::text;
+    ELSE
+        SELECT level, path INTO parent_level, parent_path FROM activities WHERE id = NEW.parent_id;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Родительский вид деятельности % не найден', NEW.parent_id
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+        IF NEW.id = NEW.parent_id OR position(NEW.id::text IN parent_path) > 0 THEN
+            RAISE EXCEPTION 'Перемещение образует цикл в дереве видов деятельности'
+                USING ERRCODE = 'check_violation';
+        END IF;
+        NEW.level := parent_level + 1;
+        NEW.path := parent_path || '/' || NEW.id::text;
+    END IF;
+
+    IF NEW.level > max_levels THEN
+        RAISE EXCEPTION 'Превышена максимальная глубина дерева видов деятельности (%)', max_levels
+            USING ERRCODE = 'check_violation';
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION activities_propagate_hierarchy() RETURNS trigger AS $$
+DECLARE
+    max_levels integer := TG_ARGV[0]::integer;
+BEGIN
+    IF NEW.path IS DISTINCT FROM OLD.path THEN
+        UPDATE activities
+        SET path = NEW.path || substr(path, length(OLD.path) + 1),
+            level = level + (NEW.level - OLD.level)
+        WHERE path LIKE OLD.path || '/%';
+
+        IF EXISTS (SELECT 1 FROM activities WHERE path LIKE NEW.path || '/%' AND level > max_levels) THEN
+            RAISE EXCEPTION 'Превышена максимальная глубина дерева видов деятельности (%)', max_levels
+                USING ERRCODE = 'check_violation';
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER activities_hierarchy
+    BEFORE INSERT OR UPDATE OF parent_id ON activities
+    FOR EACH ROW EXECUTE FUNCTION activities_maintain_hierarchy({max_levels});
+
+CREATE TRIGGER activities_hierarchy_propagate
+    AFTER UPDATE OF parent_id ON activities
+    FOR EACH ROW EXECUTE FUNCTION activities_propagate_hierarchy({max_levels});
+"""
+
+# Уровень и путь от корней вниз; строки в циклах не достижимы от корней и остаются без пути
+BACKFILL_SQL = """
+WITH RECURSIVE tree AS (
+    SELECT id, 1 AS level, id::text AS path
+    FROM activities
+    WHERE parent_id IS NULL
+    UNION ALL
+    SELECT activities.id, tree.level + 1, tree.path || '/' || activities.id::text
+    FROM activities
+    JOIN tree ON activities.parent_id = tree.id
+)
+UPDATE activities SET level = tree.level, path = tree.path
+FROM tree
+WHERE activities.id = tree.id
+"""
+
+
+def _check_backfill() -> None:
+    """Понятная ошибка вместо нарушения NOT NULL/CHECK, если данные не образуют допустимое дерево"""
+    bind = op.get_bind()
+    in_cycles = bind.exec_driver_sql("SELECT count(*) FROM activities WHERE path IS NULL").scalar()
+    if in_cycles:
+        raise RuntimeError(
+            f"Виды деятельности образуют цикл ({in_cycles} записей не достижимы от корней): "
+            "исправьте parent_id и повторите миграцию"
+        )
+    max_level = bind.exec_driver_sql("SELECT coalesce(max(level), 0) FROM activities").scalar()
+    if max_level > settings.max_activity_levels:
+        raise RuntimeError(
+            f"Глубина дерева видов деятельности ({max_level}) больше MAX_ACTIVITY_LEVELS "
+            f"({settings.max_activity_levels}): исправьте данные или настройку и повторите миграцию"
+        )
+
+
+def upgrade() -> None:
+    op.add_column('activities', sa.Column('path', sa.Text(), nullable=True))
+    op.execute(BACKFILL_SQL)
+    if not op.get_context().as_sql:
+        _check_backfill()
+
+    op.alter_column('activities', 'path', nullable=False)
+    op.drop_constraint('max_level_check', 'activities', type_='check')
+    op.create_check_constraint(
+        'max_level_check', 'activities', f'level BETWEEN 1 AND {settings.max_activity_levels}'
+    )
+    op.create_index(
+        'ix_activities_path', 'activities', ['path'], postgresql_ops={'path': 'text_pattern_ops'}
+    )
+    op.create_index('ix_activities_parent_id', 'activities', ['parent_id'])
+    op.execute(ACTIVITIES_HIERARCHY_SQL.replace("{max_levels}", str(settings.max_activity_levels)))
+
+
+def downgrade() -> None:
+    op.execute("""
+        DROP TRIGGER IF EXISTS activities_hierarchy_propagate ON activities;
+        DROP TRIGGER IF EXISTS activities_hierarchy ON activities;
+        DROP FUNCTION IF EXISTS activities_propagate_hierarchy();
+        DROP FUNCTION IF EXISTS activities_maintain_hierarchy();
+    """)
+    op.drop_index('ix_activities_parent_id', table_name='activities')
+    op.drop_index('ix_activities_path', table_name='activities')
+    op.drop_constraint('max_level_check', 'activities', type_='check')
+    op.create_check_constraint('max_level_check', 'activities', 'level <= 3')
+    op.drop_column('activities', 'path')
@@ -0,0 +1,122 @@
+"""Change tracking for the incremental sync feed
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 12:40:00.000000
+
+Последовательность change_seq, колонки updated_at и change_seq организаций, зданий
+и видов деятельности, таблица deleted_records и триггеры, которые их заполняют
+(лента изменений GET /api/changes). Изменение телефонов и видов деятельности
+организации обновляет саму организацию.
+
+Существующие строки получают номера изменений по порядку одним UPDATE на таблицу:
+клиенты без токена синхронизации получают их в первой выборке ленты.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+CHANGE_TRACKING_FUNCTIONS_SQL = """
+CREATE OR REPLACE FUNCTION track_change() RETURNS trigger AS $$
+BEGIN
+    NEW.change_seq := nextval('change_seq');
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION track_delete() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO deleted_records (change_seq, entity_type, entity_id)
+    VALUES (nextval('change_seq'), TG_TABLE_NAME, OLD.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION touch_organizations_from_links() RETURNS trigger AS $$
+BEGIN
+    UPDATE organizations SET updated_at = now()
+    WHERE id IN (SELECT organization_id FROM changed_links);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+TRACKED_TABLES = ("organizations", "buildings", "activities")
+LINK_TABLES = ("organization_phones", "organization_activities")
+
+
+def upgrade() -> None:
+    op.execute(sa.schema.CreateSequence(sa.Sequence('change_seq')))
+
+    for table in TRACKED_TABLES:
+        op.add_column(table, sa.Column(
+            'updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False
+        ))
+        op.add_column(table, sa.Column('change_seq', sa.BigInteger(), nullable=True))
+        op.execute(f"UPDATE {table} SET change_seq = nextval('change_seq')")
+        op.alter_column(table, 'change_seq', nullable=False)
+        op.create_index(f'ix_{table}_change_seq', table, ['change_seq'])
+
+    op.create_table(
+        'deleted_records',
+        sa.Column('change_seq', sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column('entity_type', sa.String(length=20), nullable=False),
+        sa.Column('entity_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('change_seq'),
+    )
+
+    op.execute(CHANGE_TRACKING_FUNCTIONS_SQL)
+    for table in TRACKED_TABLES:
+        op.execute(f"""
+            CREATE TRIGGER {table}_track_change
+                BEFORE INSERT OR UPDATE ON {table}
+                FOR EACH ROW EXECUTE FUNCTION track_change();
+
+            CREATE TRIGGER {table}_track_delete
+                AFTER DELETE ON {table}
+                FOR EACH ROW EXECUTE FUNCTION track_delete();
+        """)
+    for table in LINK_TABLES:
+        op.execute(f"""
+            CREATE TRIGGER {table}_touch_insert
+                AFTER INSERT ON {table}
+                REFERENCING NEW TABLE AS changed_links
+                FOR EACH STATEMENT EXECUTE FUNCTION touch_organizations_from_links();
+
+            CREATE TRIGGER {table}_touch_delete
+                AFTER DELETE ON {table}
+                REFERENCING OLD TABLE AS changed_links
+                FOR EACH STATEMENT EXECUTE FUNCTION touch_organizations_from_links();
+        """)
+
+
+def downgrade() -> None:
+    for table in LINK_TABLES:
+        op.execute(f"""
+            DROP TRIGGER IF EXISTS {table}_touch_delete ON {table};
+            DROP TRIGGER IF EXISTS {table}_touch_insert ON {table};
+        """)
+    for table in TRACKED_TABLES:
+        op.execute(f"""
+            DROP TRIGGER IF EXISTS {table}_track_delete ON {table};
+            DROP TRIGGER IF EXISTS {table}_track_change ON {table};
+        """)
+        op.drop_index(f'ix_{table}_change_seq', table_name=table)
+        op.drop_column(table, 'change_seq')
+        op.drop_column(table, 'updated_at')
+    op.execute("""
+        DROP FUNCTION IF EXISTS touch_organizations_from_links();
+        DROP FUNCTION IF EXISTS track_delete();
+        DROP FUNCTION IF EXISTS track_change();
+    """)
+    op.drop_table('deleted_records')
+    op.execute(sa.schema.DropSequence(sa.Sequence('change_seq')))
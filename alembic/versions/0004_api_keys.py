@@ -0,0 +1,36 @@
+"""API keys
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 12:50:00.000000
+
+Таблица api_keys: клиенты, хэши их ключей и индивидуальные лимиты запросов.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'api_keys',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('name', sa.String(length=200), nullable=False),
+        sa.Column('key_hash', sa.String(length=64), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('rate_limit', sa.Float(), nullable=True),
+        sa.Column('rate_limit_burst', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('key_hash'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('api_keys')
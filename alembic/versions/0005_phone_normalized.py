@@ -0,0 +1,37 @@
+"""Normalized organization phones
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 13:00:00.000000
+
+Вычисляемая колонка organization_phones.phone_normalized (телефон в каноническом
+виде) и индекс для поиска организации по номеру. Существующие строки заполняются
+при добавлении колонки (таблица перезаписывается). Выражение скопировано из
+app/models.py на момент создания миграции.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+PHONE_NORMALIZED_SQL = r"regexp_replace(regexp_replace(phone, '[^0-9]', '', 'g'), '^8([0-9]{10})$', '7\1')"
+
+
+def upgrade() -> None:
+    op.add_column(
+        'organization_phones',
+        sa.Column('phone_normalized', sa.String(length=20), sa.Computed(PHONE_NORMALIZED_SQL, persisted=True), nullable=False),
+    )
+    op.create_index(
+        'ix_organization_phones_phone_normalized', 'organization_phones', ['phone_normalized', 'organization_id']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_organization_phones_phone_normalized', table_name='organization_phones')
+    op.drop_column('organization_phones', 'phone_normalized')
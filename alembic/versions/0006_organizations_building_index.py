@@ -0,0 +1,24 @@
+"""Organizations by building index
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 14:00:00.000000
+
+Индекс (building_id, id) для выборки организаций здания порциями по курсору
+(GET /api/buildings/{id}?include=organizations) и фильтра по зданию.
+"""
+from alembic import op
+
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_organizations_building_id_id', 'organizations', ['building_id', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_organizations_building_id_id', table_name='organizations')
@@ -0,0 +1,102 @@
+"""Geographic grid cell of buildings and organizations
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 15:00:00.000000
+
+Колонки buildings.geo_cell и organizations.geo_cell - номер ячейки географической
+сетки (app.geo_cells), будущий ключ секционирования (миграция 0008). Ячейка
+организации совпадает с ячейкой её здания: внешний ключ организаций становится
+составным (building_id, geo_cell) с ON UPDATE CASCADE. Функция track_delete
+получает имя таблицы аргументом триггера (у секций TG_TABLE_NAME - имя секции)
+и пропускает перенос строки между секциями.
+
+Существующие строки заполняются одним UPDATE на таблицу (таблицы перезаписываются).
+Выражение скопировано из app/geo_cells.py на момент создания миграции.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+GEO_CELL_SQL = (
+    "least(greatest(floor((latitude::numeric + 90) / 0.5), 0), 359)::integer * 720"
+    " + least(greatest(floor((longitude::numeric + 180) / 0.5), 0), 719)::integer"
+)
+
+TRACK_DELETE_SQL = """
+CREATE OR REPLACE FUNCTION track_delete() RETURNS trigger AS $$
+DECLARE
+    entity_type text := COALESCE(TG_ARGV[0], TG_TABLE_NAME);
+    moved boolean;
+BEGIN
+    -- У секционированной таблицы триггер срабатывает на секции, имя таблицы передаётся
+    -- аргументом. Перенос строки в другую секцию выполняется как удаление и вставка:
+    -- если строка с тем же ID осталась в таблице, удаления не было
+    IF TG_NARGS > 0 THEN
+        EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE id = $1)', entity_type) INTO moved USING OLD.id;
+        IF moved THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+
+    INSERT INTO deleted_records (change_seq, entity_type, entity_id)
+    VALUES (nextval('change_seq'), entity_type, OLD.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+TRACK_DELETE_0003_SQL = """
+CREATE OR REPLACE FUNCTION track_delete() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO deleted_records (change_seq, entity_type, entity_id)
+    VALUES (nextval('change_seq'), TG_TABLE_NAME, OLD.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade() -> None:
+    op.execute(TRACK_DELETE_SQL)
+
+    op.add_column('buildings', sa.Column('geo_cell', sa.Integer(), nullable=True))
+    op.add_column('organizations', sa.Column('geo_cell', sa.Integer(), nullable=True))
+    # Заполнение не должно менять change_seq: клиенты не получают все записи заново
+    op.execute("ALTER TABLE buildings DISABLE TRIGGER buildings_track_change")
+    op.execute("ALTER TABLE organizations DISABLE TRIGGER organizations_track_change")
+    op.execute(f"UPDATE buildings SET geo_cell = {GEO_CELL_SQL}")
+    op.execute(
+        "UPDATE organizations SET geo_cell = buildings.geo_cell "
+        "FROM buildings WHERE buildings.id = organizations.building_id"
+    )
+    op.execute("ALTER TABLE buildings ENABLE TRIGGER buildings_track_change")
+    op.execute("ALTER TABLE organizations ENABLE TRIGGER organizations_track_change")
+    op.alter_column('buildings', 'geo_cell', nullable=False)
+    op.alter_column('organizations', 'geo_cell', nullable=False)
+
+    op.create_check_constraint('ck_buildings_geo_cell', 'buildings', f'geo_cell = {GEO_CELL_SQL}')
+    op.create_unique_constraint('uq_buildings_id_geo_cell', 'buildings', ['id', 'geo_cell'])
+    op.create_unique_constraint('uq_organizations_id_geo_cell', 'organizations', ['id', 'geo_cell'])
+    op.drop_constraint('organizations_building_id_fkey', 'organizations', type_='foreignkey')
+    op.create_foreign_key(
+        'fk_organizations_building_geo_cell', 'organizations', 'buildings',
+        ['building_id', 'geo_cell'], ['id', 'geo_cell'], onupdate='CASCADE'
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('fk_organizations_building_geo_cell', 'organizations', type_='foreignkey')
+    op.create_foreign_key('organizations_building_id_fkey', 'organizations', 'buildings', ['building_id'], ['id'])
+    op.drop_constraint('uq_organizations_id_geo_cell', 'organizations', type_='unique')
+    op.drop_constraint('uq_buildings_id_geo_cell', 'buildings', type_='unique')
+    op.drop_constraint('ck_buildings_geo_cell', 'buildings', type_='check')
+    op.drop_column('organizations', 'geo_cell')
+    op.drop_column('buildings', 'geo_cell')
+    op.execute(TRACK_DELETE_0003_SQL)
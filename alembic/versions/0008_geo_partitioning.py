@@ -0,0 +1,89 @@
+"""Geographic partitioning of buildings and organizations (moved to 0011)
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 16:00:00.000000
+
+Раньше миграция секционировала таблицы при GEO_PARTITIONING=true (PARTITION BY
+HASH (geo_cell)), и схема зависела от настройки в момент обновления. Секционирование
+перенесено в отдельную ветку миграций geo_partitioning (0011), которая применяется
+явно; эта ревизия ничего не делает.
+
+Откат по-прежнему перестраивает несекционированные таблицы, если база была
+секционирована прежней версией миграции: чтобы перейти на секции по полосам широт,
+такую базу откатывают до 0007 и обновляют заново:
+
+    alembic downgrade 0007
+    alembic upgrade main@head
+    alembic upgrade geo_partitioning@head
+"""
+from alembic import context, op
+
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+LINK_FOREIGN_KEYS = {
+    'organization_phones': 'organization_phones_organization_id_fkey',
+    'organization_activities': 'organization_activities_organization_id_fkey',
+}
+
+
+def _is_partitioned(table: str) -> bool:
+    relkind = op.get_bind().exec_driver_sql(f"SELECT relkind FROM pg_class WHERE oid = '{table}'::regclass").scalar()
+    return relkind == 'p'
+
+
+def _unpartition() -> None:
+    """Перестроить несекционированные buildings и organizations с ограничениями, индексами и триггерами"""
+    for table in ('buildings', 'organizations'):
+        op.execute(f"CREATE TABLE {table}_new (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        op.execute(f"INSERT INTO {table}_new SELECT * FROM {table}")
+    op.execute("DROP TABLE organizations")
+    op.execute("DROP TABLE buildings")
+    op.execute("ALTER TABLE buildings_new RENAME TO buildings")
+    op.execute("ALTER TABLE organizations_new RENAME TO organizations")
+
+    op.create_primary_key('buildings_pkey', 'buildings', ['id'])
+    op.create_unique_constraint('buildings_address_key', 'buildings', ['address'])
+    op.create_unique_constraint('uq_buildings_id_geo_cell', 'buildings', ['id', 'geo_cell'])
+    op.create_primary_key('organizations_pkey', 'organizations', ['id'])
+    op.create_unique_constraint('uq_organizations_id_geo_cell', 'organizations', ['id', 'geo_cell'])
+    for table, constraint in LINK_FOREIGN_KEYS.items():
+        op.create_foreign_key(constraint, table, 'organizations', ['organization_id'], ['id'])
+
+    op.create_foreign_key(
+        'fk_organizations_building_geo_cell', 'organizations', 'buildings',
+        ['building_id', 'geo_cell'], ['id', 'geo_cell'], onupdate='CASCADE'
+    )
+    op.create_index('idx_buildings_coordinates', 'buildings', ['coordinates'], postgresql_using='gist')
+    op.create_index('ix_buildings_change_seq', 'buildings', ['change_seq'])
+    op.create_index('ix_organizations_change_seq', 'organizations', ['change_seq'])
+    op.create_index('ix_organizations_building_id_id', 'organizations', ['building_id', 'id'])
+
+    for table in ('buildings', 'organizations'):
+        op.execute(f"""
+            CREATE TRIGGER {table}_track_change
+                BEFORE INSERT OR UPDATE ON {table}
+                FOR EACH ROW EXECUTE FUNCTION track_change();
+
+            CREATE TRIGGER {table}_track_delete
+                AFTER DELETE ON {table}
+                FOR EACH ROW EXECUTE FUNCTION track_delete();
+        """)
+    op.execute("ANALYZE buildings")
+    op.execute("ANALYZE organizations")
+
+
+def upgrade() -> None:
+    pass
+
+
+def downgrade() -> None:
+    # В режиме --sql соединения нет, секционированная база откатывается только онлайн
+    if context.is_offline_mode() or not _is_partitioned('buildings'):
+        return
+    _unpartition()
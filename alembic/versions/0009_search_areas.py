@@ -0,0 +1,34 @@
+"""Named search areas
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 17:00:00.000000
+
+Таблица search_areas: именованные области поиска организаций (исходный GeoJSON
+и подготовленные части). Раньше области хранились только в памяти процесса
+и были доступны лишь в том воркере, который их сохранил.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'search_areas',
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('geometry', postgresql.JSONB(), nullable=False),
+        sa.Column('parts', postgresql.ARRAY(sa.Text()), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('search_areas')
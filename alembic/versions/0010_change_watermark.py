@@ -0,0 +1,131 @@
+"""Commit watermark of the change feed
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 18:00:00.000000
+
+Номер change_seq выдаётся при записи, а не при фиксации транзакции: транзакция
+с меньшим номером может зафиксироваться позже транзакции с большим, и лента
+изменений, выдавшая токен после большего номера, пропустила бы её.
+
+Каждая транзакция, получающая номера изменений, перед первым nextval берёт
+разделяемую advisory-блокировку с ключом - текущим значением последовательности
+(меньше любого из её номеров) и держит её до конца транзакции.
+Функция change_watermark() возвращает границу: все номера не больше неё
+принадлежат завершённым транзакциям. Последовательность читается до pg_locks,
+поэтому транзакция, взявшая блокировку позже, получит номер больше границы.
+Блокировки снимаются после того, как фиксация стала видна, так что следующий
+запрос в режиме READ COMMITTED видит все изменения до границы.
+
+Граница вычисляется только на primary: на репликах pg_locks не содержит
+блокировок primary.
+"""
+from alembic import op
+
+
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+WATERMARK_SQL = """
+CREATE OR REPLACE FUNCTION change_tracking_lock() RETURNS void AS $$
+BEGIN
+    IF current_setting('change_tracking.locked', true) IS DISTINCT FROM 'on' THEN
+        PERFORM pg_advisory_xact_lock_shared(
+            (SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM change_seq)
+        );
+        PERFORM set_config('change_tracking.locked', 'on', true);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION change_watermark() RETURNS bigint AS $$
+DECLARE
+    last_seq bigint;
+    oldest_lock bigint;
+BEGIN
+    SELECT CASE WHEN is_called THEN last_value ELSE 0 END INTO last_seq FROM change_seq;
+    SELECT min((classid::bigint << 32) | objid::bigint) INTO oldest_lock
+    FROM pg_locks
+    WHERE locktype = 'advisory' AND objsubid = 1
+      AND database = (SELECT oid FROM pg_database WHERE datname = current_database());
+    RETURN least(last_seq, oldest_lock);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION track_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM change_tracking_lock();
+    NEW.change_seq := nextval('change_seq');
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION track_delete() RETURNS trigger AS $$
+DECLARE
+    entity_type text := COALESCE(TG_ARGV[0], TG_TABLE_NAME);
+    moved boolean;
+BEGIN
+    -- У секционированной таблицы триггер срабатывает на секции, имя таблицы передаётся
+    -- аргументом. Перенос строки в другую секцию выполняется как удаление и вставка:
+    -- если строка с тем же ID осталась в таблице, удаления не было
+    IF TG_NARGS > 0 THEN
+        EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE id = $1)', entity_type) INTO moved USING OLD.id;
+        IF moved THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+
+    PERFORM change_tracking_lock();
+    INSERT INTO deleted_records (change_seq, entity_type, entity_id)
+    VALUES (nextval('change_seq'), entity_type, OLD.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Функции из миграций 0003 и 0007
+PREVIOUS_SQL = """
+CREATE OR REPLACE FUNCTION track_change() RETURNS trigger AS $$
+BEGIN
+    NEW.change_seq := nextval('change_seq');
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION track_delete() RETURNS trigger AS $$
+DECLARE
+    entity_type text := COALESCE(TG_ARGV[0], TG_TABLE_NAME);
+    moved boolean;
+BEGIN
+    -- У секционированной таблицы триггер срабатывает на секции, имя таблицы передаётся
+    -- аргументом. Перенос строки в другую секцию выполняется как удаление и вставка:
+    -- если строка с тем же ID осталась в таблице, удаления не было
+    IF TG_NARGS > 0 THEN
+        EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE id = $1)', entity_type) INTO moved USING OLD.id;
+        IF moved THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+
+    INSERT INTO deleted_records (change_seq, entity_type, entity_id)
+    VALUES (nextval('change_seq'), entity_type, OLD.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP FUNCTION IF EXISTS change_watermark();
+DROP FUNCTION IF EXISTS change_tracking_lock();
+"""
+
+
+def upgrade() -> None:
+    op.execute(WATERMARK_SQL)
+
+
+def downgrade() -> None:
+    op.execute(PREVIOUS_SQL)
@@ -0,0 +1,178 @@
+"""Geographic partitioning of buildings and organizations
+
+Revision ID: 0011
+Revises:
+Depends on: 0010
+Create Date: 2026-10-19 19:00:00.000000
+
+Отдельная ветка миграций geo_partitioning: основная ветка (alembic upgrade main@head)
+секционирование не включает, оно применяется и откатывается явно:
+
+    alembic upgrade geo_partitioning@head
+    alembic downgrade geo_partitioning@base
+
+Таблицы buildings и organizations перестраиваются в секционированные
+PARTITION BY RANGE (geo_cell). Номер ячейки - строка сетки * 720 + столбец, поэтому
+диапазон номеров - полоса строк: секция {таблица}_p{N} содержит полосу широт
+[-90 + N, -89 + N) градусов, N = 0..179. Соседние ячейки одной полосы лежат в одной
+секции, и поиск рядом затрагивает одну-две секции (при HASH (geo_cell) соседние
+ячейки попадали в разные секции).
+
+Ограничения секционированных таблиц PostgreSQL (требуется версия 15+):
+    - первичный ключ и уникальные ограничения включают ключ секционирования:
+      (id, geo_cell) и (address, geo_cell) - уникальность адреса проверяется
+      в пределах ячейки;
+    - внешние ключи organization_phones и organization_activities на organizations
+      невозможны (ссылаться можно только на ключ с geo_cell) и заменяются триггерами:
+      связь проверяет существование организации и блокирует её строку (FOR KEY SHARE)
+      до конца транзакции, удаление организации со связями отклоняется. Ошибки -
+      foreign_key_violation, как у внешнего ключа. Связь с организацией, которую
+      одновременно переносят в другую секцию, может получить ошибку сериализации.
+
+Данные копируются в новые таблицы целиком (INSERT ... SELECT), на время миграции
+таблицы заблокированы.
+"""
+from alembic import op
+
+
+revision = '0011'
+down_revision = None
+branch_labels = ('geo_partitioning',)
+depends_on = '0010'
+
+
+# Сетка app.geo_cells (0.5°: 360 строк, 720 столбцов) и полосы секций по 2 строки (1°)
+GEO_CELL_ROWS = 360
+GEO_CELL_COLUMNS = 720
+BAND_ROWS = 2
+
+LINK_FOREIGN_KEYS = {
+    'organization_phones': 'organization_phones_organization_id_fkey',
+    'organization_activities': 'organization_activities_organization_id_fkey',
+}
+
+LINK_CHECKS_SQL = """
+CREATE OR REPLACE FUNCTION check_organization_link() RETURNS trigger AS $$
+BEGIN
+    -- Вместо внешнего ключа: строка организации блокируется до конца транзакции,
+    -- одновременное удаление организации дождётся её и увидит связь
+    PERFORM 1 FROM organizations WHERE id = NEW.organization_id FOR KEY SHARE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Организация % не найдена (%)', NEW.organization_id, TG_TABLE_NAME
+            USING ERRCODE = 'foreign_key_violation';
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION check_organization_unlinked() RETURNS trigger AS $$
+BEGIN
+    -- Перенос строки в другую секцию выполняется как удаление и вставка:
+    -- если строка с тем же ID осталась в таблице, удаления не было
+    IF EXISTS (SELECT 1 FROM organizations WHERE id = OLD.id) THEN
+        RETURN NULL;
+    END IF;
+    IF EXISTS (SELECT 1 FROM organization_phones WHERE organization_id = OLD.id)
+       OR EXISTS (SELECT 1 FROM organization_activities WHERE organization_id = OLD.id) THEN
+        RAISE EXCEPTION 'У организации % остались телефоны или виды деятельности', OLD.id
+            USING ERRCODE = 'foreign_key_violation';
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER organization_phones_check_organization
+    AFTER INSERT OR UPDATE OF organization_id ON organization_phones
+    FOR EACH ROW EXECUTE FUNCTION check_organization_link();
+
+CREATE TRIGGER organization_activities_check_organization
+    AFTER INSERT OR UPDATE OF organization_id ON organization_activities
+    FOR EACH ROW EXECUTE FUNCTION check_organization_link();
+
+CREATE TRIGGER organizations_check_unlinked
+    AFTER DELETE ON organizations
+    FOR EACH ROW EXECUTE FUNCTION check_organization_unlinked();
+"""
+
+DROP_LINK_CHECKS_SQL = """
+DROP TRIGGER IF EXISTS organizations_check_unlinked ON organizations;
+DROP TRIGGER IF EXISTS organization_phones_check_organization ON organization_phones;
+DROP TRIGGER IF EXISTS organization_activities_check_organization ON organization_activities;
+DROP FUNCTION IF EXISTS check_organization_unlinked();
+DROP FUNCTION IF EXISTS check_organization_link();
+"""
+
+
+def _copy_table(table: str, partitioned: bool) -> None:
+    """Новая таблица {table}_new с теми же колонками и данными (секционированная по полосам широт)"""
+    partition_by = " PARTITION BY RANGE (geo_cell)" if partitioned else ""
+    op.execute(f"CREATE TABLE {table}_new (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS){partition_by}")
+    if partitioned:
+        for band in range(GEO_CELL_ROWS // BAND_ROWS):
+            op.execute(
+                f"CREATE TABLE {table}_p{band} PARTITION OF {table}_new FOR VALUES "
+                f"FROM ({band * BAND_ROWS * GEO_CELL_COLUMNS}) TO ({(band + 1) * BAND_ROWS * GEO_CELL_COLUMNS})"
+            )
+    op.execute(f"INSERT INTO {table}_new SELECT * FROM {table}")
+
+
+def _rebuild(partitioned: bool) -> None:
+    """Перестроить buildings и organizations с ограничениями, индексами и триггерами"""
+    if partitioned:
+        for table, constraint in LINK_FOREIGN_KEYS.items():
+            op.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {constraint}")
+    else:
+        op.execute(DROP_LINK_CHECKS_SQL)
+
+    _copy_table('buildings', partitioned)
+    _copy_table('organizations', partitioned)
+    op.execute("DROP TABLE organizations")
+    op.execute("DROP TABLE buildings")
+    op.execute("ALTER TABLE buildings_new RENAME TO buildings")
+    op.execute("ALTER TABLE organizations_new RENAME TO organizations")
+
+    if partitioned:
+        op.create_primary_key('buildings_pkey', 'buildings', ['id', 'geo_cell'])
+        op.create_unique_constraint('buildings_address_key', 'buildings', ['address', 'geo_cell'])
+        op.create_primary_key('organizations_pkey', 'organizations', ['id', 'geo_cell'])
+        op.execute(LINK_CHECKS_SQL)
+    else:
+        op.create_primary_key('buildings_pkey', 'buildings', ['id'])
+        op.create_unique_constraint('buildings_address_key', 'buildings', ['address'])
+        op.create_unique_constraint('uq_buildings_id_geo_cell', 'buildings', ['id', 'geo_cell'])
+        op.create_primary_key('organizations_pkey', 'organizations', ['id'])
+        op.create_unique_constraint('uq_organizations_id_geo_cell', 'organizations', ['id', 'geo_cell'])
+        for table, constraint in LINK_FOREIGN_KEYS.items():
+            op.create_foreign_key(constraint, table, 'organizations', ['organization_id'], ['id'])
+
+    op.create_foreign_key(
+        'fk_organizations_building_geo_cell', 'organizations', 'buildings',
+        ['building_id', 'geo_cell'], ['id', 'geo_cell'], onupdate='CASCADE'
+    )
+    op.create_index('idx_buildings_coordinates', 'buildings', ['coordinates'], postgresql_using='gist')
+    op.create_index('ix_buildings_change_seq', 'buildings', ['change_seq'])
+    op.create_index('ix_organizations_change_seq', 'organizations', ['change_seq'])
+    op.create_index('ix_organizations_building_id_id', 'organizations', ['building_id', 'id'])
+
+    for table in ('buildings', 'organizations'):
+        # Имя таблицы передаётся аргументом: у секции TG_TABLE_NAME - имя секции
+        track_delete_args = f"'{table}'" if partitioned else ""
+        op.execute(f"""
+            CREATE TRIGGER {table}_track_change
+                BEFORE INSERT OR UPDATE ON {table}
+                FOR EACH ROW EXECUTE FUNCTION track_change();
+
+            CREATE TRIGGER {table}_track_delete
+                AFTER DELETE ON {table}
+                FOR EACH ROW EXECUTE FUNCTION track_delete({track_delete_args});
+        """)
+    op.execute("ANALYZE buildings")
+    op.execute("ANALYZE organizations")
+
+
+def upgrade() -> None:
+    _rebuild(partitioned=True)
+
+
+def downgrade() -> None:
+    _rebuild(partitioned=False)
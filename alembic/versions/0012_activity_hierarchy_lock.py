@@ -0,0 +1,107 @@
+"""Serialize activity hierarchy changes
+
+Revision ID: 0012
+Revises: 0010
+Create Date: 2026-10-19 20:00:00.000000
+
+Триггер activities_hierarchy (миграция 0002) читал путь родителя без блокировок.
+Две транзакции, одновременно переносящие A под B и B под A, видели пути до переноса
+друг друга, обе проходили проверку цикла, и дерево получало цикл; вставка дочернего
+вида под переносимое поддерево могла сохранить старый путь.
+
+Теперь вставка с родителем и любое изменение parent_id берут advisory-блокировку
+транзакции на таблицу activities: изменения иерархии выполняются по одному, и путь
+родителя читается после фиксации предыдущего изменения (каждый запрос функции в режиме
+READ COMMITTED видит зафиксированные данные). Строка родителя читается FOR SHARE:
+в режиме REPEATABLE READ одновременное изменение родителя даёт ошибку сериализации,
+а не устаревший путь. Блокировка двухключевая (objsubid = 2) и не учитывается
+границей фиксации change_watermark (миграция 0010).
+"""
+from alembic import op
+
+
+revision = '0012'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+ACTIVITIES_HIERARCHY_SQL = """
+CREATE OR REPLACE FUNCTION activities_maintain_hierarchy() RETURNS trigger AS $$
+DECLARE
+    max_levels integer := TG_ARGV[0]::integer;
+    parent_level integer;
+    parent_path text;
+BEGIN
+    -- Изменения иерархии выполняются по одному: перенос меняет пути всего поддерева
+    IF TG_OP = 'UPDATE' OR NEW.parent_id IS NOT NULL THEN
+        PERFORM pg_advisory_xact_lock('activities'::regclass::integer, 0);
+    END IF;
+
+    IF NEW.parent_id IS NULL THEN
+        NEW.level := 1;
+        NEW.path := NEW.id::text;
+    ELSE
+        SELECT level, path INTO parent_level, parent_path FROM activities WHERE id = NEW.parent_id FOR SHARE;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Родительский вид деятельности % не найден', NEW.parent_id
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+        IF NEW.id = NEW.parent_id OR position(NEW.id::text IN parent_path) > 0 THEN
+            RAISE EXCEPTION 'Перемещение образует цикл в дереве видов деятельности'
+                USING ERRCODE = 'check_violation';
+        END IF;
+        NEW.level := parent_level + 1;
+        NEW.path := parent_path || '/' || NEW.id::text;
+    END IF;
+
+    IF NEW.level > max_levels THEN
+        RAISE EXCEPTION 'Превышена максимальная глубина дерева видов деятельности (%)', max_levels
+            USING ERRCODE = 'check_violation';
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Функция из миграции 0002
+PREVIOUS_SQL = """
+CREATE OR REPLACE FUNCTION activities_maintain_hierarchy() RETURNS trigger AS $$
+DECLARE
+    max_levels integer := TG_ARGV[0]::integer;
+    parent_level integer;
+    parent_path text;
+BEGIN
+    IF NEW.parent_id IS NULL THEN
+        NEW.level := 1;
+        NEW.path := NEW.id::text;
+    ELSE
+        SELECT level, path INTO parent_level, parent_path FROM activities WHERE id = NEW.parent_id;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Родительский вид деятельности % не найден', NEW.parent_id
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+        IF NEW.id = NEW.parent_id OR position(NEW.id::text IN parent_path) > 0 THEN
+            RAISE EXCEPTION 'Перемещение образует цикл в дереве видов деятельности'
+                USING ERRCODE = 'check_violation';
+        END IF;
+        NEW.level := parent_level + 1;
+        NEW.path := parent_path || '/' || NEW.id::text;
+    END IF;
+
+    IF NEW.level > max_levels THEN
+        RAISE EXCEPTION 'Превышена максимальная глубина дерева видов деятельности (%)', max_levels
+            USING ERRCODE = 'check_violation';
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade() -> None:
+    op.execute(ACTIVITIES_HIERARCHY_SQL)
+
+
+def downgrade() -> None:
+    op.execute(PREVIOUS_SQL)
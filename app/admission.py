@@ -0,0 +1,123 @@
+import asyncio
+from typing import Dict
+from fastapi import Depends, HTTPException, Request
+from app.config import settings
+from app.database import POOL_OPTIONS
+
+
+class AdmissionLimiter:
+    """
+    Ограничение числа одновременно выполняемых запросов к каждому эндпоинту воркера
+
+    Запрос сверх лимита ждёт освобождения места не дольше wait_timeout секунд и затем
+    отклоняется, поэтому тяжёлые эндпоинты не занимают весь пул соединений и не копят
+    бесконечную очередь ожидающих запросов. Место удерживается, пока выполняется эндпоинт:
+    синхронные эндпоинты FastAPI выполняет в пуле потоков, и цикл событий продолжает
+    принимать запросы, которые ждут места здесь, а не в очереди пула потоков.
+    Лимиты больше capacity (одновременно выполнимых запросов) уменьшаются до capacity.
+    """
+
+    def __init__(self, default_limit: int, limits: Dict[str, int], wait_timeout: float, capacity: int = 0):
+        self.default_limit = default_limit
+        self.limits = limits
+        self.wait_timeout = wait_timeout
+        self.capacity = capacity
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def limit_for(self, route: str) -> int:
+        """Лимит эндпоинта (0 - без ограничения)"""
+        limit = self.limits.get(route, self.default_limit)
+        if limit > 0 and self.capacity > 0:
+            return min(limit, self.capacity)
+        return limit
+
+    async def acquire(self, route: str) -> bool:
+        """
+        Занять место для запроса к эндпоинту
+
+        Returns:
+            bool: True если место занято (его нужно освободить через release), False если
+                эндпоинт перегружен; для эндпоинтов без ограничения - True без учёта мест
+        """
+        limit = self.limit_for(route)
+        if limit <= 0:
+            return True
+
+        semaphore = self._semaphores.get(route)
+        if semaphore is None:
+            semaphore = self._semaphores[route] = asyncio.Semaphore(limit)
+            self._stats[route] = {"limit": limit, "in_flight": 0, "admitted": 0, "rejected": 0}
+        stats = self._stats[route]
+
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.wait_timeout)
+        except asyncio.TimeoutError:
+            stats["rejected"] += 1
+            return False
+        stats["in_flight"] += 1
+        stats["admitted"] += 1
+        return True
+
+    def release(self, route: str) -> None:
+        """Освободить место, занятое acquire"""
+        semaphore = self._semaphores.get(route)
+        if semaphore is not None:
+            self._stats[route]["in_flight"] -= 1
+            semaphore.release()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Метрики по эндпоинтам с ограничением, к которым уже были запросы"""
+        return {route: dict(stats) for route, stats in self._stats.items()}
+
+
+def admission_capacity() -> int:
+    """
+    Сколько запросов воркер может выполнять одновременно
+
+    Синхронный эндпоинт занимает поток пула (threadpool_size) и соединение с базой
+    (pool_size + max_overflow, в режиме PgBouncer - pgbouncer_pool_size, если задан).
+    """
+    if settings.pgbouncer_mode:
+        connections = settings.pgbouncer_pool_size
+    else:
+        connections = POOL_OPTIONS["pool_size"] + POOL_OPTIONS["max_overflow"]
+    if connections <= 0:
+        return settings.threadpool_size
+    return min(settings.threadpool_size, connections)
+
+
+admission_limiter = AdmissionLimiter(
+    default_limit=settings.admission_max_concurrency,
+    limits=settings.admission_limits,
+    wait_timeout=settings.admission_wait_timeout,
+    capacity=admission_capacity(),
+)
+
+
+async def admit_request(request: Request):
+    """
+    Dependency: допустить запрос к эндпоинту или вернуть 503 с Retry-After
+
+    Raises:
+        HTTPException: Если все места эндпоинта заняты дольше admission_wait_timeout (503)
+    """
+    route = getattr(request.scope.get("route"), "name", None)
+    if not settings.admission_enabled or route is None:
+        yield
+        return
+
+    if not await admission_limiter.acquire(route):
+        raise HTTPException(
+            status_code=503,
+            detail="Сервис перегружен, повторите запрос позже",
+            headers={"Retry-After": str(settings.admission_retry_after)}
+        )
+    try:
+        yield
+    finally:
+        admission_limiter.release(route)
+
+
+# Dependency для подключения к роутерам
+admission_dependency = Depends(admit_request)
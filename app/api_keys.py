@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Скрипт для управления API ключами клиентов
+
+    python -m app.api_keys create "Партнёр" [--rate-limit 50] [--burst 100]
+    python -m app.api_keys list
+    python -m app.api_keys revoke <id>
+
+Ключ выводится один раз при создании, в базе данных хранится только его хэш.
+Отозванный ключ перестаёт приниматься воркерами после истечения api_key_cache_ttl.
+"""
+
+import argparse
+import secrets
+import uuid
+from app.auth import hash_api_key
+from app.database import SessionLocal
+from app.models import ApiKey
+
+
+def create_api_key(name: str, rate_limit: float = None, burst: int = None) -> str:
+    """Создать ключ и вернуть его значение"""
+    db = SessionLocal()
+    try:
+        raw_key = secrets.token_urlsafe(32)
+        api_key = ApiKey(
+            id=uuid.uuid4(),
+            name=name,
+            key_hash=hash_api_key(raw_key),
+            rate_limit=rate_limit,
+            rate_limit_burst=burst
+        )
+        db.add(api_key)
+        db.commit()
+        print(f"Создан ключ {api_key.id} для '{name}'")
+        return raw_key
+    finally:
+        db.close()
+
+
+def list_api_keys():
+    """Вывести список ключей"""
+    db = SessionLocal()
+    try:
+        for api_key in db.query(ApiKey).order_by(ApiKey.created_at).all():
+            status = "активен" if api_key.is_active else "отозван"
+            print(f"{api_key.id}  {api_key.name}  {status}  rate_limit={api_key.rate_limit}  burst={api_key.rate_limit_burst}")
+    finally:
+        db.close()
+
+
+def revoke_api_key(key_id: str):
+    """Отозвать ключ"""
+    db = SessionLocal()
+    try:
+        api_key = db.query(ApiKey).filter(ApiKey.id == uuid.UUID(key_id)).first()
+        if api_key is None:
+            print(f"Ключ {key_id} не найден")
+            return
+        api_key.is_active = False
+        db.commit()
+        print(f"Ключ {key_id} отозван")
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Управление API ключами")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    create_parser = subparsers.add_parser("create", help="Создать ключ")
+    create_parser.add_argument("name", help="Название клиента")
+    create_parser.add_argument("--rate-limit", type=float, default=None, help="Запросов в секунду")
+    create_parser.add_argument("--burst", type=int, default=None, help="Размер корзины токенов")
+
+    subparsers.add_parser("list", help="Список ключей")
+
+    revoke_parser = subparsers.add_parser("revoke", help="Отозвать ключ")
+    revoke_parser.add_argument("id", help="ID ключа")
+
+    args = parser.parse_args()
+    if args.command == "create":
+        print(create_api_key(args.name, args.rate_limit, args.burst))
+    elif args.command == "list":
+        list_api_keys()
+    elif args.command == "revoke":
+        revoke_api_key(args.id)
+
+
+if __name__ == "__main__":
+    main()
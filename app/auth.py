@@ -1,20 +1,127 @@
-from fastapi import HTTPException, Depends, Header
+from fastapi import HTTPException, Depends, Header, Request
+from fastapi.concurrency import run_in_threadpool
+from dataclasses import dataclass
 from typing import Optional
+from uuid import UUID
+from app.cache import TTLCache
 from app.config import settings
+from app.database import SessionLocal
+from app.models import ApiKey
+from app.rate_limit import rate_limiter
+import hashlib
+import hmac
+import math
 
 
-async def verify_api_key(x_api_key: Optional[str] = Header(None)) -> bool:
+@dataclass(frozen=True)
+class ApiKeyPrincipal:
+    """Клиент, прошедший проверку API ключа"""
+    key_id: Optional[UUID]
+    name: str
+    rate_limit: float
+    rate_limit_burst: int
+
+
+# Кэш проверенных ключей: хэш ключа -> ApiKeyPrincipal (или None для неверных ключей)
+_api_key_cache = TTLCache(maxsize=settings.api_key_cache_size, ttl=settings.api_key_cache_ttl)
+_MISSING = object()
+
+
+def hash_api_key(api_key: str) -> str:
+    """Хэш API ключа для хранения в базе данных"""
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+def _principal(api_key: ApiKey) -> ApiKeyPrincipal:
+    return ApiKeyPrincipal(
+        key_id=api_key.id,
+        name=api_key.name,
+        rate_limit=api_key.rate_limit or settings.rate_limit_per_second,
+        rate_limit_burst=api_key.rate_limit_burst or settings.rate_limit_burst
+    )
+
+
+def _load_principal(key_hash: str) -> Optional[ApiKeyPrincipal]:
+    """Найти активный ключ в базе данных"""
+    db = SessionLocal()
+    try:
+        api_key = db.query(ApiKey).filter(
+            ApiKey.key_hash == key_hash,
+            ApiKey.is_active.is_(True)
+        ).first()
+        if api_key is None:
+            return None
+        return _principal(api_key)
+    finally:
+        db.close()
+
+
+def preload_api_keys() -> int:
     """
-    Проверка API ключа
+    Загрузить активные ключи в кэш одним запросом (прогрев при старте воркера)
+
+    Returns:
+        int: Количество загруженных ключей (не больше размера кэша)
+    """
+    db = SessionLocal()
+    try:
+        api_keys = db.query(ApiKey).filter(ApiKey.is_active.is_(True)).limit(settings.api_key_cache_size).all()
+        for api_key in api_keys:
+            _api_key_cache.set(api_key.key_hash, _principal(api_key))
+        return len(api_keys)
+    finally:
+        db.close()
+
+
+def resolve_api_key(x_api_key: str) -> Optional[ApiKeyPrincipal]:
+    """
+    Проверить API ключ с использованием кэша
+
+    Ключ из настроек (settings.api_key) принимается без обращения к базе данных,
+    остальные ключи ищутся по хэшу в таблице api_keys не чаще раза в api_key_cache_ttl.
+    """
+    key_hash = hash_api_key(x_api_key)
+    principal = _api_key_cache.get(key_hash, _MISSING)
+    if principal is not _MISSING:
+        return principal
+
+    if settings.api_key and hmac.compare_digest(x_api_key, settings.api_key):
+        principal = ApiKeyPrincipal(
+            key_id=None,
+            name="default",
+            rate_limit=settings.rate_limit_per_second,
+            rate_limit_burst=settings.rate_limit_burst
+        )
+    else:
+        principal = _load_principal(key_hash)
+
+    _api_key_cache.set(
+        key_hash,
+        principal,
+        ttl=None if principal is not None else settings.api_key_negative_cache_ttl
+    )
+    return principal
+
+
+def invalidate_api_key(key_hash: str) -> None:
+    """Удалить ключ из кэша текущего процесса"""
+    _api_key_cache.pop(key_hash)
+
+
+async def verify_api_key(request: Request, x_api_key: Optional[str] = Header(None)) -> bool:
+    """
+    Проверка API ключа и ограничения частоты запросов
 
     Args:
+        request: Текущий запрос, в request.state.api_key сохраняется клиент
         x_api_key: API ключ из заголовка X-API-Key
 
     Returns:
         bool: True если ключ верный
 
     Raises:
-        HTTPException: Если ключ отсутствует или неверный
+        HTTPException: Если ключ отсутствует или неверный (401)
+            либо превышен лимит запросов (429)
     """
     if not x_api_key:
         raise HTTPException(
@@ -22,14 +129,59 @@ async def verify_api_key(x_api_key: Optional[str] = Header(None)) -> bool:
             detail="API ключ обязателен. Добавьте заголовок X-API-Key"
         )
 
-    if x_api_key != settings.api_key:
+    # Ключ из кэша проверяется в цикле событий, поиск в базе данных (синхронный)
+    # выполняется в пуле потоков, чтобы не блокировать остальные запросы
+    principal = _api_key_cache.get(hash_api_key(x_api_key), _MISSING)
+    if principal is _MISSING:
+        principal = await run_in_threadpool(resolve_api_key, x_api_key)
+    if principal is None:
         raise HTTPException(
             status_code=401,
             detail="Неверный API ключ"
         )
 
+    if settings.rate_limit_enabled:
+        retry_after = rate_limiter.acquire(
+            principal.key_id or principal.name,
+            principal.rate_limit,
+            principal.rate_limit_burst
+        )
+        if retry_after > 0:
+            raise HTTPException(
+                status_code=429,
+                detail="Превышен лимит запросов",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+
+    request.state.api_key = principal
     return True
 
 
 # Dependency для использования в эндпоинтах
 api_key_dependency = Depends(verify_api_key)
+
+
+def is_admin_key(key: Optional[str]) -> bool:
+    """Ключ совпадает с ключом администратора (при пустом settings.admin_api_key - всегда False)"""
+    if not settings.admin_api_key or not key:
+        return False
+    return hmac.compare_digest(key.encode(), settings.admin_api_key.encode())
+
+
+async def verify_admin_key(x_admin_key: Optional[str] = Header(None)) -> bool:
+    """
+    Проверка ключа администратора для служебных эндпоинтов
+
+    Raises:
+        HTTPException: Если служебные эндпоинты выключены (пустой admin_api_key, 404)
+            или ключ из заголовка X-Admin-Key отсутствует или неверный (403)
+    """
+    if not settings.admin_api_key:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not is_admin_key(x_admin_key):
+        raise HTTPException(status_code=403, detail="Неверный ключ администратора")
+    return True
+
+
+# Dependency для служебных эндпоинтов
+admin_key_dependency = Depends(verify_admin_key)
@@ -0,0 +1,186 @@
+import gzip
+import hashlib
+import threading
+from typing import Dict, Optional
+from starlette.datastructures import MutableHeaders
+from app.cache import TTLCache
+from app.config import settings
+
+try:
+    import brotli
+except ImportError:  # brotli - необязательная зависимость
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/msgpack",
+    "application/x-msgpack",
+    "application/vnd.msgpack",
+    "application/javascript",
+    "application/xml",
+    "text/",
+)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Выбрать кодирование по заголовку Accept-Encoding: "br", "gzip" или None
+
+    brotli предпочтительнее при равном приоритете, если модуль установлен.
+    """
+    qualities: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+
+    wildcard = qualities.get("*", 0.0)
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_quality = None, 0.0
+    for coding in candidates:
+        quality = qualities.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Сжать тело ответа выбранным кодированием"""
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.compression_brotli_quality)
+    return gzip.compress(body, compresslevel=settings.compression_gzip_level, mtime=0)
+
+
+def _is_compressible(content_type: str) -> bool:
+    content_type = content_type.split(";", 1)[0].strip().lower()
+    return content_type.endswith("+json") or content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressedBodyCache:
+    """
+    Кэш сжатых тел ответов по (кодирование, хэш тела)
+
+    Горячие ответы (дерево видов деятельности, популярные страницы) побайтно
+    совпадают между запросами, поэтому хэшировать тело дешевле, чем сжимать его заново.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def get_or_compress(self, body: bytes, encoding: str) -> bytes:
+        key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+        compressed = self._cache.get(key)
+        hit = compressed is not None
+        if not hit:
+            compressed = compress(body, encoding)
+            self._cache.set(key, compressed)
+
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.bytes_in += len(body)
+            self.bytes_out += len(compressed)
+        return compressed
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Метрики сжатия"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._cache),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "brotli_available": brotli is not None,
+        }
+
+
+compressed_body_cache = CompressedBodyCache(
+    maxsize=settings.compression_cache_size,
+    ttl=settings.compression_cache_ttl,
+)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware: сжатие ответов gzip/brotli по Accept-Encoding
+
+    Сжимаются ответы сжимаемых типов размером не меньше minimum_size, отданные
+    одним сообщением. Потоковые ответы (файлы снимков) и ответы с уже заданным
+    Content-Encoding передаются без изменений.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, cache: Optional[CompressedBodyCache] = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = cache or compressed_body_cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept_encoding) if accept_encoding else None
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                if "content-encoding" in headers or not _is_compressible(headers.get("content-type", "")):
+                    passthrough = True
+                    await send(message)
+                else:
+                    headers.add_vary_header("Accept-Encoding")
+                    start_message = message
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if start_message is not None:
+                pending, start_message = start_message, None
+                if message.get("more_body", False) or encoding is None or len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(pending)
+                    await send(message)
+                    return
+
+                compressed = self.cache.get_or_compress(body, encoding)
+                headers = MutableHeaders(raw=pending["headers"])
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(compressed))
+                await send(pending)
+                await send({"type": "http.response.body", "body": compressed})
+                return
+
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
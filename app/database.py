@@ -1,14 +1,95 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import NullPool, QueuePool
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.requests import Request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
 from app.config import settings
+import itertools
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+def pool_budget(max_connections: int, reserved: int, workers: int) -> Dict[str, int]:
+    """
+    Размер пула одного воркера по лимиту соединений сервера
+
+    Доступные соединения делятся поровну между воркерами; половина доли
+    держится открытой (pool_size), остальное - временные соединения (max_overflow).
+    """
+    per_worker = max(1, (max_connections - reserved) // max(1, workers))
+    pool_size = max(1, per_worker // 2)
+    return {"pool_size": pool_size, "max_overflow": per_worker - pool_size}
+
+
+POOL_OPTIONS = pool_budget(settings.db_max_connections, settings.db_reserved_connections, settings.web_concurrency)
+
+
+def pooler_connect_args(url: str) -> Dict[str, Any]:
+    """
+    Параметры драйвера для работы через пулер в режиме transaction pooling
+
+    Соседние транзакции клиента могут выполняться на разных серверных соединениях,
+    поэтому именованные prepared statements отключаются: psycopg (3) не подготавливает
+    запросы (prepare_threshold=None), asyncpg не кэширует их (statement_cache_size=0)
+    и даёт им уникальные имена.
+    psycopg2 prepared statements не использует.
+    """
+    driver = make_url(url).get_dialect().driver
+    if driver == "psycopg":
+        return {"prepare_threshold": None}
+    if driver == "asyncpg":
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            # Уникальные имена, чтобы не пересечься с операторами других клиентов на том же соединении
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    return {}
+
+
+def engine_options(url: str, connect_args: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Параметры create_engine для прямого подключения к PostgreSQL или через PgBouncer
+
+    В режиме PGBOUNCER_MODE соединения пулит PgBouncer: локально используется NullPool
+    (или небольшой пул PGBOUNCER_POOL_SIZE) без pre-ping, prepared statements отключены.
+    """
+    connect_args = dict(connect_args or {})
+    if not settings.pgbouncer_mode:
+        return {
+            "pool_pre_ping": True,
+            "pool_recycle": 300,
+            "connect_args": connect_args,
+            "query_cache_size": settings.query_cache_size,
+            **POOL_OPTIONS
+        }
+
+    connect_args.update(pooler_connect_args(url))
+    if settings.pgbouncer_pool_size > 0:
+        return {
+            "pool_size": settings.pgbouncer_pool_size,
+            "max_overflow": 0,
+            "pool_recycle": 300,
+            "connect_args": connect_args,
+            "query_cache_size": settings.query_cache_size,
+        }
+    return {"poolclass": NullPool, "connect_args": connect_args, "query_cache_size": settings.query_cache_size}
+
+
+def pool_capacity(engine_: Engine) -> int:
+    """Число постоянных соединений пула (0 для NullPool)"""
+    return engine_.pool.size() if isinstance(engine_.pool, QueuePool) else 0
+
 
 # Создание движка базы данных
-engine = create_engine(
-    settings.database_url,
-    pool_pre_ping=True,
-    pool_recycle=300,
-)
+engine = create_engine(settings.database_url, **engine_options(settings.database_url))
 
 # Создание фабрики сессий
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -17,9 +98,171 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
-def get_db():
-    """Dependency для получения сессии базы данных"""
+def statement_timeout_for(route_name: Optional[str]) -> int:
+    """Ограничение времени запроса (мс) для эндпоинта: из statement_timeouts или по умолчанию"""
+    return settings.statement_timeouts.get(route_name, settings.statement_timeout_ms)
+
+
+@event.listens_for(SessionLocal, "after_begin")
+def _apply_statement_timeout(session: Session, transaction, connection) -> None:
+    """
+    Установить statement_timeout сессии (session.info) в начале каждой транзакции
+
+    SET LOCAL действует до конца транзакции и не переходит к следующему
+    владельцу соединения (в том числе через PgBouncer в режиме transaction).
+    """
+    timeout = session.info.get("statement_timeout")
+    if timeout:
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout)}")
+
+
+# Отставание реплики в секундах; 0 для реплики, догнавшей primary, и для standalone-сервера
+REPLICATION_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class ReplicaRouter:
+    """
+    Выбор реплики для запросов на чтение
+
+    Реплики перебираются по кругу (round-robin), пропускаются недоступные
+    и отстающие больше чем на max_lag секунд. Состояние реплики проверяется
+    не чаще раза в check_interval секунд. Если подходящих реплик нет,
+    чтение выполняется на primary.
+    """
+
+    def __init__(self, urls: List[str], max_lag: float, check_interval: float, connect_timeout: int):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.engines: List[Engine] = [
+            create_engine(url, **engine_options(url, {"connect_timeout": connect_timeout}))
+            for url in urls
+        ]
+        self._state: List[Dict[str, Any]] = [
+            {"healthy": False, "lag": None, "checked_at": None} for _ in urls
+        ]
+        self._checking = [threading.Lock() for _ in urls]
+        self._counter = itertools.count()
+
+    def choose(self) -> Optional[Engine]:
+        """Следующая здоровая реплика или None"""
+        if not self.engines:
+            return None
+
+        start = next(self._counter)
+        for offset in range(len(self.engines)):
+            index = (start + offset) % len(self.engines)
+            if self._is_healthy(index):
+                return self.engines[index]
+        return None
+
+    def _is_healthy(self, index: int) -> bool:
+        state = self._state[index]
+        checked_at = state["checked_at"]
+        if checked_at is None or time.monotonic() - checked_at >= self.check_interval:
+            # Проверку выполняет один поток, остальные используют последнее известное состояние
+            if self._checking[index].acquire(blocking=False):
+                try:
+                    self._check(index)
+                finally:
+                    self._checking[index].release()
+        return state["healthy"]
+
+    def _check(self, index: int) -> None:
+        state = self._state[index]
+        try:
+            with self.engines[index].connect() as connection:
+                lag = float(connection.execute(REPLICATION_LAG_SQL).scalar())
+            state["lag"] = lag
+            state["healthy"] = lag <= self.max_lag
+            if not state["healthy"]:
+                logger.warning(f"Реплика {index} отстаёт на {lag:.1f} с, чтение переключено на primary")
+        except Exception as e:
+            state["lag"] = None
+            state["healthy"] = False
+            logger.warning(f"Реплика {index} недоступна: {e}")
+        state["checked_at"] = time.monotonic()
+
+    def check_all(self) -> None:
+        """Проверить все реплики параллельно (прогрев при старте воркера)"""
+        if not self.engines:
+            return
+        with ThreadPoolExecutor(max_workers=len(self.engines)) as executor:
+            list(executor.map(self._check, range(len(self.engines))))
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Последнее известное состояние реплик"""
+        return [
+            {"replica": index, "healthy": state["healthy"], "lag_seconds": state["lag"]}
+            for index, state in enumerate(self._state)
+        ]
+
+
+def warm_pool(engine_: Engine, connections: int) -> int:
+    """
+    Заранее открыть connections соединений пула параллельно
+
+    Соединения открываются одновременно и возвращаются в пул, поэтому первые
+    запросы воркера не ждут установки соединения с базой данных.
+
+    Returns:
+        int: Количество открытых соединений
+    """
+    if connections <= 0:
+        return 0
+
+    def connect():
+        connection = engine_.connect()
+        connection.execute(text("SELECT 1"))
+        return connection
+
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        futures = [executor.submit(connect) for _ in range(connections)]
+
+    opened = [future.result() for future in futures if future.exception() is None]
+    for connection in opened:
+        connection.close()
+    if not opened:
+        raise futures[0].exception()
+    return len(opened)
+
+
+replica_router = ReplicaRouter(
+    settings.database_replica_urls,
+    max_lag=settings.replica_max_lag_seconds,
+    check_interval=settings.replica_health_check_interval,
+    connect_timeout=settings.replica_connect_timeout,
+)
+
+
+def _route_name(request: Request) -> Optional[str]:
+    route = request.scope.get("route")
+    return getattr(route, "name", None)
+
+
+def get_db(request: Request):
+    """
+    Dependency для получения сессии базы данных только для чтения (реплика, если доступна)
+
+    Запросы сессии ограничены по времени statement_timeout эндпоинта.
+    """
+    db = SessionLocal(bind=replica_router.choose() or engine)
+    db.info["statement_timeout"] = statement_timeout_for(_route_name(request))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_primary_db(request: Request):
+    """Dependency для получения сессии primary-базы (запись и чтение своих изменений)"""
     db = SessionLocal()
+    db.info["statement_timeout"] = statement_timeout_for(_route_name(request))
     try:
         yield db
     finally:
@@ -0,0 +1,131 @@
+"""
+Ячейки географической сетки для секционирования зданий и организаций
+
+Поверхность делится на ячейки GEO_CELL_DEGREES x GEO_CELL_DEGREES градусов, номер
+ячейки (buildings.geo_cell, organizations.geo_cell) - ключ секционирования таблиц
+(ветка миграций geo_partitioning, 0011): секция - диапазон номеров, то есть полоса
+из GEO_PARTITION_BAND_ROWS строк сетки. По геометрии запроса вычисляется список ячеек,
+которые она может задеть: условие geo_cell IN (...) позволяет планировщику исключить
+остальные секции.
+
+Номер ячейки вычисляется из строковых координат здания в десятичной арифметике,
+так же как выражение GEO_CELL_SQL в базе данных (numeric), поэтому значения
+совпадают и на границах ячеек.
+"""
+
+import math
+from decimal import Decimal, ROUND_FLOOR
+from typing import List, Optional, Tuple, Union
+from app.config import settings
+
+GEO_CELL_DEGREES = Decimal("0.5")
+GEO_CELL_ROWS = 360  # 180 / GEO_CELL_DEGREES
+GEO_CELL_COLUMNS = 720  # 360 / GEO_CELL_DEGREES
+# Строк сетки в секции (полоса широт 1°), как в миграции 0011
+GEO_PARTITION_BAND_ROWS = 2
+
+# Номер ячейки в базе данных (ограничение ck_buildings_geo_cell). Должно совпадать с geo_cell()
+GEO_CELL_SQL = (
+    f"least(greatest(floor((latitude::numeric + 90) / {GEO_CELL_DEGREES}), 0), {GEO_CELL_ROWS - 1})::integer"
+    f" * {GEO_CELL_COLUMNS}"
+    f" + least(greatest(floor((longitude::numeric + 180) / {GEO_CELL_DEGREES}), 0), {GEO_CELL_COLUMNS - 1})::integer"
+)
+
+# Запас на погрешность границ запроса (градусы)
+_EPSILON = 1e-9
+
+# Длина градуса широты на экваторе (минимальная) и градуса долготы на экваторе, км
+_KM_PER_DEGREE_LAT = 110.574
+_KM_PER_DEGREE_LON = 111.320
+
+# Ближе к полюсу области запросов в радиусе не ограничиваются по долготе
+_MAX_RADIUS_LATITUDE = 89.0
+
+Coordinate = Union[str, float, Decimal]
+
+
+def _index(value: Decimal, offset: int, count: int) -> int:
+    index = int(((value + offset) / GEO_CELL_DEGREES).to_integral_value(rounding=ROUND_FLOOR))
+    return min(max(index, 0), count - 1)
+
+
+def geo_cell(latitude: Coordinate, longitude: Coordinate) -> int:
+    """Номер ячейки сетки для координат здания"""
+    row = _index(Decimal(str(latitude).strip()), 90, GEO_CELL_ROWS)
+    col = _index(Decimal(str(longitude).strip()), 180, GEO_CELL_COLUMNS)
+    return row * GEO_CELL_COLUMNS + col
+
+
+def geo_partition(cell: int) -> int:
+    """Номер секции (полосы широт) для ячейки: {таблица}_p{номер}"""
+    return cell // (GEO_PARTITION_BAND_ROWS * GEO_CELL_COLUMNS)
+
+
+def _span(min_value: float, max_value: float, offset: int, count: int) -> Tuple[int, int]:
+    """Диапазон индексов строк или столбцов сетки, покрывающий отрезок с запасом"""
+    return (
+        _index(Decimal(repr(min_value - _EPSILON)), offset, count),
+        _index(Decimal(repr(max_value + _EPSILON)), offset, count),
+    )
+
+
+def geo_cells_for_bbox(
+    min_lat: float, max_lat: float, min_lon: float, max_lon: float
+) -> Optional[List[int]]:
+    """
+    Ячейки, пересекающие прямоугольную область
+
+    Долгота вне [-180, 180] переносится через антимеридиан (min_lon > max_lon -
+    область через антимеридиан).
+
+    Returns:
+        list: номера ячеек по возрастанию (пустой, если область пуста), или None,
+            если ячеек больше settings.geo_partition_max_cells (ограничение по ячейкам
+            не даст выигрыша)
+    """
+    if min_lat > max_lat:
+        return []
+
+    if max_lon - min_lon >= 360:
+        lon_ranges = [(-180.0, 180.0)]
+    else:
+        if min_lon < -180 or min_lon > 180:
+            min_lon = (min_lon + 180) % 360 - 180
+        if max_lon < -180 or max_lon > 180:
+            max_lon = (max_lon + 180) % 360 - 180
+        if min_lon <= max_lon:
+            lon_ranges = [(min_lon, max_lon)]
+        else:
+            lon_ranges = [(min_lon, 180.0), (-180.0, max_lon)]
+
+    first_row, last_row = _span(min_lat, max_lat, 90, GEO_CELL_ROWS)
+    columns = set()
+    for lon_min, lon_max in lon_ranges:
+        first_col, last_col = _span(lon_min, lon_max, 180, GEO_CELL_COLUMNS)
+        columns.update(range(first_col, last_col + 1))
+
+    if (last_row - first_row + 1) * len(columns) > settings.geo_partition_max_cells:
+        return None
+    return sorted(
+        row * GEO_CELL_COLUMNS + col for row in range(first_row, last_row + 1) for col in columns
+    )
+
+
+def geo_cells_for_radius(latitude: float, longitude: float, radius_km: float) -> Optional[List[int]]:
+    """
+    Ячейки, которые может задеть круг радиуса radius_km вокруг точки
+
+    Круг заменяется описанным прямоугольником с запасом 1%: градус широты берётся
+    минимальной длины, градус долготы - на наибольшей по модулю широте круга.
+
+    Returns:
+        list: номера ячеек, или None, если круг доходит до полюса или ячеек слишком много
+    """
+    dlat = radius_km * 1.01 / _KM_PER_DEGREE_LAT
+    max_abs_lat = abs(latitude) + dlat
+    if max_abs_lat >= _MAX_RADIUS_LATITUDE:
+        return None
+    dlon = radius_km * 1.01 / (_KM_PER_DEGREE_LON * math.cos(math.radians(max_abs_lat)))
+    if dlon >= 180:
+        return None
+    return geo_cells_for_bbox(latitude - dlat, latitude + dlat, longitude - dlon, longitude + dlon)
@@ -0,0 +1,251 @@
+"""
+Пространственный индекс зданий в памяти процесса
+
+Координаты зданий хранятся в массивах NumPy, отсортированных по ячейке
+равномерной сетки (cell_degrees градусов). Поиск в радиусе и прямоугольнике
+выбирает кандидатов из ячеек, пересекающих область (бинарный поиск по ключам
+ячеек), и проверяет их векторизованно (haversine). Вместе с координатами
+хранится число организаций в здании, поэтому общее количество и состав
+страницы определяются без обращения к базе данных.
+
+Индекс перестраивается при изменении версии данных (change_seq), версия
+проверяется не чаще раза в refresh_interval секунд.
+"""
+
+import math
+import threading
+import time
+from typing import List, Optional, Tuple
+from uuid import UUID
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Building, Organization
+import logging
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = 111320.0
+
+
+class GeoIndex:
+    """Неизменяемый снимок координат зданий с сеточным индексом"""
+
+    def __init__(
+        self,
+        ids: List[UUID],
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        org_counts: np.ndarray,
+        cell_degrees: float,
+        version: int = 0
+    ):
+        self.cell_degrees = cell_degrees
+        self.version = version
+        self.columns = int(math.ceil(360.0 / cell_degrees)) + 1
+
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        keys = self._cell_rows(latitudes) * self.columns + self._cell_columns(longitudes)
+        order = np.argsort(keys, kind="stable")
+
+        self.keys = keys[order]
+        self.ids = [ids[i] for i in order]
+        self.latitudes = latitudes[order]
+        self.longitudes = longitudes[order]
+        self.org_counts = np.asarray(org_counts, dtype=np.int64)[order]
+        self._lat_rad = np.radians(self.latitudes)
+        self._lon_rad = np.radians(self.longitudes)
+        self._cos_lat = np.cos(self._lat_rad)
+
+    @classmethod
+    def load(cls, db: Session, cell_degrees: float, version: int) -> "GeoIndex":
+        """Построить индекс по зданиям из базы данных (один запрос)"""
+        rows = db.execute(
+            select(Building.id, Building.latitude, Building.longitude, func.count(Organization.id))
+            .outerjoin(Organization, Organization.building_id == Building.id)
+            .group_by(Building.id)
+        ).all()
+        return cls(
+            ids=[row[0] for row in rows],
+            latitudes=np.fromiter((float(row[1]) for row in rows), dtype=np.float64, count=len(rows)),
+            longitudes=np.fromiter((float(row[2]) for row in rows), dtype=np.float64, count=len(rows)),
+            org_counts=np.fromiter((row[3] for row in rows), dtype=np.int64, count=len(rows)),
+            cell_degrees=cell_degrees,
+            version=version
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _cell_rows(self, latitudes):
+        return np.floor((np.asarray(latitudes) + 90.0) / self.cell_degrees).astype(np.int64)
+
+    def _cell_columns(self, longitudes):
+        return np.floor((np.asarray(longitudes) + 180.0) / self.cell_degrees).astype(np.int64)
+
+    def _candidates(self, min_lat: float, max_lat: float, lon_ranges: List[Tuple[float, float]]) -> np.ndarray:
+        """Позиции зданий в ячейках, пересекающих прямоугольник"""
+        if not len(self.ids):
+            return np.empty(0, dtype=np.int64)
+
+        rows = np.arange(int(self._cell_rows(max(min_lat, -90.0))), int(self._cell_rows(min(max_lat, 90.0))) + 1)
+        chunks = []
+        for min_lon, max_lon in lon_ranges:
+            first = rows * self.columns + int(self._cell_columns(min_lon))
+            last = rows * self.columns + int(self._cell_columns(max_lon))
+            starts = np.searchsorted(self.keys, first, side="left")
+            ends = np.searchsorted(self.keys, last, side="right")
+            chunks.extend(np.arange(start, end) for start, end in zip(starts, ends) if end > start)
+        if not chunks:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(chunks)
+
+    def distances(self, positions: np.ndarray, latitude: float, longitude: float) -> np.ndarray:
+        """Расстояния в метрах от точки до зданий (формула haversine)"""
+        lat = math.radians(latitude)
+        lon = math.radians(longitude)
+        d_lat = self._lat_rad[positions] - lat
+        d_lon = self._lon_rad[positions] - lon
+        a = np.sin(d_lat / 2) ** 2 + math.cos(lat) * self._cos_lat[positions] * np.sin(d_lon / 2) ** 2
+        return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def within_radius(self, latitude: float, longitude: float, radius_km: float) -> np.ndarray:
+        """Позиции зданий в радиусе, по возрастанию расстояния"""
+        radius_m = radius_km * 1000
+        d_lat = radius_m / METERS_PER_DEGREE
+        cos_lat = math.cos(math.radians(min(abs(latitude) + d_lat, 90.0)))
+        d_lon = radius_m / (METERS_PER_DEGREE * cos_lat) if cos_lat > 1e-6 else 360.0
+
+        if d_lon >= 180.0:
+            lon_ranges = [(-180.0, 180.0)]
+        else:
+            lon_ranges = self._lon_ranges(longitude - d_lon, longitude + d_lon)
+
+        positions = self._candidates(latitude - d_lat, latitude + d_lat, lon_ranges)
+        distances = self.distances(positions, latitude, longitude)
+        inside = distances <= radius_m
+        positions, distances = positions[inside], distances[inside]
+        return positions[np.argsort(distances, kind="stable")]
+
+    def within_bbox(
+        self, min_lat: float, max_lat: float, min_lon: float, max_lon: float,
+        latitude: float, longitude: float
+    ) -> np.ndarray:
+        """Позиции зданий в прямоугольнике, по возрастанию расстояния от точки (latitude, longitude)"""
+        positions = self._candidates(min_lat, max_lat, [(min_lon, max_lon)])
+        lats = self.latitudes[positions]
+        lons = self.longitudes[positions]
+        inside = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+        positions = positions[inside]
+        return positions[np.argsort(self.distances(positions, latitude, longitude), kind="stable")]
+
+    @staticmethod
+    def _lon_ranges(min_lon: float, max_lon: float) -> List[Tuple[float, float]]:
+        """Диапазоны долгот с учётом перехода через ±180"""
+        if min_lon < -180.0:
+            return [(min_lon + 360.0, 180.0), (-180.0, max_lon)]
+        if max_lon > 180.0:
+            return [(min_lon, 180.0), (-180.0, max_lon - 360.0)]
+        return [(min_lon, max_lon)]
+
+    def page(self, positions: np.ndarray, page: int, size: int) -> Tuple[int, List[UUID], int]:
+        """
+        Разбить организации найденных зданий на страницы по числу организаций в зданиях
+
+        Returns:
+            tuple: (всего организаций, ID зданий страницы в порядке выдачи,
+                    сколько организаций первого здания пропустить)
+        """
+        counts = self.org_counts[positions]
+        cumulative = np.cumsum(counts)
+        total = int(cumulative[-1]) if len(cumulative) else 0
+
+        start = (page - 1) * size
+        end = start + size
+        if start >= total:
+            return total, [], 0
+
+        before = cumulative - counts
+        on_page = np.nonzero((cumulative > start) & (before < end) & (counts > 0))[0]
+        skip = start - int(before[on_page[0]])
+        return total, [self.ids[positions[i]] for i in on_page], skip
+
+
+class GeoIndexManager:
+    """
+    Актуальный индекс процесса
+
+    Версия данных проверяется не чаще раза в refresh_interval секунд; при изменении
+    индекс перестраивается одним потоком, остальные запросы пока используют прежний.
+    """
+
+    def __init__(self, cell_degrees: float, refresh_interval: float):
+        self.cell_degrees = cell_degrees
+        self.refresh_interval = refresh_interval
+        self._index: Optional[GeoIndex] = None
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    def get(self) -> GeoIndex:
+        """
+        Индекс, соответствующий текущей версии данных (с точностью до refresh_interval)
+
+        Версия и здания читаются из primary: версия - граница фиксации изменений,
+        и индекс строится по данным, в которых есть все изменения до неё.
+        """
+        index = self._index
+        checked_at = self._checked_at
+        if index is not None and checked_at is not None and time.monotonic() - checked_at < self.refresh_interval:
+            return index
+
+        blocking = index is None
+        if not self._lock.acquire(blocking=blocking):
+            return index
+        try:
+            if self._index is not None and self._checked_at != checked_at:
+                return self._index
+
+            from app.services import ChangeService
+            db = SessionLocal()
+            try:
+                version = ChangeService.get_data_version(db)
+                if self._index is None or self._index.version != version:
+                    started = time.perf_counter()
+                    self._index = GeoIndex.load(db, self.cell_degrees, version)
+                    self.rebuilds += 1
+                    logger.info(
+                        f"Геоиндекс перестроен: {len(self._index)} зданий, версия {version}, "
+                        f"{time.perf_counter() - started:.3f} с"
+                    )
+            finally:
+                db.close()
+            self._checked_at = time.monotonic()
+            return self._index
+        finally:
+            self._lock.release()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._index = None
+            self._checked_at = None
+
+
+geo_index = GeoIndexManager(
+    cell_degrees=settings.geo_index_cell_degrees,
+    refresh_interval=settings.geo_index_refresh_interval,
+)
+
+
+def preload_geo_index() -> int:
+    """
+    Построить индекс при старте процесса
+
+    Returns:
+        int: Количество зданий в индексе
+    """
+    return len(geo_index.get())
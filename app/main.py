@@ -1,17 +1,98 @@
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from sqlalchemy.exc import OperationalError
+from starlette.concurrency import run_in_threadpool
+from app.admission import admission_limiter
+from app.auth import preload_api_keys
+from app.compression import CompressionMiddleware, compressed_body_cache
 from app.config import settings
-from app.database import engine, Base
-from app.routers import organizations, buildings, activities
+from app.database import engine, pool_capacity, replica_router, warm_pool
+from app.profiling import ProfilingMiddleware
+from app.query_guard import QueryCostExceeded
+from app.responses import NegotiatedResponse, ContentNegotiationMiddleware
+from app.routers import organizations, buildings, activities, changes, snapshots, profiles
+from app.routers.activities import preload_activity_tree
+from app.singleflight import single_flight
+import anyio.to_thread
+import asyncio
 import logging
+import time
+
+# SQLSTATE отмены запроса (statement_timeout)
+QUERY_CANCELED = "57014"
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Создание таблиц в базе данных
-Base.metadata.create_all(bind=engine)
+
+def static_preloaders() -> Dict[str, Callable[[], Any]]:
+    """Загрузчики редко меняющихся данных: дерево видов деятельности, API ключи и геоиндекс"""
+    preloaders = {"activity_tree": preload_activity_tree, "api_keys": preload_api_keys}
+    if settings.geo_index_enabled:
+        # numpy импортируется, только если геоиндекс включён
+        from app.geo_index import preload_geo_index
+        preloaders["geo_index"] = preload_geo_index
+    return preloaders
+
+
+def preload_static_data() -> None:
+    """
+    Загрузить редко меняющиеся данные в кэши процесса
+
+    В режиме gunicorn вызывается в master-процессе до запуска воркеров (см. gunicorn.conf.py),
+    после чего соединения закрываются, чтобы воркеры не унаследовали сокеты.
+    """
+    for name, preload in static_preloaders().items():
+        try:
+            preload()
+        except Exception as e:
+            logger.warning(f"Предзагрузка {name} не выполнена: {e}")
+    dispose_engines()
+
+
+def dispose_engines(close: bool = True) -> None:
+    """Закрыть пулы соединений primary и реплик (close=False - только забыть унаследованные после fork)"""
+    engine.dispose(close=close)
+    for replica_engine in replica_router.engines:
+        replica_engine.dispose(close=close)
+
+
+async def warm_up() -> None:
+    """
+    Прогрев воркера: пул соединений primary, проверка реплик и загрузка редко меняющихся данных
+
+    Шаги выполняются параллельно; ошибка одного шага не мешает старту,
+    так как все компоненты инициализируются и при первом запросе.
+    """
+    started = time.perf_counter()
+    steps = {
+        "primary_pool": (warm_pool, engine, min(settings.startup_warm_connections, pool_capacity(engine))),
+        "replicas": (replica_router.check_all,),
+        **{name: (preload,) for name, preload in static_preloaders().items()},
+    }
+    results = await asyncio.gather(
+        *(run_in_threadpool(*step) for step in steps.values()),
+        return_exceptions=True
+    )
+    for name, result in zip(steps, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Прогрев {name} не выполнен: {result}")
+    logger.info(f"Прогрев воркера завершён за {time.perf_counter() - started:.3f} с")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Запуск и остановка воркера (схема базы данных управляется миграциями Alembic)"""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.threadpool_size
+    if settings.startup_warmup:
+        await warm_up()
+    yield
+    dispose_engines()
+
 
 # Создание FastAPI приложения
 app = FastAPI(
@@ -39,12 +120,27 @@ app = FastAPI(
     - Получение дерева видов деятельности
     - Получение информации о виде деятельности по ID
 
+    ### Изменения
+    - Лента изменений для инкрементальной синхронизации клиентов
+    - Офлайн-снимки всего справочника с дельтами между версиями
+
+    ## Форматы ответа
+
+    По умолчанию ответы передаются в JSON. С заголовком `Accept: application/msgpack`
+    ответы передаются в MessagePack. Списки организаций поддерживают параметр `normalize=true`:
+    здания и виды деятельности передаются один раз, а организации ссылаются на них по ID.
+    Ответы сжимаются gzip или brotli в соответствии с заголовком `Accept-Encoding`.
+
     ## Аутентификация
 
     Все запросы требуют API ключ в заголовке `X-API-Key`.
+    Для каждого ключа действует ограничение частоты запросов, при превышении
+    возвращается 429 с заголовком `Retry-After`.
     """,
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=NegotiatedResponse,
+    lifespan=lifespan
 )
 
 # Настройка CORS
@@ -56,10 +152,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Выбор формата ответа (JSON или MessagePack) по заголовку Accept
+app.add_middleware(ContentNegotiationMiddleware)
+
+# Сжатие ответов gzip/brotli; сжатые тела кэшируются и повторно не сжимаются
+if settings.compression_enabled:
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.compression_min_size)
+
+# Профилирование по заголовку X-Profile и выборочно (только при заданном ключе администратора);
+# подключается последним, чтобы в профиль попадали и остальные middleware
+if settings.admin_api_key:
+    app.add_middleware(ProfilingMiddleware)
+
 # Подключение роутеров
 app.include_router(organizations.router)
 app.include_router(buildings.router)
 app.include_router(activities.router)
+app.include_router(changes.router)
+app.include_router(snapshots.router)
+app.include_router(profiles.router)
 
 
 @app.get("/", tags=["Корневой эндпоинт"])
@@ -80,7 +191,60 @@ async def health_check():
     """
     Проверка здоровья приложения
     """
-    return {"status": "healthy", "version": settings.app_version}
+    return {
+        "status": "healthy",
+        "version": settings.app_version,
+        "replicas": replica_router.status()
+    }
+
+
+@app.get("/metrics/single-flight", tags=["Здоровье"])
+async def single_flight_metrics():
+    """
+    Метрики объединения одинаковых одновременных запросов в текущем воркере
+    """
+    return single_flight.stats()
+
+
+@app.get("/metrics/compression", tags=["Здоровье"])
+async def compression_metrics():
+    """
+    Метрики сжатия ответов и кэша сжатых тел в текущем воркере
+    """
+    return compressed_body_cache.stats()
+
+
+@app.get("/metrics/admission", tags=["Здоровье"])
+async def admission_metrics():
+    """
+    Метрики ограничения одновременных запросов по эндпоинтам в текущем воркере
+    """
+    return admission_limiter.stats()
+
+
+@app.exception_handler(QueryCostExceeded)
+async def query_cost_exception_handler(request, exc):
+    """
+    Запрос отклонён по оценке стоимости (app.query_guard)
+    """
+    logger.warning(f"Запрос {request.url.path} отклонён: стоимость {exc.cost:.0f} > {exc.limit:.0f}")
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
+@app.exception_handler(OperationalError)
+async def database_exception_handler(request, exc):
+    """
+    Запрос прерван по statement_timeout - 503 с Retry-After, остальные ошибки базы данных - 500
+    """
+    orig = exc.orig
+    if getattr(orig, "pgcode", None) == QUERY_CANCELED or getattr(orig, "sqlstate", None) == QUERY_CANCELED:
+        logger.warning(f"Запрос {request.url.path} прерван по statement_timeout")
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Запрос выполнялся слишком долго, уточните параметры или повторите позже"},
+            headers={"Retry-After": str(settings.admission_retry_after)}
+        )
+    return await general_exception_handler(request, exc)
 
 
 @app.exception_handler(HTTPException)
@@ -90,7 +254,8 @@ async def http_exception_handler(request, exc):
     """
     return JSONResponse(
         status_code=exc.status_code,
-        content={"detail": exc.detail}
+        content={"detail": exc.detail},
+        headers=getattr(exc, "headers", None)
     )
 
 
@@ -1,17 +1,33 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Table, Text, CheckConstraint
+from sqlalchemy import (
+    Column, Integer, String, ForeignKey, Table, Text, CheckConstraint, Boolean, Float, DateTime, func,
+    Index, FetchedValue, BigInteger, Sequence, Computed, ForeignKeyConstraint, UniqueConstraint,
+    select
+)
 from sqlalchemy.orm import relationship
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, UUID
 from geoalchemy2 import Geography
+from app.config import settings
 from app.database import Base
+from app.geo_cells import GEO_CELL_SQL, geo_cell
 import uuid
 
 
+# Глобальный монотонный счётчик изменений (токен синхронизации клиентов)
+change_seq_sequence = Sequence('change_seq', metadata=Base.metadata)
+
+# Канонический вид телефона: только цифры, российский префикс 8 перед
+# десятизначным номером заменяется на 7. Должно совпадать с schemas.normalize_phone
+PHONE_NORMALIZED_SQL = r"regexp_replace(regexp_replace(phone, '[^0-9]', '', 'g'), '^8([0-9]{10})$', '7\1')"
+
 # Таблица связи организаций и телефонов
 organization_phones = Table(
     'organization_phones',
     Base.metadata,
     Column('organization_id', UUID(as_uuid=True), ForeignKey('organizations.id'), primary_key=True),
-    Column('phone', String(20), primary_key=True)
+    Column('phone', String(20), primary_key=True),
+    # Вычисляется базой данных при записи, поиск по номеру - одна проба индекса
+    Column('phone_normalized', String(20), Computed(PHONE_NORMALIZED_SQL, persisted=True), nullable=False),
+    Index('ix_organization_phones_phone_normalized', 'phone_normalized', 'organization_id')
 )
 
 # Таблица связи организаций и видов деятельности
@@ -23,6 +39,18 @@ organization_activities = Table(
 )
 
 
+def _building_geo_cell(context):
+    """Ячейка сетки здания по его координатам (если не задана явно)"""
+    params = context.get_current_parameters()
+    return geo_cell(params["latitude"], params["longitude"])
+
+
+def _organization_geo_cell(context):
+    """Ячейка сетки организации - ячейка её здания (если не задана явно)"""
+    building_id = context.get_current_parameters()["building_id"]
+    return context.connection.scalar(select(Building.geo_cell).where(Building.id == building_id))
+
+
 class Building(Base):
     """Модель здания"""
     __tablename__ = "buildings"
@@ -32,6 +60,19 @@ class Building(Base):
     latitude = Column(String(20), nullable=False)
     longitude = Column(String(20), nullable=False)
     coordinates = Column(Geography(geometry_type='POINT', srid=4326), nullable=False)
+    # Ячейка географической сетки (app.geo_cells) - ключ секционирования; задаётся приложением,
+    # соответствие координатам проверяет ограничение ck_buildings_geo_cell
+    geo_cell = Column(Integer, nullable=False, default=_building_geo_cell)
+
+    # Отслеживание изменений: заполняются триггером track_change
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), server_onupdate=FetchedValue())
+    change_seq = Column(BigInteger, nullable=False, index=True, server_default=FetchedValue(), server_onupdate=FetchedValue())
+
+    __table_args__ = (
+        CheckConstraint(f'geo_cell = {GEO_CELL_SQL}', name='ck_buildings_geo_cell'),
+        # Цель составного внешнего ключа организаций
+        UniqueConstraint('id', 'geo_cell', name='uq_buildings_id_geo_cell'),
+    )
 
     # Связи
     organizations = relationship("Organization", back_populates="building")
@@ -47,12 +88,24 @@ class Activity(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String(200), nullable=False)
     parent_id = Column(UUID(as_uuid=True), ForeignKey('activities.id'), nullable=True)
-    level = Column(Integer, nullable=False, default=1)
+
+    # Уровень и материализованный путь (ID предков через "/") вычисляются триггером
+    # activities_hierarchy по parent_id, он же проверяет циклы и глубину дерева
+    # (функции и триггеры создаются миграцией 0002)
+    level = Column(Integer, nullable=False, server_default=FetchedValue(), server_onupdate=FetchedValue())
+    path = Column(Text, nullable=False, server_default=FetchedValue(), server_onupdate=FetchedValue())
+
+    # Отслеживание изменений: заполняются триггером track_change
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), server_onupdate=FetchedValue())
+    change_seq = Column(BigInteger, nullable=False, index=True, server_default=FetchedValue(), server_onupdate=FetchedValue())
 
     # Ограничение на уровень вложенности
     __table_args__ = (
-        CheckConstraint('level <= 3', name='max_level_check'),
+        CheckConstraint(f'level BETWEEN 1 AND {settings.max_activity_levels}', name='max_level_check'),
+        Index('ix_activities_path', 'path', postgresql_ops={'path': 'text_pattern_ops'}),
+        Index('ix_activities_parent_id', 'parent_id'),
     )
+    __mapper_args__ = {"eager_defaults": True}
 
     # Связи
     parent = relationship("Activity", remote_side=[id], back_populates="children")
@@ -69,7 +122,24 @@ class Organization(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String(300), nullable=False)
-    building_id = Column(UUID(as_uuid=True), ForeignKey('buildings.id'), nullable=False)
+    building_id = Column(UUID(as_uuid=True), nullable=False)
+    # Ячейка сетки здания: входит во внешний ключ, при переносе здания в другую ячейку
+    # обновляется каскадно
+    geo_cell = Column(Integer, nullable=False, default=_organization_geo_cell)
+
+    # Отслеживание изменений: заполняются триггером track_change
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), server_onupdate=FetchedValue())
+    change_seq = Column(BigInteger, nullable=False, index=True, server_default=FetchedValue(), server_onupdate=FetchedValue())
+
+    # Организации здания по возрастанию ID (порции с курсором в ответе здания)
+    __table_args__ = (
+        Index('ix_organizations_building_id_id', 'building_id', 'id'),
+        ForeignKeyConstraint(
+            ['building_id', 'geo_cell'], ['buildings.id', 'buildings.geo_cell'],
+            onupdate='CASCADE', name='fk_organizations_building_geo_cell'
+        ),
+        UniqueConstraint('id', 'geo_cell', name='uq_organizations_id_geo_cell'),
+    )
 
     # Связи
     building = relationship("Building", back_populates="organizations")
@@ -92,3 +162,49 @@ class Organization(Base):
 
     def __repr__(self):
         return f"<Organization(id={self.id}, name='{self.name}')>"
+
+
+# Записи об удалённых организациях, зданиях и видах деятельности для ленты изменений
+# (заполняются триггером track_delete, функции и триггеры отслеживания изменений
+# создаются миграцией 0003)
+deleted_records = Table(
+    'deleted_records',
+    Base.metadata,
+    Column('change_seq', BigInteger, primary_key=True),
+    Column('entity_type', String(20), nullable=False),
+    Column('entity_id', UUID(as_uuid=True), nullable=False),
+    Column('deleted_at', DateTime(timezone=True), nullable=False, server_default=func.now())
+)
+
+
+class ApiKey(Base):
+    """Модель API ключа клиента (хранится только хэш ключа)"""
+    __tablename__ = "api_keys"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    name = Column(String(200), nullable=False)
+    key_hash = Column(String(64), nullable=False, unique=True)
+    is_active = Column(Boolean, nullable=False, default=True)
+
+    # Индивидуальные лимиты; NULL - значения по умолчанию из настроек
+    rate_limit = Column(Float, nullable=True)
+    rate_limit_burst = Column(Integer, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    def __repr__(self):
+        return f"<ApiKey(id={self.id}, name='{self.name}', is_active={self.is_active})>"
+
+
+class SearchArea(Base):
+    """Именованная область поиска организаций (POST /api/organizations/in-area/)"""
+    __tablename__ = "search_areas"
+
+    name = Column(String(100), primary_key=True)
+    # Исходный GeoJSON и подготовленные части области (EWKT, после ST_Subdivide)
+    geometry = Column(JSONB, nullable=False)
+    parts = Column(ARRAY(Text), nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<SearchArea(name='{self.name}', parts={len(self.parts)})>"
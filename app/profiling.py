@@ -0,0 +1,260 @@
+"""
+Профилирование запросов по требованию и выборочно
+
+Запрос с заголовком X-Profile и ключом администратора в X-Admin-Key профилируется
+целиком: профиль сохраняется в кольцевой буфер воркера (ID - в заголовке ответа
+X-Profile-Id), а при X-Profile: inline отчёт возвращается вместо ответа. Кроме того,
+доля settings.profiling_sample_rate всех запросов профилируется выборочно. Профили
+из буфера выдаются по одному и сводным файлом через /admin/profiles.
+
+Используется pyinstrument, если он установлен (учитывает только задачу asyncio своего
+запроса), иначе cProfile. cProfile профилирует поток целиком, поэтому в профиль попадают
+и корутины других запросов, выполнявшиеся в это время в том же цикле событий.
+Синхронные эндпоинты выполняются в пуле потоков, их работа попадает в профиль
+как ожидание результата потока.
+В воркере одновременно профилируется не больше одного запроса.
+"""
+
+import cProfile
+import io
+import itertools
+import marshal
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from starlette.datastructures import MutableHeaders
+from app.auth import is_admin_key
+from app.config import settings
+
+try:
+    import pyinstrument
+    from pyinstrument.renderers import ConsoleRenderer, HTMLRenderer
+    from pyinstrument.session import Session as PyinstrumentSession
+except ImportError:  # pyinstrument - необязательная зависимость
+    pyinstrument = None
+
+
+def profiling_engine() -> str:
+    """Профилировщик воркера: "pyinstrument" (если установлен и не выбран cProfile) или "cprofile\""""
+    if settings.profiling_engine == "cprofile" or pyinstrument is None:
+        return "cprofile"
+    return "pyinstrument"
+
+
+@dataclass
+class ProfileRecord:
+    """Профиль одного запроса"""
+    id: int
+    method: str
+    path: str
+    route: Optional[str]
+    status: Optional[int]
+    started_at: float
+    duration_ms: float
+    engine: str
+    sampled: bool
+    data: Any = field(repr=False)
+
+    def summary(self) -> Dict[str, Any]:
+        """Описание профиля без данных профилировщика"""
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3),
+            "engine": self.engine,
+            "sampled": self.sampled,
+        }
+
+
+class ProfileStore:
+    """Кольцевой буфер последних профилей воркера"""
+
+    def __init__(self, maxsize: int):
+        self._records: Deque[ProfileRecord] = deque(maxlen=maxsize)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    def add(self, record: ProfileRecord) -> None:
+        with self._lock:
+            self._records.append(record)
+
+    def get(self, profile_id: int) -> Optional[ProfileRecord]:
+        with self._lock:
+            return next((record for record in self._records if record.id == profile_id), None)
+
+    def list(self, route: Optional[str] = None) -> List[ProfileRecord]:
+        """Профили (от старых к новым), при route - только запросы к этому эндпоинту"""
+        with self._lock:
+            return [record for record in self._records if route is None or record.route == route]
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._records)
+            self._records.clear()
+            return count
+
+
+profile_store = ProfileStore(maxsize=settings.profiling_buffer_size)
+
+
+def render_report(record: ProfileRecord) -> str:
+    """Текстовый отчёт по профилю: дерево вызовов pyinstrument или таблица cProfile по cumulative"""
+    if record.engine == "pyinstrument":
+        return ConsoleRenderer(unicode=True, color=False).render(record.data)
+
+    stream = io.StringIO()
+    pstats.Stats(record.data, stream=stream).sort_stats("cumulative").print_stats(settings.profiling_report_lines)
+    return stream.getvalue()
+
+
+def aggregate_profiles(records: List[ProfileRecord]) -> Tuple[bytes, str, str]:
+    """
+    Сводный профиль нескольких запросов одним файлом
+
+    Returns:
+        tuple: (содержимое, тип содержимого, имя файла): для cProfile - файл pstats
+            (.prof, открывается pstats/snakeviz), для pyinstrument - HTML-отчёт
+    """
+    cprofile_records = [record for record in records if record.engine == "cprofile"]
+    if len(cprofile_records) < len(records):
+        session = None
+        for record in records:
+            if record.engine == "pyinstrument":
+                session = record.data if session is None else PyinstrumentSession.combine(session, record.data)
+        return HTMLRenderer().render(session).encode(), "text/html; charset=utf-8", "profiles.html"
+
+    stats = pstats.Stats()
+    for record in cprofile_records:
+        stats.add(record.data)
+    return marshal.dumps(stats.stats), "application/octet-stream", "profiles.prof"
+
+
+class _Profiler:
+    """Запуск и остановка выбранного профилировщика"""
+
+    def __init__(self, engine: str):
+        self.engine = engine
+        if engine == "pyinstrument":
+            self._profiler = pyinstrument.Profiler(async_mode="enabled")
+        else:
+            self._profiler = cProfile.Profile()
+
+    def start(self) -> None:
+        if self.engine == "pyinstrument":
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self) -> Any:
+        """Остановить и вернуть данные профиля (сессия pyinstrument или остановленный cProfile.Profile)"""
+        if self.engine == "pyinstrument":
+            return self._profiler.stop()
+        self._profiler.disable()
+        self._profiler.create_stats()
+        return self._profiler
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware: профилирование запроса по заголовку X-Profile или выборочно
+
+    X-Profile: 1 (или store) - профиль сохраняется в буфер, ответ получает заголовок
+    X-Profile-Id; X-Profile: inline - вместо ответа возвращается текстовый отчёт
+    (статус исходного ответа - в заголовке X-Profiled-Status). Заголовок учитывается
+    только вместе с верным ключом администратора в X-Admin-Key.
+    """
+
+    def __init__(self, app, store: Optional[ProfileStore] = None):
+        self.app = app
+        self.store = store or profile_store
+        self._busy = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        mode = self._requested_mode(scope)
+        rate = settings.profiling_sample_rate
+        sampled = mode is None and rate > 0 and random.random() < rate
+        if (mode is None and not sampled) or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self._profile(scope, receive, send, mode, sampled)
+        finally:
+            self._busy.release()
+
+    @staticmethod
+    def _requested_mode(scope) -> Optional[str]:
+        """Режим профилирования из заголовков: "store", "inline" или None"""
+        mode = admin_key = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                mode = value.decode("latin-1").strip().lower()
+            elif name == b"x-admin-key":
+                admin_key = value.decode("latin-1")
+        if not mode or mode in ("0", "false") or not is_admin_key(admin_key):
+            return None
+        return "inline" if mode == "inline" else "store"
+
+    async def _profile(self, scope, receive, send, mode: Optional[str], sampled: bool) -> None:
+        profile_id = self.store.next_id()
+        status = None
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if mode == "store":
+                    MutableHeaders(raw=message["headers"])["X-Profile-Id"] = str(profile_id)
+            if mode != "inline":
+                await send(message)
+
+        profiler = _Profiler(profiling_engine())
+        started_at = time.time()
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            data = profiler.stop()
+            record = ProfileRecord(
+                id=profile_id,
+                method=scope["method"],
+                path=scope["path"],
+                route=getattr(scope.get("route"), "name", None),
+                status=status,
+                started_at=started_at,
+                duration_ms=(time.perf_counter() - started) * 1000,
+                engine=profiler.engine,
+                sampled=sampled,
+                data=data,
+            )
+            self.store.add(record)
+
+        if mode == "inline":
+            body = render_report(record).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"x-profile-id", str(profile_id).encode()),
+                    (b"x-profiled-status", str(status or 500).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
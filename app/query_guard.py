@@ -0,0 +1,85 @@
+"""
+Оценка стоимости запросов до выполнения
+
+EXPLAIN (без ANALYZE) только строит план: стоимость и число строк берутся из оценок
+планировщика, поэтому проверка стоит одного обращения к базе данных и не зависит от
+объёма данных. Запросы дороже settings.query_cost_limit отклоняются до выполнения
+или выполняются без точного подсчёта общего количества (settings.query_cost_action).
+"""
+
+from typing import Any, Dict, Optional
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from sqlalchemy.sql.visitors import InternalTraversal
+from app.config import settings
+
+
+class Explain(Executable, ClauseElement):
+    """
+    EXPLAIN (FORMAT JSON) для запроса SQLAlchemy с обычной передачей параметров
+
+    Ключ кэша складывается из ключа запроса и режима, поэтому скомпилированный
+    EXPLAIN кэшируется движком вместе с запросом, а не компилируется каждый раз.
+    """
+
+    _traverse_internals = [
+        ("statement", InternalTraversal.dp_clauseelement),
+        ("analyze", InternalTraversal.dp_boolean),
+    ]
+
+    def __init__(self, statement, analyze: bool = False):
+        self.statement = statement
+        self.analyze = analyze
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element: Explain, compiler, **kw) -> str:
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if element.analyze else "FORMAT JSON"
+    return f"EXPLAIN ({options}) " + compiler.process(element.statement, **kw)
+
+
+def explain(db: Session, statement, analyze: bool = False) -> Dict[str, Any]:
+    """
+    План запроса в формате JSON
+
+    Returns:
+        dict: Элемент результата EXPLAIN: {"Plan": {...}, ...}
+    """
+    result = db.execute(Explain(statement, analyze=analyze)).scalar()
+    return result[0]
+
+
+class QueryCostExceeded(Exception):
+    """Оценка стоимости запроса превышает бюджет"""
+
+    def __init__(self, cost: float, limit: float):
+        self.cost = cost
+        self.limit = limit
+        super().__init__(
+            "Запрос охватывает слишком много данных: уточните фильтры или уменьшите область поиска"
+        )
+
+
+def check_query_cost(db: Session, statement) -> Optional[int]:
+    """
+    Проверить оценку стоимости запроса по бюджету settings.query_cost_limit
+
+    Returns:
+        Optional[int]: None - запрос укладывается в бюджет (или проверка выключена);
+            при query_cost_action="estimate" и превышении бюджета - оценка числа строк
+            планировщиком, которую следует вернуть вместо точного count()
+
+    Raises:
+        QueryCostExceeded: Если бюджет превышен и query_cost_action="reject"
+    """
+    if settings.query_cost_limit <= 0:
+        return None
+
+    plan = explain(db, statement)["Plan"]
+    cost = plan["Total Cost"]
+    if cost <= settings.query_cost_limit:
+        return None
+    if settings.query_cost_action == "estimate":
+        return int(plan["Plan Rows"])
+    raise QueryCostExceeded(cost, settings.query_cost_limit)
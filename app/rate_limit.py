@@ -0,0 +1,71 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Hashable
+
+
+class TokenBucket:
+    """
+    Корзина токенов: пополняется со скоростью rate токенов в секунду
+    и вмещает не более capacity токенов
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+
+    def consume(self, tokens: float = 1.0) -> float:
+        """
+        Попытаться списать токены
+
+        Returns:
+            float: 0 если запрос разрешён, иначе время ожидания в секундах
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+
+class RateLimiterBackend(ABC):
+    """Интерфейс хранилища лимитов (в памяти процесса, Redis и т.п.)"""
+
+    @abstractmethod
+    def acquire(self, key: Hashable, rate: float, capacity: int) -> float:
+        """
+        Списать один токен для ключа
+
+        Returns:
+            float: 0 если запрос разрешён, иначе время ожидания в секундах
+        """
+
+
+class InMemoryRateLimiter(RateLimiterBackend):
+    """Лимиты в памяти процесса: у каждого воркера свои корзины"""
+
+    def __init__(self):
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: Hashable, rate: float, capacity: int) -> float:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None or bucket.rate != rate or bucket.capacity != capacity:
+                bucket = TokenBucket(rate, capacity)
+                self._buckets[key] = bucket
+            return bucket.consume()
+
+    def reset(self) -> None:
+        """Сбросить все корзины"""
+        with self._lock:
+            self._buckets.clear()
+
+
+# Хранилище лимитов по умолчанию
+rate_limiter: RateLimiterBackend = InMemoryRateLimiter()
@@ -0,0 +1,101 @@
+from contextvars import ContextVar
+from typing import Any, List, Mapping, Optional, Set, Union
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.background import BackgroundTask
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = {MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack"}
+
+# Формат ответа, выбранный для текущего запроса по заголовку Accept
+_response_format: ContextVar[str] = ContextVar("response_format", default="json")
+
+
+def negotiate_format(accept: str) -> str:
+    """
+    Выбрать формат ответа по заголовку Accept: "msgpack" или "json"
+
+    Учитываются q-параметры; при равном приоритете побеждает тип, указанный раньше.
+    """
+    best_format, best_quality = "json", -1.0
+    for media_range in accept.split(","):
+        media_type, _, params = media_range.strip().partition(";")
+        media_type = media_type.strip().lower()
+        if media_type in MSGPACK_MEDIA_TYPES:
+            candidate = "msgpack"
+        elif media_type in ("application/json", "application/*", "*/*"):
+            candidate = "json"
+        else:
+            continue
+
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > best_quality:
+            best_format, best_quality = candidate, quality
+
+    return best_format if best_quality > 0 else "json"
+
+
+class ContentNegotiationMiddleware:
+    """ASGI middleware: определяет формат ответа по Accept до вызова эндпоинта"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = ""
+        for name, value in scope["headers"]:
+            if name == b"accept":
+                accept = value.decode("latin-1")
+                break
+
+        token = _response_format.set(negotiate_format(accept) if accept else "json")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _response_format.reset(token)
+
+
+class NegotiatedResponse(JSONResponse):
+    """Ответ в JSON или MessagePack в зависимости от заголовка Accept запроса"""
+
+    # Сигнатура совпадает с JSONResponse: FastAPI определяет по ней код ответа
+    # по умолчанию при построении схемы OpenAPI
+    def __init__(
+        self,
+        content: Any,
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: Optional[str] = None,
+        background: Optional[BackgroundTask] = None,
+    ):
+        super().__init__(content, status_code, headers, media_type, background)
+        self.headers["Vary"] = "Accept"
+
+    def render(self, content: Any) -> bytes:
+        if _response_format.get() == "msgpack":
+            import msgpack
+            self.media_type = MSGPACK_MEDIA_TYPE
+            return msgpack.packb(content, use_bin_type=True)
+        return super().render(content)
+
+
+def render(model: Union[BaseModel, List[BaseModel]], exclude_unset: bool = False, exclude: Optional[Set[str]] = None) -> NegotiatedResponse:
+    """
+    Отдать модель (или список моделей) с согласованием формата в обход response_model эндпоинта
+
+    С exclude_unset в ответ попадают только явно заданные поля (выбор полей через fields),
+    поля из exclude не попадают в ответ.
+    """
+    return NegotiatedResponse(content=jsonable_encoder(model, exclude_unset=exclude_unset, exclude=exclude))
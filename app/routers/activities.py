@@ -1,17 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from uuid import UUID
 from typing import List
-from app.database import get_db
+from app.cache import TTLCache
+from app.database import SessionLocal, get_db, get_primary_db
+from app.admission import admission_dependency
 from app.auth import api_key_dependency
-from app.services import ActivityService
-from app.schemas import ActivityResponse, ActivityTreeResponse, PaginationParams, PaginatedResponse
+from app.responses import render
+from app.services import ActivityService, ChangeService
+from app.singleflight import single_flight
+from app.schemas import (
+    ActivityResponse, ActivityCreate, ActivityTreeResponse, ActivityTreeCountsResponse, PaginationParams,
+    PaginatedResponse
+)
 
-router = APIRouter(prefix="/api/activities", tags=["Виды деятельности"])
+router = APIRouter(prefix="/api/activities", tags=["Виды деятельности"], dependencies=[admission_dependency])
 
 
 @router.get("/", response_model=PaginatedResponse)
-async def get_activities(
+def get_activities(
     page: int = Query(1, ge=1, description="Номер страницы"),
     size: int = Query(20, ge=1, le=100, description="Размер страницы"),
     db: Session = Depends(get_db),
@@ -26,7 +33,7 @@ async def get_activities(
 
 
 @router.get("/{activity_id}", response_model=ActivityResponse)
-async def get_activity(
+def get_activity(
     activity_id: UUID,
     db: Session = Depends(get_db),
     _: bool = api_key_dependency
@@ -43,11 +50,131 @@ async def get_activity(
 
 @router.get("/tree/", response_model=List[ActivityTreeResponse])
 async def get_activity_tree(
-    db: Session = Depends(get_db),
+    with_counts: bool = Query(
+        False, description="Добавить в узлы число организаций: с этим видом деятельности и во всём поддереве"
+    ),
     _: bool = api_key_dependency
 ):
     """
     Получить дерево видов деятельности (только корневые элементы с дочерними)
     """
-    activities = ActivityService.get_activity_tree(db)
-    return activities
+    if with_counts:
+        tree = await single_flight.do(("activity_tree", "counts"), _load_activity_tree_with_counts)
+        return render(tree)
+    return await single_flight.do(("activity_tree",), _load_activity_tree)
+
+
+# Сериализованное дерево для последней версии видов деятельности: (версия, дерево).
+# В режиме gunicorn заполняется до запуска воркеров и разделяется между ними (copy-on-write)
+_activity_tree_cache = TTLCache(maxsize=1)
+
+
+def _load_activity_tree() -> List[ActivityTreeResponse]:
+    """
+    Загрузить и сериализовать дерево (результат разделяется между одинаковыми запросами)
+
+    Версия и дерево читаются из primary: дерево, прочитанное после версии, содержит все
+    изменения до неё, а реплика могла бы вернуть более старое дерево под новой версией.
+    """
+    db = SessionLocal()
+    try:
+        version = ActivityService.get_tree_version(db)
+        cached = _activity_tree_cache.get("tree")
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        tree = [ActivityTreeResponse.model_validate(activity) for activity in ActivityService.get_activity_tree(db)]
+    finally:
+        db.close()
+
+    _activity_tree_cache.set("tree", (version, tree))
+    return tree
+
+
+# Дерево с числом организаций для последней версии данных (любое изменение организаций
+# или их связей): (версия, дерево)
+_activity_tree_counts_cache = TTLCache(maxsize=1)
+
+
+def _load_activity_tree_with_counts() -> List[ActivityTreeCountsResponse]:
+    """
+    Дерево с числом организаций: считается одним запросом на версию данных
+
+    Версия и число организаций читаются из primary (версия - граница фиксации изменений),
+    кэш хранит только последнюю версию: версия сравнивается на равенство.
+    """
+    primary_db = SessionLocal()
+    try:
+        version = ChangeService.get_data_version(primary_db)
+        cached = _activity_tree_counts_cache.get("counts")
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        counts = ActivityService.get_organization_counts(primary_db)
+    finally:
+        primary_db.close()
+
+    tree = [ActivityTreeCountsResponse.from_tree(node, counts) for node in _load_activity_tree()]
+    _activity_tree_counts_cache.set("counts", (version, tree))
+    return tree
+
+
+def preload_activity_tree() -> int:
+    """
+    Загрузить дерево в кэш процесса (прогрев при старте)
+
+    Returns:
+        int: Количество корневых видов деятельности
+    """
+    return len(_load_activity_tree())
+
+
+@router.post("/", response_model=ActivityResponse, status_code=201)
+def create_activity(
+    data: ActivityCreate,
+    db: Session = Depends(get_primary_db),
+    _: bool = api_key_dependency
+):
+    """
+    Создать вид деятельности. Уровень вложенности вычисляется по родителю
+    """
+    try:
+        return ActivityService.create_activity(db, data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.put("/{activity_id}", response_model=ActivityResponse)
+def update_activity(
+    activity_id: UUID,
+    data: ActivityCreate,
+    db: Session = Depends(get_primary_db),
+    _: bool = api_key_dependency
+):
+    """
+    Обновить название и родителя вида деятельности
+    """
+    try:
+        activity = ActivityService.update_activity(db, activity_id, data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not activity:
+        raise HTTPException(status_code=404, detail="Вид деятельности не найден")
+
+    return activity
+
+
+@router.delete("/{activity_id}", status_code=204)
+def delete_activity(
+    activity_id: UUID,
+    db: Session = Depends(get_primary_db),
+    _: bool = api_key_dependency
+):
+    """
+    Удалить вид деятельности (только если у него нет дочерних и связанных организаций)
+    """
+    try:
+        deleted = ActivityService.delete_activity(db, activity_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Вид деятельности не найден")
+    return Response(status_code=204)
@@ -1,40 +1,144 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
+from typing import FrozenSet, Optional, Union
 from uuid import UUID
-from app.database import get_db
+from app.database import get_db, get_primary_db
+from app.admission import admission_dependency
 from app.auth import api_key_dependency
+from app.responses import render
 from app.services import BuildingService
-from app.schemas import BuildingResponse, PaginationParams, PaginatedResponse
+from app.schemas import (
+    BuildingResponse, BuildingCreate, PaginationParams, PaginatedResponse,
+    BuildingPartialResponse, PartialPaginatedResponse, BuildingWithOrganizationsResponse, BUILDING_FIELDS,
+    parse_fields
+)
 
-router = APIRouter(prefix="/api/buildings", tags=["Здания"])
+router = APIRouter(prefix="/api/buildings", tags=["Здания"], dependencies=[admission_dependency])
+
+
+FIELDS_QUERY = Query(
+    None, description=f"Поля ответа через запятую ({', '.join(BUILDING_FIELDS)}); id возвращается всегда"
+)
+
+
+def _selected_fields(fields: Optional[str]) -> Optional[FrozenSet[str]]:
+    """Разобрать параметр fields; некорректное значение - ошибка 400"""
+    try:
+        return parse_fields(fields, BUILDING_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/", response_model=PaginatedResponse)
-async def get_buildings(
+def get_buildings(
     page: int = Query(1, ge=1, description="Номер страницы"),
     size: int = Query(20, ge=1, le=100, description="Размер страницы"),
+    fields: Optional[str] = FIELDS_QUERY,
     db: Session = Depends(get_db),
     _: bool = api_key_dependency
 ):
     """
     Получить список всех зданий с пагинацией
     """
+    selected = _selected_fields(fields)
     pagination = PaginationParams(page=page, size=size)
-    result = BuildingService.get_buildings(db, pagination)
+    result = BuildingService.get_buildings(db, pagination, selected)
+    if selected is not None:
+        return render(PartialPaginatedResponse.from_buildings(result, selected), exclude_unset=True)
     return PaginatedResponse(**result)
 
 
-@router.get("/{building_id}", response_model=BuildingResponse)
-async def get_building(
+@router.get(
+    "/{building_id}",
+    response_model=BuildingResponse,
+    # С include=organizations возвращается BuildingWithOrganizationsResponse
+    responses={200: {"model": Union[BuildingResponse, BuildingWithOrganizationsResponse]}}
+)
+def get_building(
     building_id: UUID,
+    fields: Optional[str] = FIELDS_QUERY,
+    include: Optional[str] = Query(
+        None, description="organizations - добавить организации здания с телефонами и видами деятельности"
+    ),
+    limit: int = Query(100, ge=1, le=500, description="Максимум организаций в ответе (include=organizations)"),
+    cursor: Optional[UUID] = Query(None, description="Курсор из next_cursor для следующей порции организаций"),
     db: Session = Depends(get_db),
     _: bool = api_key_dependency
 ):
     """
-    Получить информацию о здании по его идентификатору
+    Получить информацию о здании по его идентификатору.
+
+    С include=organizations ответ содержит организации здания порциями по limit
+    (по возрастанию ID); следующая порция запрашивается с cursor=next_cursor.
     """
-    building = BuildingService.get_building_by_id(db, building_id)
+    if include is not None:
+        if include != "organizations":
+            raise HTTPException(status_code=400, detail="Параметр include принимает только значение organizations")
+        if fields is not None:
+            raise HTTPException(status_code=400, detail="Параметры fields и include нельзя использовать вместе")
+        result = BuildingService.get_building_with_organizations(db, building_id, limit, cursor)
+        if result is None:
+            raise HTTPException(status_code=404, detail="Здание не найдено")
+        return render(BuildingWithOrganizationsResponse.from_result(result))
+
+    selected = _selected_fields(fields)
+    building = BuildingService.get_building_by_id(db, building_id, selected)
     if not building:
         raise HTTPException(status_code=404, detail="Здание не найдено")
 
+    if selected is not None:
+        return render(BuildingPartialResponse.from_building(building, selected), exclude_unset=True)
     return building
+
+
+@router.post("/", response_model=BuildingResponse, status_code=201)
+def create_building(
+    data: BuildingCreate,
+    db: Session = Depends(get_primary_db),
+    _: bool = api_key_dependency
+):
+    """
+    Создать здание
+    """
+    try:
+        return BuildingService.create_building(db, data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.put("/{building_id}", response_model=BuildingResponse)
+def update_building(
+    building_id: UUID,
+    data: BuildingCreate,
+    db: Session = Depends(get_primary_db),
+    _: bool = api_key_dependency
+):
+    """
+    Обновить адрес и координаты здания
+    """
+    try:
+        building = BuildingService.update_building(db, building_id, data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not building:
+        raise HTTPException(status_code=404, detail="Здание не найдено")
+
+    return building
+
+
+@router.delete("/{building_id}", status_code=204)
+def delete_building(
+    building_id: UUID,
+    db: Session = Depends(get_primary_db),
+    _: bool = api_key_dependency
+):
+    """
+    Удалить здание (только если в нём нет организаций)
+    """
+    try:
+        deleted = BuildingService.delete_building(db, building_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Здание не найдено")
+    return Response(status_code=204)
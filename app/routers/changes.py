@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from app.database import get_primary_db
+from app.admission import admission_dependency
+from app.auth import api_key_dependency
+from app.services import ChangeService
+from app.schemas import ChangeFeedResponse
+
+router = APIRouter(prefix="/api/changes", tags=["Изменения"], dependencies=[admission_dependency])
+
+
+@router.get("", response_model=ChangeFeedResponse)
+def get_changes(
+    since: int = Query(0, ge=0, description="Токен последней синхронизации (next_token из предыдущего ответа)"),
+    limit: int = Query(1000, ge=1, le=5000, description="Максимальное количество изменений в ответе"),
+    db: Session = Depends(get_primary_db),
+    _: bool = api_key_dependency
+):
+    """
+    Получить организации, здания и виды деятельности, созданные, изменённые или удалённые
+    после указанного токена.
+
+    Для первой синхронизации передайте since=0. Сохраните next_token и используйте его
+    в следующем запросе; пока has_more равно true, изменения можно запрашивать сразу.
+    Изменения ещё не зафиксированных транзакций в ответ не попадают и будут выданы позже,
+    поэтому сохранённый токен никогда не пропускает изменений.
+    """
+    result = ChangeService.get_changes(db, since, limit)
+    return ChangeFeedResponse(**result)
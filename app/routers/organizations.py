@@ -1,31 +1,98 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import FrozenSet, Optional, Union
 from uuid import UUID
-from app.database import get_db
+from app.database import get_db, get_primary_db
+from app.admission import admission_dependency
 from app.auth import api_key_dependency
-from app.services import OrganizationService
+from app.responses import render
+from app.services import OrganizationService, AreaService
+from app.singleflight import single_flight
 from app.schemas import (
     OrganizationResponse, PaginationParams, OrganizationSearchParams,
-    PaginatedResponse
+    PaginatedResponse, NearbyBatchRequest, NearbyBatchResponse, AreaSearchRequest,
+    OrganizationCreate, OrganizationBulkRequest, OrganizationBulkResponse, NormalizedPaginatedResponse,
+    OrganizationPartialResponse, PartialPaginatedResponse, FacetedPaginatedResponse, ORGANIZATION_FIELDS,
+    parse_fields
 )
 
-router = APIRouter(prefix="/api/organizations", tags=["Организации"])
+router = APIRouter(prefix="/api/organizations", tags=["Организации"], dependencies=[admission_dependency])
+
+
+NORMALIZE_QUERY = Query(
+    False, description="Нормализованный ответ: здания и виды деятельности передаются один раз и указываются по ID"
+)
+
+
+FACETS_QUERY = Query(
+    False, description="Добавить фасеты: число организаций по видам деятельности (с учётом дерева) "
+                       "и по зданиям для текущих фильтров"
+)
+
+
+FIELDS_QUERY = Query(
+    None,
+    description=f"Поля ответа через запятую ({', '.join(ORGANIZATION_FIELDS)}); id возвращается всегда. "
+                "Невыбранные связи не загружаются из базы"
+)
+
+
+def _selected_fields(fields: Optional[str], normalize: bool = False) -> Optional[FrozenSet[str]]:
+    """Разобрать параметр fields; некорректное значение - ошибка 400"""
+    try:
+        selected = parse_fields(fields, ORGANIZATION_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if selected is not None and normalize:
+        raise HTTPException(status_code=400, detail="Параметры fields и normalize нельзя использовать вместе")
+    return selected
+
+
+def _paginated(
+    normalize: bool, fields: Optional[FrozenSet[str]], service_method, *args, **kwargs
+) -> Union[PaginatedResponse, NormalizedPaginatedResponse, PartialPaginatedResponse]:
+    """Выполнить сервисный метод и сериализовать страницу (для объединения одинаковых запросов)"""
+    result = service_method(*args, fields=fields, **kwargs)
+    if fields is not None:
+        return PartialPaginatedResponse.from_organizations(result, fields)
+    if normalize:
+        return NormalizedPaginatedResponse.from_page(result)
+    if "facets" in result:
+        return FacetedPaginatedResponse(**result)
+    return PaginatedResponse(**result)
+
+
+def _page_response(page: Union[PaginatedResponse, NormalizedPaginatedResponse, PartialPaginatedResponse]):
+    """
+    Нормализованная страница, страница с выбранными полями и страница с фасетами
+    отдаются в обход response_model эндпоинта
+    """
+    if isinstance(page, PartialPaginatedResponse):
+        return render(page, exclude_unset=True)
+    if isinstance(page, NormalizedPaginatedResponse):
+        return render(page, exclude=None if page.facets is not None else {"facets"})
+    if isinstance(page, FacetedPaginatedResponse):
+        return render(page)
+    return page
 
 
 @router.get("/", response_model=PaginatedResponse)
-async def get_organizations(
+def get_organizations(
     page: int = Query(1, ge=1, description="Номер страницы"),
     size: int = Query(20, ge=1, le=100, description="Размер страницы"),
     name: Optional[str] = Query(None, description="Фильтр по названию"),
     building_id: Optional[UUID] = Query(None, description="Фильтр по ID здания"),
     activity_id: Optional[UUID] = Query(None, description="Фильтр по ID вида деятельности"),
+    normalize: bool = NORMALIZE_QUERY,
+    fields: Optional[str] = FIELDS_QUERY,
+    facets: bool = FACETS_QUERY,
     db: Session = Depends(get_db),
     _: bool = api_key_dependency
 ):
     """
     Получить список всех организаций с возможностью фильтрации и пагинации
     """
+    selected = _selected_fields(fields, normalize)
     pagination = PaginationParams(page=page, size=size)
     search_params = OrganizationSearchParams(
         name=name,
@@ -33,72 +100,113 @@ async def get_organizations(
         activity_id=activity_id
     )
 
-    result = OrganizationService.get_organizations(db, pagination, search_params)
-    return PaginatedResponse(**result)
+    result = _paginated(
+        normalize, selected, OrganizationService.get_organizations, db, pagination, search_params, facets=facets
+    )
+    return _page_response(result)
 
 
 @router.get("/{organization_id}", response_model=OrganizationResponse)
-async def get_organization(
+def get_organization(
     organization_id: UUID,
+    fields: Optional[str] = FIELDS_QUERY,
     db: Session = Depends(get_db),
     _: bool = api_key_dependency
 ):
     """
     Получить информацию об организации по её идентификатору
     """
-    organization = OrganizationService.get_organization_by_id(db, organization_id)
+    selected = _selected_fields(fields)
+    organization = OrganizationService.get_organization_by_id(db, organization_id, selected)
     if not organization:
         raise HTTPException(status_code=404, detail="Организация не найдена")
 
+    if selected is not None:
+        return render(OrganizationPartialResponse.from_organization(organization, selected), exclude_unset=True)
     return organization
 
 
 @router.get("/search/", response_model=PaginatedResponse)
-async def search_organizations_by_name(
+def search_organizations_by_name(
     name: str = Query(..., description="Название организации для поиска"),
     page: int = Query(1, ge=1, description="Номер страницы"),
     size: int = Query(20, ge=1, le=100, description="Размер страницы"),
+    normalize: bool = NORMALIZE_QUERY,
+    fields: Optional[str] = FIELDS_QUERY,
+    facets: bool = FACETS_QUERY,
     db: Session = Depends(get_db),
     _: bool = api_key_dependency
 ):
     """
     Поиск организаций по названию
     """
+    selected = _selected_fields(fields, normalize)
     pagination = PaginationParams(page=page, size=size)
-    result = OrganizationService.search_organizations_by_name(db, name, pagination)
-    return PaginatedResponse(**result)
+    result = _paginated(
+        normalize, selected, OrganizationService.search_organizations_by_name, db, name, pagination, facets=facets
+    )
+    return _page_response(result)
 
 
 @router.get("/by-building/{building_id}", response_model=PaginatedResponse)
-async def get_organizations_by_building(
+def get_organizations_by_building(
     building_id: UUID,
     page: int = Query(1, ge=1, description="Номер страницы"),
     size: int = Query(20, ge=1, le=100, description="Размер страницы"),
+    normalize: bool = NORMALIZE_QUERY,
+    fields: Optional[str] = FIELDS_QUERY,
     db: Session = Depends(get_db),
     _: bool = api_key_dependency
 ):
     """
     Получить список всех организаций, находящихся в конкретном здании
     """
+    selected = _selected_fields(fields, normalize)
     pagination = PaginationParams(page=page, size=size)
-    result = OrganizationService.get_organizations_by_building(db, building_id, pagination)
-    return PaginatedResponse(**result)
+    result = _paginated(normalize, selected, OrganizationService.get_organizations_by_building, db, building_id, pagination)
+    return _page_response(result)
+
+
+@router.get("/by-phone/{phone}", response_model=PaginatedResponse)
+def get_organizations_by_phone(
+    phone: str,
+    page: int = Query(1, ge=1, description="Номер страницы"),
+    size: int = Query(20, ge=1, le=100, description="Размер страницы"),
+    normalize: bool = NORMALIZE_QUERY,
+    fields: Optional[str] = FIELDS_QUERY,
+    db: Session = Depends(get_db),
+    _: bool = api_key_dependency
+):
+    """
+    Найти организации по номеру телефона.
+    Формат записи номера не важен: "8-923-666-13-13", "+79236661313" и "8 (923) 666 13 13" совпадают.
+    """
+    selected = _selected_fields(fields, normalize)
+    pagination = PaginationParams(page=page, size=size)
+    try:
+        result = _paginated(normalize, selected, OrganizationService.get_organizations_by_phone, db, phone, pagination)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _page_response(result)
 
 
 @router.get("/by-activity/{activity_id}", response_model=PaginatedResponse)
-async def get_organizations_by_activity(
+def get_organizations_by_activity(
     activity_id: UUID,
     page: int = Query(1, ge=1, description="Номер страницы"),
     size: int = Query(20, ge=1, le=100, description="Размер страницы"),
+    normalize: bool = NORMALIZE_QUERY,
+    fields: Optional[str] = FIELDS_QUERY,
     db: Session = Depends(get_db),
     _: bool = api_key_dependency
 ):
     """
     Получить список всех организаций, которые относятся к указанному виду деятельности
     """
+    selected = _selected_fields(fields, normalize)
     pagination = PaginationParams(page=page, size=size)
-    result = OrganizationService.get_organizations_by_activity(db, activity_id, pagination)
-    return PaginatedResponse(**result)
+    result = _paginated(normalize, selected, OrganizationService.get_organizations_by_activity, db, activity_id, pagination)
+    return _page_response(result)
 
 
 @router.get("/by-activity-tree/{activity_id}", response_model=PaginatedResponse)
@@ -106,6 +214,8 @@ async def get_organizations_by_activity_tree(
     activity_id: UUID,
     page: int = Query(1, ge=1, description="Номер страницы"),
     size: int = Query(20, ge=1, le=100, description="Размер страницы"),
+    normalize: bool = NORMALIZE_QUERY,
+    fields: Optional[str] = FIELDS_QUERY,
     db: Session = Depends(get_db),
     _: bool = api_key_dependency
 ):
@@ -113,9 +223,16 @@ async def get_organizations_by_activity_tree(
     Получить список организаций по дереву видов деятельности.
     Включает организации с указанным видом деятельности и всеми его дочерними видами.
     """
+    selected = _selected_fields(fields, normalize)
     pagination = PaginationParams(page=page, size=size)
-    result = OrganizationService.get_organizations_by_activity_tree(db, activity_id, pagination)
-    return PaginatedResponse(**result)
+    page_result = await single_flight.do(
+        ("by_activity_tree", activity_id, page, size, normalize, selected),
+        _paginated,
+        normalize,
+        selected,
+        OrganizationService.get_organizations_by_activity_tree, db, activity_id, pagination
+    )
+    return _page_response(page_result)
 
 
 @router.get("/nearby/", response_model=PaginatedResponse)
@@ -129,6 +246,8 @@ async def get_organizations_nearby(
     max_lon: Optional[float] = Query(None, description="Максимальная долгота для прямоугольной области"),
     page: int = Query(1, ge=1, description="Номер страницы"),
     size: int = Query(20, ge=1, le=100, description="Размер страницы"),
+    normalize: bool = NORMALIZE_QUERY,
+    fields: Optional[str] = FIELDS_QUERY,
     db: Session = Depends(get_db),
     _: bool = api_key_dependency
 ):
@@ -144,8 +263,14 @@ async def get_organizations_nearby(
             detail="Необходимо указать либо radius_km, либо все параметры прямоугольной области (min_lat, max_lat, min_lon, max_lon)"
         )
 
+    selected = _selected_fields(fields, normalize)
     pagination = PaginationParams(page=page, size=size)
-    result = OrganizationService.get_organizations_nearby(
+    page_result = await single_flight.do(
+        ("nearby", latitude, longitude, radius_km, min_lat, max_lat, min_lon, max_lon, page, size, normalize, selected),
+        _paginated,
+        normalize,
+        selected,
+        OrganizationService.get_organizations_nearby,
         db=db,
         latitude=latitude,
         longitude=longitude,
@@ -156,4 +281,123 @@ async def get_organizations_nearby(
         max_lon=max_lon,
         pagination=pagination
     )
-    return PaginatedResponse(**result)
+    return _page_response(page_result)
+
+
+@router.post("/nearby/batch", response_model=NearbyBatchResponse)
+def get_organizations_nearby_batch(
+    request: NearbyBatchRequest,
+    db: Session = Depends(get_db),
+    _: bool = api_key_dependency
+):
+    """
+    Пакетный поиск организаций одним запросом.
+
+    Передайте либо points - список точек со своими радиусами (например, остановки маршрута),
+    либо route и corridor_km - ломаную линию маршрута и ширину коридора вокруг неё.
+    Организации в ответе не повторяются, совпадения по точкам содержат расстояния в метрах.
+    """
+    result = OrganizationService.get_organizations_nearby_batch(db, request)
+    return NearbyBatchResponse(**result)
+
+
+@router.post("/in-area/", response_model=PaginatedResponse)
+def get_organizations_in_area(
+    request: AreaSearchRequest,
+    page: int = Query(1, ge=1, description="Номер страницы"),
+    size: int = Query(20, ge=1, le=100, description="Размер страницы"),
+    normalize: bool = NORMALIZE_QUERY,
+    fields: Optional[str] = FIELDS_QUERY,
+    db: Session = Depends(get_db),
+    primary_db: Session = Depends(get_primary_db),
+    _: bool = api_key_dependency
+):
+    """
+    Получить список организаций, здания которых находятся внутри произвольной области.
+
+    Область передаётся в geometry в формате GeoJSON (Polygon или MultiPolygon).
+    Если вместе с geometry указать area_name, область сохраняется на сервере,
+    и в следующих запросах достаточно передать только area_name.
+    """
+    try:
+        area_parts = AreaService.resolve_area(db, request, primary_db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if area_parts is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Область '{request.area_name}' не найдена: передайте geometry вместе с area_name, "
+                   "чтобы сохранить её"
+        )
+
+    selected = _selected_fields(fields, normalize)
+    pagination = PaginationParams(page=page, size=size)
+    result = _paginated(normalize, selected, OrganizationService.get_organizations_in_area, db, area_parts, pagination)
+    return _page_response(result)
+
+
+@router.post("/", response_model=OrganizationResponse, status_code=201)
+def create_organization(
+    data: OrganizationCreate,
+    db: Session = Depends(get_primary_db),
+    _: bool = api_key_dependency
+):
+    """
+    Создать организацию с телефонами и видами деятельности
+    """
+    try:
+        return OrganizationService.create_organization(db, data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/bulk", response_model=OrganizationBulkResponse)
+def bulk_upsert_organizations(
+    request: OrganizationBulkRequest,
+    db: Session = Depends(get_primary_db),
+    _: bool = api_key_dependency
+):
+    """
+    Пакетно создать или обновить организации в одной транзакции.
+
+    Элементы без id создаются, элементы с id создаются или обновляются (телефоны и виды
+    деятельности заменяются переданными). Для каждого элемента возвращается статус:
+    created, updated, unchanged или error (с описанием ошибки, такой элемент пропускается).
+    """
+    result = OrganizationService.bulk_upsert_organizations(db, request.items)
+    return OrganizationBulkResponse(**result)
+
+
+@router.put("/{organization_id}", response_model=OrganizationResponse)
+def update_organization(
+    organization_id: UUID,
+    data: OrganizationCreate,
+    db: Session = Depends(get_primary_db),
+    _: bool = api_key_dependency
+):
+    """
+    Обновить организацию: название, здание, телефоны и виды деятельности заменяются переданными
+    """
+    try:
+        organization = OrganizationService.update_organization(db, organization_id, data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not organization:
+        raise HTTPException(status_code=404, detail="Организация не найдена")
+
+    return organization
+
+
+@router.delete("/{organization_id}", status_code=204)
+def delete_organization(
+    organization_id: UUID,
+    db: Session = Depends(get_primary_db),
+    _: bool = api_key_dependency
+):
+    """
+    Удалить организацию
+    """
+    if not OrganizationService.delete_organization(db, organization_id):
+        raise HTTPException(status_code=404, detail="Организация не найдена")
+    return Response(status_code=204)
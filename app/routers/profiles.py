@@ -0,0 +1,64 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response
+from typing import Optional
+from app.auth import admin_key_dependency
+from app.config import settings
+from app.profiling import aggregate_profiles, profile_store, profiling_engine, render_report
+
+router = APIRouter(prefix="/admin/profiles", tags=["Профилирование"], dependencies=[admin_key_dependency])
+
+
+@router.get("")
+async def list_profiles(
+    route: Optional[str] = Query(None, description="Только запросы к эндпоинту (имя функции эндпоинта)")
+):
+    """
+    Профили запросов в кольцевом буфере текущего воркера (от старых к новым)
+    """
+    return {
+        "engine": profiling_engine(),
+        "sample_rate": settings.profiling_sample_rate,
+        "buffer_size": settings.profiling_buffer_size,
+        "items": [record.summary() for record in profile_store.list(route)]
+    }
+
+
+@router.get("/download")
+async def download_profiles(
+    route: Optional[str] = Query(None, description="Только запросы к эндпоинту (имя функции эндпоинта)")
+):
+    """
+    Сводный профиль всех запросов из буфера одним файлом.
+
+    Для cProfile - файл pstats (`python -m pstats profiles.prof`, snakeviz),
+    для pyinstrument - HTML-отчёт.
+    """
+    records = profile_store.list(route)
+    if not records:
+        raise HTTPException(status_code=404, detail="Профилей нет")
+
+    content, media_type, filename = aggregate_profiles(records)
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: int):
+    """
+    Текстовый отчёт по профилю одного запроса
+    """
+    record = profile_store.get(profile_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+    return PlainTextResponse(render_report(record))
+
+
+@router.delete("")
+async def clear_profiles():
+    """
+    Очистить буфер профилей текущего воркера
+    """
+    return {"deleted": profile_store.clear()}
@@ -0,0 +1,72 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.config import settings
+from app.database import get_primary_db
+from app.admission import admission_dependency
+from app.auth import api_key_dependency
+from app.singleflight import single_flight
+from app.snapshots import build_snapshot, load_manifest
+from app.schemas import SnapshotManifestResponse
+import os
+import re
+
+router = APIRouter(prefix="/api/snapshots", tags=["Офлайн-снимки"], dependencies=[admission_dependency])
+
+SNAPSHOT_FILE_PATTERN = re.compile(r"^(snapshot-\d+|delta-\d+-\d+)\.msgpack\.gz$")
+
+
+@router.get("/latest", response_model=SnapshotManifestResponse)
+async def get_latest_snapshot(
+    since_version: Optional[int] = None,
+    db: Session = Depends(get_primary_db),
+    _: bool = api_key_dependency
+):
+    """
+    Получить описание последнего снимка справочника.
+
+    Если передан since_version (версия снимка, который уже есть у клиента) и для неё
+    построена дельта, в ответе будет ссылка delta_url на файл с изменениями.
+    Снимок собирается один раз на версию данных, файлы отдаются как статические.
+    """
+    if settings.snapshot_build_on_request:
+        manifest = await single_flight.do(("snapshot_build",), build_snapshot, db)
+    else:
+        manifest = load_manifest()
+
+    latest = manifest["latest"]
+    if latest is None:
+        raise HTTPException(status_code=404, detail="Снимок ещё не собран")
+
+    entry = manifest["snapshots"][str(latest)]
+    delta = manifest["deltas"].get(str(since_version)) if since_version is not None else None
+    return SnapshotManifestResponse(
+        version=latest,
+        generated_at=entry["generated_at"],
+        url=f"{router.prefix}/files/{entry['file']}",
+        size=entry["size"],
+        sha256=entry["sha256"],
+        delta_url=f"{router.prefix}/files/{delta['file']}" if delta else None,
+        delta_size=delta["size"] if delta else None,
+        delta_sha256=delta["sha256"] if delta else None
+    )
+
+
+@router.get("/files/{filename}")
+async def get_snapshot_file(
+    filename: str,
+    _: bool = api_key_dependency
+):
+    """
+    Скачать файл снимка или дельты (gzip + MessagePack)
+    """
+    path = os.path.join(settings.snapshot_dir, filename)
+    if not SNAPSHOT_FILE_PATTERN.match(filename) or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Файл снимка не найден")
+
+    return FileResponse(
+        path,
+        media_type="application/gzip",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field, validator
-from typing import List, Optional, Union
+from pydantic import BaseModel, Field, constr, validator
+import re
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple, Union
 from uuid import UUID
 from datetime import datetime
 
@@ -13,7 +14,26 @@ class BuildingBase(BaseModel):
 
 class BuildingCreate(BuildingBase):
     """Схема для создания здания"""
-    pass
+
+    @validator('latitude')
+    def validate_latitude(cls, v):
+        try:
+            value = float(v)
+        except ValueError:
+            raise ValueError('Широта должна быть числом')
+        if not -90 <= value <= 90:
+            raise ValueError('Широта должна быть в диапазоне от -90 до 90')
+        return v
+
+    @validator('longitude')
+    def validate_longitude(cls, v):
+        try:
+            value = float(v)
+        except ValueError:
+            raise ValueError('Долгота должна быть числом')
+        if not -180 <= value <= 180:
+            raise ValueError('Долгота должна быть в диапазоне от -180 до 180')
+        return v
 
 
 class BuildingResponse(BuildingBase):
@@ -63,11 +83,40 @@ class ActivityTreeResponse(BaseModel):
         from_attributes = True
 
 
+class ActivityTreeCountsResponse(BaseModel):
+    """Узел дерева видов деятельности с числом организаций (with_counts=true)"""
+    id: UUID
+    name: str
+    level: int
+    organization_count: int = Field(..., description="Организации с этим видом деятельности")
+    subtree_organization_count: int = Field(
+        ..., description="Организации с этим видом деятельности или любым из дочерних (без повторов)"
+    )
+    children: List['ActivityTreeCountsResponse'] = []
+
+    @classmethod
+    def from_tree(
+        cls, node: ActivityTreeResponse, counts: Dict[UUID, Tuple[int, int]]
+    ) -> "ActivityTreeCountsResponse":
+        """Дополнить узел сериализованного дерева числами организаций"""
+        direct, subtree = counts.get(node.id, (0, 0))
+        return cls(
+            id=node.id,
+            name=node.name,
+            level=node.level,
+            organization_count=direct,
+            subtree_organization_count=subtree,
+            children=[cls.from_tree(child, counts) for child in node.children]
+        )
+
+
 class OrganizationBase(BaseModel):
     """Базовая схема организации"""
-    name: str = Field(..., description="Название организации", example='ООО "Рога и Копыта"')
+    name: str = Field(..., max_length=300, description="Название организации", example='ООО "Рога и Копыта"')
     building_id: UUID = Field(..., description="ID здания")
-    phones: List[str] = Field(..., description="Список телефонов", example=["2-222-222", "3-333-333"])
+    phones: List[constr(max_length=20)] = Field(
+        ..., description="Список телефонов", example=["2-222-222", "3-333-333"]
+    )
     activity_ids: List[UUID] = Field(..., description="Список ID видов деятельности")
 
 
@@ -76,6 +125,33 @@ class OrganizationCreate(OrganizationBase):
     pass
 
 
+class OrganizationBulkItem(OrganizationBase):
+    """Организация в пакетной загрузке (без id - создаётся новая, с id - создаётся или обновляется)"""
+    id: Optional[UUID] = Field(None, description="ID организации")
+
+
+class OrganizationBulkRequest(BaseModel):
+    """Пакетная загрузка организаций"""
+    items: List[OrganizationBulkItem] = Field(..., min_length=1, max_length=10000)
+
+
+class OrganizationBulkItemResult(BaseModel):
+    """Результат обработки одной организации из пакета"""
+    index: int = Field(..., description="Позиция в запросе")
+    id: Optional[UUID] = None
+    status: str = Field(..., description="created, updated, unchanged или error")
+    detail: Optional[str] = None
+
+
+class OrganizationBulkResponse(BaseModel):
+    """Результат пакетной загрузки организаций"""
+    created: int
+    updated: int
+    unchanged: int
+    failed: int
+    items: List[OrganizationBulkItemResult]
+
+
 class OrganizationResponse(BaseModel):
     """Схема ответа для организации"""
     id: UUID
@@ -113,6 +189,150 @@ class OrganizationSearchParams(BaseModel):
         return v
 
 
+class GeoPoint(BaseModel):
+    """Географическая точка"""
+    latitude: float = Field(..., description="Широта", ge=-90, le=90, example=55.7558)
+    longitude: float = Field(..., description="Долгота", ge=-180, le=180, example=37.6176)
+
+
+class NearbyPoint(GeoPoint):
+    """Точка пакетного поиска с собственным радиусом"""
+    radius_km: float = Field(..., description="Радиус поиска в километрах", gt=0, example=1.5)
+
+
+class NearbyBatchRequest(BaseModel):
+    """Запрос пакетного поиска: набор точек с радиусами либо маршрут с коридором"""
+    points: Optional[List[NearbyPoint]] = Field(
+        None, description="Точки поиска с радиусами", max_length=100
+    )
+    route: Optional[List[GeoPoint]] = Field(
+        None, description="Вершины маршрута (ломаной линии)", max_length=1000
+    )
+    corridor_km: Optional[float] = Field(
+        None, description="Полуширина коридора вокруг маршрута в километрах", gt=0
+    )
+    limit: int = Field(
+        20, description="Максимальное число совпадений на точку (или на весь маршрут)", ge=1, le=100
+    )
+
+    @validator('corridor_km', always=True)
+    def validate_mode(cls, v, values):
+        points = values.get('points')
+        route = values.get('route')
+        if bool(points) == bool(route):
+            raise ValueError('Необходимо указать либо points, либо route')
+        if route:
+            if len(route) < 2:
+                raise ValueError('Маршрут должен содержать минимум две точки')
+            if v is None:
+                raise ValueError('Для поиска вдоль маршрута необходимо указать corridor_km')
+        return v
+
+
+class NearbyMatch(BaseModel):
+    """Совпадение пакетного поиска"""
+    organization_id: UUID
+    distance_m: float = Field(..., description="Расстояние до точки или маршрута в метрах")
+    route_fraction: Optional[float] = Field(
+        None, description="Положение проекции на маршрут (от 0 до 1)"
+    )
+
+
+class NearbyPointResult(BaseModel):
+    """Совпадения для одной точки пакетного поиска"""
+    point_index: int
+    matches: List[NearbyMatch]
+
+
+class NearbyBatchResponse(BaseModel):
+    """Ответ пакетного поиска: уникальные организации и совпадения по точкам"""
+    organizations: List[OrganizationResponse]
+    points: List[NearbyPointResult] = []
+    corridor: List[NearbyMatch] = []
+
+
+class AreaSearchRequest(BaseModel):
+    """Запрос поиска организаций внутри произвольной области"""
+    geometry: Optional[Dict[str, Any]] = Field(
+        None,
+        description="Область в формате GeoJSON (Polygon или MultiPolygon)",
+        example={
+            "type": "Polygon",
+            "coordinates": [[[37.60, 55.74], [37.65, 55.74], [37.65, 55.77], [37.60, 55.77], [37.60, 55.74]]]
+        }
+    )
+    area_name: Optional[str] = Field(
+        None,
+        description="Имя области. Вместе с geometry сохраняет область на сервере, без geometry - использует сохранённую",
+        max_length=100,
+        example="center"
+    )
+
+    @validator('area_name', always=True)
+    def validate_area(cls, v, values):
+        if v is None and values.get('geometry') is None:
+            raise ValueError('Необходимо указать geometry или area_name')
+        return v
+
+
+class OrganizationChange(BaseModel):
+    """Изменённая организация в ленте изменений"""
+    id: UUID
+    name: str
+    building_id: UUID
+    phones: List[str]
+    activity_ids: List[UUID]
+    updated_at: datetime
+    change_seq: int
+
+
+class BuildingChange(BuildingBase):
+    """Изменённое здание в ленте изменений"""
+    id: UUID
+    updated_at: datetime
+    change_seq: int
+
+
+class ActivityChange(BaseModel):
+    """Изменённый вид деятельности в ленте изменений"""
+    id: UUID
+    name: str
+    parent_id: Optional[UUID]
+    level: int
+    updated_at: datetime
+    change_seq: int
+
+
+class DeletedRecord(BaseModel):
+    """Удалённая запись в ленте изменений"""
+    entity_type: str = Field(..., description="organizations, buildings или activities")
+    id: UUID
+    deleted_at: datetime
+    change_seq: int
+
+
+class ChangeFeedResponse(BaseModel):
+    """Изменения после указанного токена"""
+    organizations: List[OrganizationChange]
+    buildings: List[BuildingChange]
+    activities: List[ActivityChange]
+    deleted: List[DeletedRecord]
+    next_token: int = Field(..., description="Токен для следующего запроса (since)")
+    has_more: bool = Field(..., description="Есть ли ещё изменения после next_token")
+
+
+class SnapshotManifestResponse(BaseModel):
+    """Описание последнего офлайн-снимка справочника"""
+    version: int = Field(..., description="Версия данных снимка")
+    generated_at: datetime
+    url: str = Field(..., description="Ссылка на полный снимок")
+    size: int
+    sha256: str
+    delta_url: Optional[str] = Field(None, description="Ссылка на дельту от версии since_version")
+    delta_size: Optional[int] = None
+    delta_sha256: Optional[str] = None
+
+
 class PaginationParams(BaseModel):
     """Параметры пагинации"""
     page: int = Field(1, description="Номер страницы", ge=1)
@@ -134,6 +354,241 @@ class PaginatedResponse(BaseModel):
         return v
 
 
+class FacetBucket(BaseModel):
+    """Число организаций для значения фасета"""
+    id: UUID
+    count: int
+
+
+class OrganizationFacets(BaseModel):
+    """
+    Фасеты поиска организаций по текущим фильтрам
+
+    activities - по видам деятельности с учётом дерева: организация считается у своего
+    вида деятельности и у всех его предков; buildings - по зданиям (наибольшие первыми).
+    """
+    activities: List[FacetBucket]
+    buildings: List[FacetBucket]
+
+
+class FacetedPaginatedResponse(PaginatedResponse):
+    """Пагинированный список организаций с фасетами (facets=true)"""
+    facets: OrganizationFacets
+
+
+class ActivitySummary(ActivityBase):
+    """Вид деятельности без дочерних элементов"""
+    id: UUID
+
+    class Config:
+        from_attributes = True
+
+
+class NormalizedOrganization(BaseModel):
+    """Организация со ссылками на здание и виды деятельности по ID"""
+    id: UUID
+    name: str
+    phones: List[str]
+    building_id: UUID
+    activity_ids: List[UUID]
+
+
+class NormalizedPaginatedResponse(BaseModel):
+    """
+    Пагинированный список организаций в нормализованном виде:
+    каждое здание и вид деятельности передаются один раз
+    """
+    items: List[NormalizedOrganization]
+    buildings: List[BuildingResponse]
+    activities: List[ActivitySummary]
+    total: int
+    page: int
+    size: int
+    pages: int
+    facets: Optional[OrganizationFacets] = None
+
+    @classmethod
+    def from_page(cls, page: Dict[str, Any]) -> "NormalizedPaginatedResponse":
+        """Построить ответ из результата сервисного метода со списком организаций"""
+        buildings, activities, items = {}, {}, []
+        for organization in page["items"]:
+            buildings.setdefault(organization.building.id, organization.building)
+            for activity in organization.activities:
+                activities.setdefault(activity.id, activity)
+            items.append(NormalizedOrganization(
+                id=organization.id,
+                name=organization.name,
+                phones=organization.phones,
+                building_id=organization.building_id,
+                activity_ids=[activity.id for activity in organization.activities]
+            ))
+
+        return cls(
+            items=items,
+            buildings=[BuildingResponse.model_validate(building) for building in buildings.values()],
+            activities=[ActivitySummary.model_validate(activity) for activity in activities.values()],
+            total=page["total"],
+            page=page["page"],
+            size=page["size"],
+            pages=page["pages"],
+            facets=page.get("facets")
+        )
+
+
+class BuildingOrganization(BaseModel):
+    """Организация в ответе здания (include=organizations); здание не повторяется"""
+    id: UUID
+    name: str
+    phones: List[str]
+    activities: List[ActivitySummary]
+
+
+class BuildingWithOrganizationsResponse(BuildingResponse):
+    """Здание с организациями (include=organizations)"""
+    organizations: List[BuildingOrganization]
+    next_cursor: Optional[UUID] = Field(
+        None, description="Курсор следующей порции организаций (параметр cursor); null - организаций больше нет"
+    )
+
+    @classmethod
+    def from_result(cls, result: Dict[str, Any]) -> "BuildingWithOrganizationsResponse":
+        """Построить ответ из результата BuildingService.get_building_with_organizations"""
+        building = BuildingResponse.model_validate(result["building"])
+        return cls(
+            **building.model_dump(),
+            organizations=[
+                BuildingOrganization(
+                    id=organization.id,
+                    name=organization.name,
+                    phones=result["phones"].get(organization.id, []),
+                    activities=[ActivitySummary.model_validate(activity) for activity in organization.activities]
+                )
+                for organization in result["organizations"]
+            ],
+            next_cursor=result["next_cursor"]
+        )
+
+
+# Поля, доступные для выбора в параметре fields
+ORGANIZATION_FIELDS = ("id", "name", "phones", "building", "activities")
+BUILDING_FIELDS = ("id", "address", "latitude", "longitude", "coordinates")
+
+
+def parse_fields(value: Optional[str], allowed: Sequence[str]) -> Optional[FrozenSet[str]]:
+    """
+    Разобрать параметр fields ("name,phones") в набор полей; id возвращается всегда
+
+    Raises:
+        ValueError: Если указано неизвестное поле
+    """
+    if value is None:
+        return None
+    fields = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = fields - set(allowed)
+    if unknown:
+        raise ValueError(
+            f"Неизвестные поля: {', '.join(sorted(unknown))}. Допустимые поля: {', '.join(allowed)}"
+        )
+    return frozenset(fields | {"id"})
+
+
+def normalize_phone(phone: str) -> str:
+    """
+    Привести телефон к каноническому виду: только цифры, "8" перед десятизначным
+    номером заменяется на "7" ("8-923-666-13-13" и "+7 (923) 666-13-13" -> "79236661313").
+    Совпадает с вычисляемой колонкой organization_phones.phone_normalized
+    """
+    digits = re.sub(r"[^0-9]", "", phone)
+    return re.sub(r"^8([0-9]{10})$", r"7\1", digits)
+
+
+class BuildingPartialResponse(BaseModel):
+    """Здание с выбранными полями (параметр fields)"""
+    id: UUID
+    address: Optional[str] = None
+    latitude: Optional[str] = None
+    longitude: Optional[str] = None
+    coordinates: Optional[str] = None
+
+    @validator('coordinates', pre=True)
+    def convert_coordinates(cls, v):
+        if hasattr(v, 'desc'):
+            return v.desc
+        return v if v is None else str(v)
+
+    @classmethod
+    def from_building(cls, building, fields: FrozenSet[str]) -> "BuildingPartialResponse":
+        return cls(**{name: getattr(building, name) for name in fields})
+
+
+class OrganizationPartialResponse(BaseModel):
+    """Организация с выбранными полями (параметр fields)"""
+    id: UUID
+    name: Optional[str] = None
+    phones: Optional[List[str]] = None
+    building: Optional[BuildingResponse] = None
+    activities: Optional[List[ActivityResponse]] = None
+
+    @classmethod
+    def from_organization(
+        cls, organization, fields: FrozenSet[str], phones: Optional[List[str]] = None
+    ) -> "OrganizationPartialResponse":
+        values = {}
+        for name in fields:
+            if name == "phones" and phones is not None:
+                values[name] = phones
+            elif name == "building":
+                values[name] = BuildingResponse.model_validate(organization.building)
+            elif name == "activities":
+                values[name] = [ActivityResponse.model_validate(activity) for activity in organization.activities]
+            else:
+                values[name] = getattr(organization, name)
+        return cls(**values)
+
+
+class PartialPaginatedResponse(BaseModel):
+    """
+    Пагинированный список с выбранными полями элементов
+
+    Отдаётся с exclude_unset: невыбранные поля в ответ не попадают.
+    """
+    items: List[Union[OrganizationPartialResponse, BuildingPartialResponse]]
+    total: int
+    page: int
+    size: int
+    pages: int
+    facets: Optional[OrganizationFacets] = None
+
+    @classmethod
+    def from_organizations(cls, page: Dict[str, Any], fields: FrozenSet[str]) -> "PartialPaginatedResponse":
+        """Построить ответ из результата сервисного метода со списком организаций"""
+        phones = page.get("phones", {})
+        extra = {"facets": page["facets"]} if "facets" in page else {}
+        return cls(
+            items=[
+                OrganizationPartialResponse.from_organization(organization, fields, phones.get(organization.id))
+                for organization in page["items"]
+            ],
+            total=page["total"],
+            page=page["page"],
+            size=page["size"],
+            pages=page["pages"],
+            **extra
+        )
+
+    @classmethod
+    def from_buildings(cls, page: Dict[str, Any], fields: FrozenSet[str]) -> "PartialPaginatedResponse":
+        """Построить ответ из результата сервисного метода со списком зданий"""
+        return cls(
+            items=[BuildingPartialResponse.from_building(building, fields) for building in page["items"]],
+            total=page["total"],
+            page=page["page"],
+            size=page["size"],
+            pages=page["pages"]
+        )
+
+
 # Обновляем forward references
 ActivityResponse.model_rebuild()
 ActivityTreeResponse.model_rebuild()
+ActivityTreeCountsResponse.model_rebuild()
@@ -1,13 +1,37 @@
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, func, text
-from typing import List, Optional, Dict, Any
+from sqlalchemy.orm import Session, joinedload, load_only, selectinload
+from sqlalchemy import (
+    or_, func, text, select, lambda_stmt, values, column, cast, exists, delete, update, tuple_, literal_column,
+    case, true, Integer, Float, Numeric, Text
+)
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID, insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from geoalchemy2 import Geography, Geometry
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
 from uuid import UUID
-from app.models import Organization, Building, Activity
-from app.schemas import OrganizationSearchParams, PaginationParams
+from app.cache import TTLCache
+from app.config import settings
+from app.geo_cells import geo_cell, geo_cells_for_bbox, geo_cells_for_radius
+from app.models import (
+    Organization, Building, Activity, SearchArea, organization_phones, organization_activities, deleted_records
+)
+from app.schemas import (
+    OrganizationSearchParams, PaginationParams, NearbyBatchRequest, NearbyPoint, GeoPoint,
+    AreaSearchRequest, OrganizationCreate, OrganizationBulkItem, BuildingCreate, ActivityCreate,
+    normalize_phone
+)
+from app.query_guard import check_query_cost
+import hashlib
+import json
 import logging
+import uuid
 
 logger = logging.getLogger(__name__)
 
+# Прямоугольная область поиска для условия по индексу координат: длина отрезков сторон
+# и запас, градусы (см. OrganizationService._bbox_envelope)
+BBOX_SEGMENT_DEGREES = 1.0
+BBOX_MARGIN_DEGREES = 0.01
+
 
 class OrganizationService:
     """Сервис для работы с организациями"""
@@ -16,125 +40,116 @@ class OrganizationService:
     def get_organizations(
         db: Session,
         pagination: PaginationParams,
-        search_params: Optional[OrganizationSearchParams] = None
+        search_params: Optional[OrganizationSearchParams] = None,
+        fields: Optional[FrozenSet[str]] = None,
+        facets: bool = False
     ) -> Dict[str, Any]:
-        """Получить список организаций с фильтрацией и пагинацией"""
-
-        query = db.query(Organization).options(
-            joinedload(Organization.building),
-            joinedload(Organization.activities)
-        )
+        """Получить список организаций с фильтрацией и пагинацией (и фасетами при facets)"""
 
         # Применяем фильтры
-        if search_params:
-            query = OrganizationService._apply_filters(query, search_params)
-
-        # Подсчитываем общее количество
-        total = query.count()
+        criteria = OrganizationService._filter_criteria(db, search_params) if search_params else []
 
-        # Применяем пагинацию
-        organizations = query.offset((pagination.page - 1) * pagination.size).limit(pagination.size).all()
-
-        pages = (total + pagination.size - 1) // pagination.size
-        return {
-            "items": organizations,
-            "total": total,
-            "page": pagination.page,
-            "size": pagination.size,
-            "pages": pages
-        }
+        result = OrganizationService._paginate_select(db, criteria, pagination, fields)
+        if facets:
+            result["facets"] = OrganizationService.get_facets(db, OrganizationService._select_ids(criteria))
+        return result
 
     @staticmethod
-    def get_organization_by_id(db: Session, org_id: UUID) -> Optional[Organization]:
+    def get_organization_by_id(
+        db: Session, org_id: UUID, fields: Optional[FrozenSet[str]] = None
+    ) -> Optional[Organization]:
         """Получить организацию по ID"""
-        return db.query(Organization).options(
-            joinedload(Organization.building),
-            joinedload(Organization.activities)
-        ).filter(Organization.id == org_id).first()
+        stmt = OrganizationService._select(fields)
+        stmt += lambda s: s.where(Organization.id == org_id)
+        return db.execute(stmt).unique().scalars().first()
 
     @staticmethod
-    def search_organizations_by_name(db: Session, name: str, pagination: PaginationParams) -> Dict[str, Any]:
+    def search_organizations_by_name(
+        db: Session, name: str, pagination: PaginationParams, fields: Optional[FrozenSet[str]] = None,
+        facets: bool = False
+    ) -> Dict[str, Any]:
         """Поиск организаций по названию"""
-        query = db.query(Organization).options(
-            joinedload(Organization.building),
-            joinedload(Organization.activities)
-        ).filter(Organization.name.ilike(f"%{name}%"))
+        pattern = f"%{name}%"
+        criteria = [lambda s: s.where(Organization.name.ilike(pattern))]
 
-        total = query.count()
-        organizations = query.offset((pagination.page - 1) * pagination.size).limit(pagination.size).all()
+        result = OrganizationService._paginate_select(db, criteria, pagination, fields)
+        if facets:
+            result["facets"] = OrganizationService.get_facets(db, OrganizationService._select_ids(criteria))
+        return result
+
+    @staticmethod
+    def get_facets(db: Session, ids) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Посчитать фасеты для набора организаций (запрос их ID) двумя сгруппированными запросами
+
+        Вид деятельности получает организации всего своего поддерева
+        (ActivityService.get_organization_counts). Здания - не больше settings.facets_max_buildings.
+        """
+        activity_counts = ActivityService.get_organization_counts(db, ids)
+        activity_rows = sorted(
+            ((activity_id, subtree) for activity_id, (_, subtree) in activity_counts.items()),
+            key=lambda row: (-row[1], str(row[0]))
+        )
+
+        building_count = func.count(Organization.id)
+        building_rows = db.execute(
+            select(Organization.building_id, building_count)
+            .where(Organization.id.in_(ids))
+            .group_by(Organization.building_id)
+            .order_by(building_count.desc(), Organization.building_id)
+            .limit(settings.facets_max_buildings)
+        ).all()
 
-        pages = (total + pagination.size - 1) // pagination.size
         return {
-            "items": organizations,
-            "total": total,
-            "page": pagination.page,
-            "size": pagination.size,
-            "pages": pages
+            "activities": [{"id": activity_id, "count": count} for activity_id, count in activity_rows],
+            "buildings": [{"id": building_id, "count": count} for building_id, count in building_rows]
         }
 
     @staticmethod
-    def get_organizations_by_building(db: Session, building_id: UUID, pagination: PaginationParams) -> Dict[str, Any]:
+    def get_organizations_by_building(db: Session, building_id: UUID, pagination: PaginationParams, fields: Optional[FrozenSet[str]] = None) -> Dict[str, Any]:
         """Получить организации в конкретном здании"""
-        query = db.query(Organization).options(
-            joinedload(Organization.building),
-            joinedload(Organization.activities)
-        ).filter(Organization.building_id == building_id)
+        criteria = [lambda s: s.where(Organization.building_id == building_id)]
 
-        total = query.count()
-        organizations = query.offset((pagination.page - 1) * pagination.size).limit(pagination.size).all()
+        return OrganizationService._paginate_select(db, criteria, pagination, fields)
 
-        pages = (total + pagination.size - 1) // pagination.size
-        return {
-            "items": organizations,
-            "total": total,
-            "page": pagination.page,
-            "size": pagination.size,
-            "pages": pages
-        }
+    @staticmethod
+    def get_organizations_by_phone(db: Session, phone: str, pagination: PaginationParams, fields: Optional[FrozenSet[str]] = None) -> Dict[str, Any]:
+        """
+        Найти организации по номеру телефона в любом формате записи
+
+        Номер сравнивается в каноническом виде с колонкой phone_normalized
+        (индекс ix_organization_phones_phone_normalized).
+
+        Raises:
+            ValueError: Если в номере нет цифр
+        """
+        normalized = normalize_phone(phone)
+        if not normalized:
+            raise ValueError("Номер телефона должен содержать цифры")
+
+        criteria = [lambda s: s.where(Organization.id.in_(
+            select(organization_phones.c.organization_id).where(organization_phones.c.phone_normalized == normalized)
+        ))]
+
+        return OrganizationService._paginate_select(db, criteria, pagination, fields)
 
     @staticmethod
-    def get_organizations_by_activity(db: Session, activity_id: UUID, pagination: PaginationParams) -> Dict[str, Any]:
+    def get_organizations_by_activity(db: Session, activity_id: UUID, pagination: PaginationParams, fields: Optional[FrozenSet[str]] = None) -> Dict[str, Any]:
         """Получить организации по виду деятельности"""
-        query = db.query(Organization).options(
-            joinedload(Organization.building),
-            joinedload(Organization.activities)
-        ).join(Organization.activities).filter(Activity.id == activity_id)
+        criteria = [lambda s: s.join(Organization.activities).where(Activity.id == activity_id)]
 
-        total = query.count()
-        organizations = query.offset((pagination.page - 1) * pagination.size).limit(pagination.size).all()
-
-        pages = (total + pagination.size - 1) // pagination.size
-        return {
-            "items": organizations,
-            "total": total,
-            "page": pagination.page,
-            "size": pagination.size,
-            "pages": pages
-        }
+        return OrganizationService._paginate_select(db, criteria, pagination, fields)
 
     @staticmethod
-    def get_organizations_by_activity_tree(db: Session, activity_id: UUID, pagination: PaginationParams) -> Dict[str, Any]:
+    def get_organizations_by_activity_tree(db: Session, activity_id: UUID, pagination: PaginationParams, fields: Optional[FrozenSet[str]] = None) -> Dict[str, Any]:
         """Получить организации по дереву видов деятельности"""
         # Получаем все дочерние виды деятельности
         activity_ids = OrganizationService._get_activity_tree_ids(db, activity_id)
         activity_ids.append(activity_id)  # Добавляем сам родительский вид деятельности
 
-        query = db.query(Organization).options(
-            joinedload(Organization.building),
-            joinedload(Organization.activities)
-        ).join(Organization.activities).filter(Activity.id.in_(activity_ids))
+        criteria = [lambda s: s.join(Organization.activities).where(Activity.id.in_(activity_ids))]
 
-        total = query.count()
-        organizations = query.offset((pagination.page - 1) * pagination.size).limit(pagination.size).all()
-
-        pages = (total + pagination.size - 1) // pagination.size
-        return {
-            "items": organizations,
-            "total": total,
-            "page": pagination.page,
-            "size": pagination.size,
-            "pages": pages
-        }
+        return OrganizationService._paginate_select(db, criteria, pagination, fields)
 
     @staticmethod
     def get_organizations_nearby(
@@ -146,96 +161,791 @@ class OrganizationService:
         max_lat: Optional[float] = None,
         min_lon: Optional[float] = None,
         max_lon: Optional[float] = None,
-        pagination: PaginationParams = PaginationParams()
+        pagination: PaginationParams = PaginationParams(),
+        fields: Optional[FrozenSet[str]] = None
     ) -> Dict[str, Any]:
         """Получить организации в заданном радиусе или прямоугольной области"""
 
+        if settings.geo_index_enabled:
+            return OrganizationService._nearby_from_index(
+                db, latitude, longitude, radius_km, min_lat, max_lat, min_lon, max_lon, pagination, fields
+            )
+
         if radius_km:
             # Поиск в радиусе
-            query = db.query(Organization).options(
-                joinedload(Organization.building),
-                joinedload(Organization.activities)
-            ).join(Organization.building).filter(
+            radius_m = radius_km * 1000  # Конвертируем в метры
+            criteria = [lambda s: s.join(Organization.building).where(
                 func.ST_DWithin(
                     Building.coordinates,
                     func.ST_SetSRID(func.ST_MakePoint(longitude, latitude), 4326),
-                    radius_km * 1000  # Конвертируем в метры
+                    radius_m
                 )
-            )
+            )]
+            cells = geo_cells_for_radius(latitude, longitude, radius_km) if settings.geo_partitioning else None
+        else:
+            # Поиск в прямоугольной области: && по GiST-индексу координат отбирает здания
+            # в окрестности области, точное условие - по широте и долготе
+            west, south, east, north = OrganizationService._bbox_envelope(min_lat, max_lat, min_lon, max_lon)
+            criteria = [lambda s: s.join(Organization.building).where(
+                Building.coordinates.op('&&')(cast(
+                    func.ST_Segmentize(func.ST_MakeEnvelope(west, south, east, north, 4326), BBOX_SEGMENT_DEGREES),
+                    Geography(srid=4326)
+                )),
+                cast(Building.latitude, Numeric).between(min_lat, max_lat),
+                cast(Building.longitude, Numeric).between(min_lon, max_lon)
+            )]
+            cells = geo_cells_for_bbox(min_lat, max_lat, min_lon, max_lon) if settings.geo_partitioning else None
+
+        if cells:
+            # Отбор секций: только ячейки сетки, которые может задеть область поиска.
+            # Условие на обе таблицы - равенство ячеек в соединении не переносит IN на вторую
+            criteria.append(lambda s: s.where(Building.geo_cell.in_(cells), Organization.geo_cell.in_(cells)))
+
+        return OrganizationService._paginate_select(db, criteria, pagination, fields)
+
+    @staticmethod
+    def _bbox_envelope(
+        min_lat: float, max_lat: float, min_lon: float, max_lon: float
+    ) -> Tuple[float, float, float, float]:
+        """
+        Границы прямоугольника для отбора по индексу: (запад, юг, восток, север)
+
+        Стороны прямоугольника в geography - дуги больших кругов, а не параллели, поэтому
+        он делится на отрезки по BBOX_SEGMENT_DEGREES (отклонение от параллели не больше
+        0.0011°) и расширяется на BBOX_MARGIN_DEGREES. Границы ограничены допустимыми
+        координатами geography.
+        """
+        return (
+            max(min_lon - BBOX_MARGIN_DEGREES, -180.0),
+            max(min_lat - BBOX_MARGIN_DEGREES, -90.0),
+            min(max_lon + BBOX_MARGIN_DEGREES, 180.0),
+            min(max_lat + BBOX_MARGIN_DEGREES, 90.0),
+        )
+
+    @staticmethod
+    def _nearby_from_index(
+        db: Session,
+        latitude: float,
+        longitude: float,
+        radius_km: Optional[float],
+        min_lat: Optional[float],
+        max_lat: Optional[float],
+        min_lon: Optional[float],
+        max_lon: Optional[float],
+        pagination: PaginationParams,
+        fields: Optional[FrozenSet[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Поиск рядом по индексу зданий в памяти (app.geo_index)
+
+        Здания и число организаций на странице определяются по индексу, из базы данных
+        загружаются только организации страницы. Организации упорядочены по расстоянию
+        от точки (latitude, longitude).
+        """
+        from app.geo_index import geo_index
+
+        index = geo_index.get()
+        if radius_km:
+            positions = index.within_radius(latitude, longitude, radius_km)
         else:
-            # Поиск в прямоугольной области
-            query = db.query(Organization).options(
+            positions = index.within_bbox(min_lat, max_lat, min_lon, max_lon, latitude, longitude)
+
+        total, building_ids, skip = index.page(positions, pagination.page, pagination.size)
+        organizations = []
+        if building_ids:
+            rank = case({building_id: i for i, building_id in enumerate(building_ids)}, value=Organization.building_id)
+            organizations = OrganizationService._base_query(db, fields).filter(
+                Organization.building_id.in_(building_ids)
+            ).order_by(rank, Organization.id).offset(skip).limit(pagination.size).all()
+
+        return OrganizationService._page_result(db, organizations, total, pagination, fields)
+
+    @staticmethod
+    def get_organizations_nearby_batch(db: Session, request: NearbyBatchRequest) -> Dict[str, Any]:
+        """
+        Пакетный поиск организаций: по набору точек с радиусами
+        либо в коридоре вдоль маршрута
+        """
+        if request.points:
+            rows = OrganizationService._match_points(db, request.points, request.limit)
+        else:
+            rows = OrganizationService._match_corridor(db, request.route, request.corridor_km, request.limit)
+
+        # Загружаем каждую найденную организацию один раз
+        org_ids = list({row.organization_id for row in rows})
+        organizations = []
+        if org_ids:
+            organizations = db.query(Organization).options(
                 joinedload(Organization.building),
                 joinedload(Organization.activities)
-            ).join(Organization.building).filter(
-                and_(
-                    text("CAST(buildings.latitude AS NUMERIC) >= :min_lat"),
-                    text("CAST(buildings.latitude AS NUMERIC) <= :max_lat"),
-                    text("CAST(buildings.longitude AS NUMERIC) >= :min_lon"),
-                    text("CAST(buildings.longitude AS NUMERIC) <= :max_lon")
+            ).filter(Organization.id.in_(org_ids)).all()
+
+        if request.points:
+            matches: Dict[int, List[Dict[str, Any]]] = {i: [] for i in range(len(request.points))}
+            for row in rows:
+                matches[row.point_index].append({
+                    "organization_id": row.organization_id,
+                    "distance_m": row.distance_m
+                })
+            return {
+                "organizations": organizations,
+                "points": [
+                    {"point_index": index, "matches": items}
+                    for index, items in matches.items()
+                ]
+            }
+
+        return {
+            "organizations": organizations,
+            "corridor": [
+                {
+                    "organization_id": row.organization_id,
+                    "distance_m": row.distance_m,
+                    "route_fraction": row.route_fraction
+                }
+                for row in rows
+            ]
+        }
+
+    @staticmethod
+    def _match_points(db: Session, points: List[NearbyPoint], limit: int):
+        """Сопоставить организации всем точкам одним запросом (ST_DWithin по GiST-индексу)"""
+        point_values = values(
+            column('point_index', Integer),
+            column('lon', Float),
+            column('lat', Float),
+            column('radius_m', Float),
+            name='points'
+        ).data([
+            (index, point.longitude, point.latitude, point.radius_km * 1000)
+            for index, point in enumerate(points)
+        ])
+        center = cast(func.ST_SetSRID(func.ST_MakePoint(point_values.c.lon, point_values.c.lat), 4326), Geography(srid=4326))
+        distance = func.ST_Distance(Building.coordinates, center)
+
+        ranked = select(
+            point_values.c.point_index,
+            Organization.id.label('organization_id'),
+            distance.label('distance_m'),
+            func.row_number().over(
+                partition_by=point_values.c.point_index,
+                order_by=distance
+            ).label('rank')
+        ).select_from(point_values).join(
+            Building,
+            func.ST_DWithin(Building.coordinates, center, point_values.c.radius_m)
+        ).join(Organization, Organization.building_id == Building.id).subquery()
+
+        return db.execute(
+            select(ranked.c.point_index, ranked.c.organization_id, ranked.c.distance_m)
+            .where(ranked.c.rank <= limit)
+            .order_by(ranked.c.point_index, ranked.c.distance_m)
+        ).all()
+
+    @staticmethod
+    def _match_corridor(db: Session, route: List[GeoPoint], corridor_km: float, limit: int):
+        """Найти организации в коридоре вокруг маршрута (ST_DWithin на LINESTRING)"""
+        wkt = "LINESTRING({})".format(
+            ", ".join(f"{point.longitude} {point.latitude}" for point in route)
+        )
+        line = func.ST_GeogFromText(f"SRID=4326;{wkt}")
+
+        route_fraction = func.ST_LineLocatePoint(
+            cast(line, Geometry(srid=4326)), cast(Building.coordinates, Geometry(srid=4326))
+        ).label('route_fraction')
+
+        return db.execute(
+            select(
+                Organization.id.label('organization_id'),
+                func.ST_Distance(Building.coordinates, line).label('distance_m'),
+                route_fraction
+            ).join(Organization.building).where(
+                func.ST_DWithin(Building.coordinates, line, corridor_km * 1000)
+            ).order_by(route_fraction).limit(limit)
+        ).all()
+
+    @staticmethod
+    def get_organizations_in_area(db: Session, area_parts: List[str], pagination: PaginationParams, fields: Optional[FrozenSet[str]] = None) -> Dict[str, Any]:
+        """Получить организации, здания которых попадают в область (набор частей полигона в WKT)"""
+        parts = values(column('wkt', Text), name='area_parts').data([(wkt,) for wkt in area_parts])
+
+        query = OrganizationService._base_query(db, fields).join(Organization.building).filter(
+            exists().where(
+                func.ST_Intersects(Building.coordinates, func.ST_GeogFromText(parts.c.wkt))
+            )
+        )
+
+        return OrganizationService._paginate(db, query, pagination, fields)
+
+    @staticmethod
+    def create_organization(db: Session, data: OrganizationCreate) -> Organization:
+        """
+        Создать организацию
+
+        Raises:
+            ValueError: Если здание или виды деятельности не найдены
+        """
+        return OrganizationService._save_organization(db, OrganizationBulkItem(**data.model_dump()))
+
+    @staticmethod
+    def update_organization(db: Session, org_id: UUID, data: OrganizationCreate) -> Optional[Organization]:
+        """
+        Заменить данные организации (название, здание, телефоны, виды деятельности)
+
+        Raises:
+            ValueError: Если здание или виды деятельности не найдены
+        """
+        if db.query(Organization.id).filter(Organization.id == org_id).first() is None:
+            return None
+        return OrganizationService._save_organization(db, OrganizationBulkItem(id=org_id, **data.model_dump()))
+
+    @staticmethod
+    def _save_organization(db: Session, item: OrganizationBulkItem) -> Organization:
+        result = OrganizationService.bulk_upsert_organizations(db, [item])["items"][0]
+        if result["status"] == "error":
+            raise ValueError(result["detail"])
+        return OrganizationService.get_organization_by_id(db, result["id"])
+
+    @staticmethod
+    def delete_organization(db: Session, org_id: UUID) -> bool:
+        """Удалить организацию вместе с телефонами и связями с видами деятельности"""
+        db.execute(delete(organization_phones).where(organization_phones.c.organization_id == org_id))
+        db.execute(delete(organization_activities).where(organization_activities.c.organization_id == org_id))
+        deleted = db.execute(delete(Organization).where(Organization.id == org_id)).rowcount
+        db.commit()
+        return deleted > 0
+
+    @staticmethod
+    def bulk_upsert_organizations(db: Session, items: List[OrganizationBulkItem]) -> Dict[str, Any]:
+        """
+        Создать или обновить организации с телефонами и видами деятельности в одной транзакции
+
+        Организации записываются многострочными INSERT ... ON CONFLICT, телефоны и связи
+        с видами деятельности - через сравнение множеств с текущим состоянием
+        (одна выборка, один DELETE и один INSERT на порцию), без поштучного flush ORM.
+        Элементы со ссылками на несуществующие здания или виды деятельности
+        пропускаются и возвращаются со статусом error.
+        """
+        chunk_size = settings.bulk_chunk_size
+        results = [{"index": index, "id": item.id or uuid.uuid4(), "status": None, "detail": None}
+                   for index, item in enumerate(items)]
+
+        # Проверяем ссылки одним запросом на каждую таблицу
+        building_ids = {item.building_id for item in items}
+        activity_ids = {activity_id for item in items for activity_id in item.activity_ids}
+        building_cells = OrganizationService._building_cells(db, building_ids)
+        known_activities = OrganizationService._existing_ids(db, Activity.id, activity_ids)
+
+        seen_ids = set()
+        rows, desired_phones, desired_activities = [], set(), set()
+        for item, result in zip(items, results):
+            org_id = result["id"]
+            missing_activities = set(item.activity_ids) - known_activities
+            if org_id in seen_ids:
+                result["status"], result["detail"] = "error", "Организация повторяется в запросе"
+            elif item.building_id not in building_cells:
+                result["status"], result["detail"] = "error", f"Здание {item.building_id} не найдено"
+            elif missing_activities:
+                result["status"], result["detail"] = "error", "Виды деятельности не найдены: " + ", ".join(
+                    str(activity_id) for activity_id in sorted(missing_activities, key=str)
                 )
-            ).params(
-                min_lat=min_lat,
-                max_lat=max_lat,
-                min_lon=min_lon,
-                max_lon=max_lon
+            if result["status"] == "error":
+                continue
+
+            seen_ids.add(org_id)
+            rows.append({
+                "id": org_id, "name": item.name, "building_id": item.building_id,
+                "geo_cell": building_cells[item.building_id]
+            })
+            desired_phones.update((org_id, phone) for phone in item.phones)
+            desired_activities.update((org_id, activity_id) for activity_id in item.activity_ids)
+
+        org_ids = [row["id"] for row in rows]
+        statuses: Dict[UUID, str] = {}
+        try:
+            for chunk in _chunks(rows, chunk_size):
+                # Организации, переходящие в здание другой ячейки сетки, переносятся отдельно:
+                # конфликт вставки определяется по (id, geo_cell) - ключу секционированной таблицы
+                for org_id in OrganizationService._move_to_cells(db, chunk):
+                    statuses[org_id] = "updated"
+
+                stmt = pg_insert(Organization).values(chunk)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[Organization.id, Organization.geo_cell],
+                    set_={"name": stmt.excluded.name, "building_id": stmt.excluded.building_id},
+                    where=or_(
+                        Organization.name.is_distinct_from(stmt.excluded.name),
+                        Organization.building_id.is_distinct_from(stmt.excluded.building_id)
+                    )
+                ).returning(Organization.id, literal_column("xmax = 0").label("inserted"))
+                for org_id, inserted in db.execute(stmt):
+                    statuses[org_id] = "created" if inserted else "updated"
+
+            changed = OrganizationService._sync_links(
+                db, organization_phones, organization_phones.c.phone, org_ids, desired_phones
+            )
+            changed |= OrganizationService._sync_links(
+                db, organization_activities, organization_activities.c.activity_id, org_ids, desired_activities
             )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
 
-        total = query.count()
+        for result in results:
+            if result["status"] is None:
+                status = statuses.get(result["id"])
+                if status is None:
+                    status = "updated" if result["id"] in changed else "unchanged"
+                result["status"] = status
+            elif result["status"] == "error":
+                result["id"] = items[result["index"]].id
+
+        return {
+            "created": sum(1 for result in results if result["status"] == "created"),
+            "updated": sum(1 for result in results if result["status"] == "updated"),
+            "unchanged": sum(1 for result in results if result["status"] == "unchanged"),
+            "failed": sum(1 for result in results if result["status"] == "error"),
+            "items": results
+        }
+
+    @staticmethod
+    def _building_cells(db: Session, building_ids: set) -> Dict[UUID, int]:
+        """Ячейки сетки существующих зданий из набора"""
+        cells = {}
+        for chunk in _chunks(list(building_ids), settings.bulk_chunk_size):
+            cells.update(db.execute(select(Building.id, Building.geo_cell).where(Building.id.in_(chunk))).all())
+        return cells
+
+    @staticmethod
+    def _move_to_cells(db: Session, rows: List[Dict[str, Any]]) -> List[UUID]:
+        """
+        Перенести существующие организации порции, у которых меняется ячейка сетки
+        (новое здание в другой ячейке), одним UPDATE
+
+        Returns:
+            list: ID перенесённых организаций
+        """
+        moved = values(
+            column("id", PG_UUID(as_uuid=True)),
+            column("building_id", PG_UUID(as_uuid=True)),
+            column("geo_cell", Integer),
+            name="moved"
+        ).data([(row["id"], row["building_id"], row["geo_cell"]) for row in rows])
+        stmt = update(Organization.__table__).where(
+            Organization.id == moved.c.id,
+            Organization.geo_cell != moved.c.geo_cell
+        ).values(building_id=moved.c.building_id, geo_cell=moved.c.geo_cell).returning(Organization.id)
+        return list(db.execute(stmt).scalars())
+
+    @staticmethod
+    def _existing_ids(db: Session, id_column, ids: set) -> set:
+        """Выбрать существующие ID из набора"""
+        existing = set()
+        for chunk in _chunks(list(ids), settings.bulk_chunk_size):
+            existing.update(row[0] for row in db.execute(select(id_column).where(id_column.in_(chunk))))
+        return existing
+
+    @staticmethod
+    def _sync_links(db: Session, table, value_column, org_ids: List[UUID], desired: set) -> set:
+        """
+        Привести таблицу связей организаций к желаемому набору пар (organization_id, значение)
+
+        Returns:
+            set: ID организаций, у которых изменились связи
+        """
+        org_column = table.c.organization_id
+        current = set()
+        for chunk in _chunks(org_ids, settings.bulk_chunk_size):
+            current.update(
+                (row[0], row[1])
+                for row in db.execute(select(org_column, value_column).where(org_column.in_(chunk)))
+            )
+
+        to_delete = list(current - desired)
+        to_insert = list(desired - current)
+        for chunk in _chunks(to_delete, settings.bulk_chunk_size):
+            db.execute(delete(table).where(tuple_(org_column, value_column).in_(chunk)))
+        for chunk in _chunks(to_insert, settings.bulk_chunk_size):
+            db.execute(
+                pg_insert(table).values([
+                    {"organization_id": org_id, value_column.name: value} for org_id, value in chunk
+                ]).on_conflict_do_nothing()
+            )
+
+        return {org_id for org_id, _ in to_delete} | {org_id for org_id, _ in to_insert}
+
+    @staticmethod
+    def _load_options(fields: Optional[FrozenSet[str]] = None) -> Tuple[Any, ...]:
+        """
+        Опции загрузки организаций только с запрошенными полями
+
+        Без fields загружаются здание и виды деятельности (полный ответ).
+        С fields выбираются только нужные колонки, а JOIN со зданием и видами
+        деятельности добавляется, только если они запрошены.
+        """
+        if fields is None:
+            return joinedload(Organization.building), joinedload(Organization.activities)
+
+        columns = [Organization.id, Organization.building_id]
+        if "name" in fields:
+            columns.append(Organization.name)
+        options = [load_only(*columns)]
+        if "building" in fields:
+            options.append(joinedload(Organization.building))
+        if "activities" in fields:
+            options.append(joinedload(Organization.activities))
+        return tuple(options)
+
+    @staticmethod
+    def _base_query(db: Session, fields: Optional[FrozenSet[str]] = None):
+        """Запрос организаций (Query) с загрузкой только запрошенных полей"""
+        return db.query(Organization).options(*OrganizationService._load_options(fields))
+
+    @staticmethod
+    def _select(fields: Optional[FrozenSet[str]] = None):
+        """
+        Выборка организаций (lambda_stmt) с загрузкой только запрошенных полей
+
+        Выражение кэшируется по коду лямбд и набору полей: повторный запрос той же формы
+        не строит select() и не компилирует SQL заново, подставляются только параметры.
+        """
+        options = OrganizationService._load_options(fields)
+        stmt = lambda_stmt(lambda: select(Organization))
+        return stmt.add_criteria(lambda s: s.options(*options), track_on=[fields])
+
+    @staticmethod
+    def _select_ids(criteria: List[Callable]):
+        """Запрос ID организаций (обычный select) с условиями criteria - например, для фасетов"""
+        stmt = select(Organization.id)
+        for criterion in criteria:
+            stmt = criterion(stmt)
+        return stmt
+
+    @staticmethod
+    def _paginate_select(
+        db: Session, criteria: List[Callable], pagination: PaginationParams,
+        fields: Optional[FrozenSet[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Выполнить выборку организаций с условиями criteria и пагинацией
+
+        criteria - лямбды вида lambda s: s.where(...), которые добавляются к lambda_stmt
+        выборки, подсчёта и проверки стоимости. Значения из замыканий лямбд становятся
+        параметрами запроса, поэтому в лямбдах не должно быть вычислений над ними.
+
+        Raises:
+            QueryCostExceeded: Если оценка стоимости превышает бюджет (см. _paginate)
+        """
+        ids = lambda_stmt(lambda: select(Organization.id))
+        count = lambda_stmt(lambda: select(func.count(Organization.id)))
+        page = OrganizationService._select(fields)
+        for criterion in criteria:
+            ids += criterion
+            count += criterion
+            page += criterion
+
+        total = check_query_cost(db, ids)
+        if total is None:
+            total = db.execute(count).scalar()
+
+        offset = (pagination.page - 1) * pagination.size
+        size = pagination.size
+        page += lambda s: s.offset(offset).limit(size)
+        organizations = db.execute(page).unique().scalars().all()
+        return OrganizationService._page_result(db, organizations, total, pagination, fields)
+
+    @staticmethod
+    def _paginate(db: Session, query, pagination: PaginationParams, fields: Optional[FrozenSet[str]] = None) -> Dict[str, Any]:
+        """
+        Выполнить запрос с пагинацией
+
+        До count() стоимость выборки оценивается по EXPLAIN (app.query_guard): запрос
+        сверх бюджета отклоняется либо вместо точного количества возвращается оценка.
+
+        Raises:
+            QueryCostExceeded: Если оценка стоимости превышает бюджет
+        """
+        total = check_query_cost(db, query.enable_eagerloads(False).order_by(None).statement)
+        if total is None:
+            total = query.count()
         organizations = query.offset((pagination.page - 1) * pagination.size).limit(pagination.size).all()
+        return OrganizationService._page_result(db, organizations, total, pagination, fields)
 
+    @staticmethod
+    def _page_result(
+        db: Session, organizations: List[Organization], total: int, pagination: PaginationParams,
+        fields: Optional[FrozenSet[str]] = None
+    ) -> Dict[str, Any]:
+        """Страница организаций в формате ответа сервиса; при выборе полей телефоны загружаются одним запросом"""
         pages = (total + pagination.size - 1) // pagination.size
-        return {
+        result = {
             "items": organizations,
             "total": total,
             "page": pagination.page,
             "size": pagination.size,
             "pages": pages
         }
+        if fields is not None and "phones" in fields:
+            result["phones"] = OrganizationService.get_phones(db, [org.id for org in organizations])
+        return result
 
     @staticmethod
-    def _apply_filters(query, search_params: OrganizationSearchParams):
-        """Применить фильтры к запросу"""
+    def get_phones(db: Session, org_ids: List[UUID]) -> Dict[UUID, List[str]]:
+        """Телефоны нескольких организаций одним запросом"""
+        phones: Dict[UUID, List[str]] = {org_id: [] for org_id in org_ids}
+        if not org_ids:
+            return phones
+        for org_id, phone in db.execute(
+            select(organization_phones.c.organization_id, organization_phones.c.phone)
+            .where(organization_phones.c.organization_id.in_(org_ids))
+        ):
+            phones[org_id].append(phone)
+        return phones
+
+    @staticmethod
+    def _filter_criteria(db: Session, search_params: OrganizationSearchParams) -> List[Callable]:
+        """Условия фильтров поиска для _paginate_select"""
+        criteria = []
         if search_params.name:
-            query = query.filter(Organization.name.ilike(f"%{search_params.name}%"))
+            pattern = f"%{search_params.name}%"
+            criteria.append(lambda s: s.where(Organization.name.ilike(pattern)))
 
         if search_params.building_id:
-            query = query.filter(Organization.building_id == search_params.building_id)
+            building_id = search_params.building_id
+            criteria.append(lambda s: s.where(Organization.building_id == building_id))
 
         if search_params.activity_id:
-            query = query.join(Organization.activities).filter(Activity.id == search_params.activity_id)
+            activity_id = search_params.activity_id
+            criteria.append(lambda s: s.join(Organization.activities).where(Activity.id == activity_id))
 
         if search_params.activity_tree_id:
-            # Получаем сессию из query
-            db = query.session
             activity_ids = OrganizationService._get_activity_tree_ids(db, search_params.activity_tree_id)
             activity_ids.append(search_params.activity_tree_id)
-            query = query.join(Organization.activities).filter(Activity.id.in_(activity_ids))
+            criteria.append(lambda s: s.join(Organization.activities).where(Activity.id.in_(activity_ids)))
 
-        return query
+        return criteria
 
     @staticmethod
     def _get_activity_tree_ids(db: Session, activity_id: UUID) -> List[UUID]:
-        """Получить все ID дочерних видов деятельности"""
-        activity_ids = []
+        """Получить все ID дочерних видов деятельности (поиск по префиксу материализованного пути)"""
+        parent_path = db.query(Activity.path).filter(Activity.id == activity_id).scalar()
+        if parent_path is None:
+            return []
+        return [
+            row[0] for row in db.query(Activity.id).filter(Activity.path.like(f"{parent_path}/%"))
+        ]
+
+
+class AreaService:
+    """Сервис для подготовки областей поиска (полигонов)"""
+
+    # Кэш подготовленных областей: хэш GeoJSON -> список частей в WKT
+    _cache = TTLCache(maxsize=settings.area_cache_size, ttl=settings.area_cache_ttl)
+
+    @staticmethod
+    def resolve_area(
+        db: Session, request: AreaSearchRequest, primary_db: Optional[Session] = None
+    ) -> Optional[List[str]]:
+        """
+        Получить части области для поиска.
+
+        Именованные области хранятся в таблице search_areas и доступны всем воркерам;
+        они читаются и сохраняются через primary_db (основная база), чтобы только что
+        сохранённая область была видна сразу, без задержки репликации.
+
+        Возвращает None, если запрошена неизвестная именованная область.
+
+        Raises:
+            ValueError: Если geometry не является корректным Polygon/MultiPolygon
+        """
+        primary_db = primary_db or db
+        if request.geometry is None:
+            area = primary_db.get(SearchArea, request.area_name)
+            return list(area.parts) if area is not None else None
+
+        geojson = json.dumps(request.geometry, sort_keys=True, separators=(",", ":"))
+        digest_key = ("geojson", hashlib.sha1(geojson.encode()).hexdigest())
+
+        parts = AreaService._cache.get(digest_key)
+        if parts is None:
+            parts = AreaService._prepare_area(db, request.geometry, geojson)
+            AreaService._cache.set(digest_key, parts)
+
+        if request.area_name:
+            AreaService._save_area(primary_db, request.area_name, request.geometry, parts)
+        return parts
 
-        def get_children(parent_id: UUID):
-            children = db.query(Activity).filter(Activity.parent_id == parent_id).all()
-            for child in children:
-                activity_ids.append(child.id)
-                get_children(child.id)
+    @staticmethod
+    def _save_area(db: Session, name: str, geometry: Dict[str, Any], parts: List[str]) -> None:
+        """Сохранить именованную область (повторное сохранение заменяет область)"""
+        stmt = pg_insert(SearchArea).values(name=name, geometry=geometry, parts=parts)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[SearchArea.name],
+            set_={"geometry": stmt.excluded.geometry, "parts": stmt.excluded.parts, "updated_at": func.now()}
+        ))
+        db.commit()
+
+    @staticmethod
+    def _prepare_area(db: Session, geometry: Dict[str, Any], geojson: str) -> List[str]:
+        """Проверить полигон и при необходимости разбить его на части (ST_Subdivide)"""
+        import shapely
+        from shapely.geometry import shape
+        from shapely.validation import explain_validity
 
-        get_children(activity_id)
-        return activity_ids
+        try:
+            polygon = shape(geometry)
+        except Exception as e:
+            raise ValueError(f"Некорректный GeoJSON: {e}")
+
+        if polygon.geom_type not in ("Polygon", "MultiPolygon"):
+            raise ValueError("Область должна быть типа Polygon или MultiPolygon")
+        if polygon.is_empty or not polygon.is_valid:
+            raise ValueError(f"Некорректный полигон: {explain_validity(polygon)}")
+
+        # Небольшие полигоны используем как есть, крупные режем на части,
+        # чтобы ограничивающие прямоугольники частей эффективно отсекались GiST-индексом
+        max_vertices = settings.area_subdivide_max_vertices
+        if shapely.get_num_coordinates(polygon) <= max_vertices:
+            return [f"SRID=4326;{polygon.wkt}"]
+
+        rows = db.execute(
+            text("SELECT ST_AsEWKT(ST_Subdivide(ST_SetSRID(ST_GeomFromGeoJSON(:geojson), 4326), :max_vertices))"),
+            {"geojson": geojson, "max_vertices": max_vertices}
+        )
+        return [row[0] for row in rows]
+
+
+class ChangeService:
+    """Сервис ленты изменений для инкрементальной синхронизации клиентов"""
+
+    @staticmethod
+    def get_changes(db: Session, since: int, limit: int) -> Dict[str, Any]:
+        """
+        Получить не более limit изменений с change_seq > since в порядке возрастания
+
+        Каждая таблица читается по индексу на change_seq, поэтому объём работы
+        пропорционален числу изменений, а не размеру справочника. Выдаются только
+        изменения не позже границы фиксации (get_watermark): изменения незавершённых
+        транзакций с меньшими номерами попадут в следующие ответы. Сессия должна
+        быть подключена к primary.
+        """
+        watermark = ChangeService.get_watermark(db)
+        sources = [
+            ("organizations", Organization, Organization.change_seq),
+            ("buildings", Building, Building.change_seq),
+            ("activities", Activity, Activity.change_seq),
+            ("deleted", deleted_records, deleted_records.c.change_seq),
+        ]
+
+        # Берём по limit + 1 записей из каждого источника и оставляем limit первых в общем порядке
+        changes = []
+        for name, source, seq_column in sources:
+            result = db.execute(
+                select(source)
+                .where(seq_column > since, seq_column <= watermark)
+                .order_by(seq_column)
+                .limit(limit + 1)
+            )
+            rows = result.all() if name == "deleted" else result.scalars().all()
+            changes.extend((row.change_seq, name, row) for row in rows)
+
+        changes.sort(key=lambda change: change[0])
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+
+        result: Dict[str, List[Any]] = {"organizations": [], "buildings": [], "activities": [], "deleted": []}
+        for _, name, row in changes:
+            result[name].append(row)
+
+        organizations = result["organizations"]
+        phones, activity_ids = ChangeService._organization_links(db, [org.id for org in organizations])
+
+        return {
+            "organizations": [
+                {
+                    "id": org.id,
+                    "name": org.name,
+                    "building_id": org.building_id,
+                    "phones": phones.get(org.id, []),
+                    "activity_ids": activity_ids.get(org.id, []),
+                    "updated_at": org.updated_at,
+                    "change_seq": org.change_seq
+                }
+                for org in organizations
+            ],
+            "buildings": result["buildings"],
+            "activities": result["activities"],
+            "deleted": [
+                {
+                    "entity_type": row.entity_type,
+                    "id": row.entity_id,
+                    "deleted_at": row.deleted_at,
+                    "change_seq": row.change_seq
+                }
+                for row in result["deleted"]
+            ],
+            # Без has_more выданы все изменения до границы, токен переходит к ней
+            "next_token": changes[-1][0] if has_more else max(since, watermark),
+            "has_more": has_more
+        }
+
+    @staticmethod
+    def get_watermark(db: Session) -> int:
+        """
+        Граница фиксации ленты изменений: все change_seq не больше неё принадлежат
+        завершённым транзакциям (функция change_watermark, миграция 0010)
+
+        Вычисляется только на primary: на репликах pg_locks не содержит блокировок
+        пишущих транзакций.
+        """
+        return db.execute(text("SELECT change_watermark()")).scalar()
+
+    @staticmethod
+    def get_data_version(db: Session) -> int:
+        """
+        Текущая версия данных для кэшей и офлайн-снимков - граница фиксации (get_watermark)
+
+        Все изменения с change_seq не больше версии зафиксированы, поэтому данные,
+        прочитанные после получения версии, содержат их все; изменение, зафиксированное
+        позже, сдвигает границу, и версия меняется. Сессия должна быть подключена к primary.
+        Версия может вырасти без видимых изменений (откатившиеся транзакции), кэши
+        сравнивают её только на равенство.
+        """
+        return ChangeService.get_watermark(db)
+
+    @staticmethod
+    def _organization_links(db: Session, org_ids: List[UUID]):
+        """Телефоны и ID видов деятельности организаций (по одному запросу)"""
+        phones: Dict[UUID, List[str]] = {}
+        activity_ids: Dict[UUID, List[UUID]] = {}
+        if not org_ids:
+            return phones, activity_ids
+
+        for org_id, phone in db.execute(
+            select(organization_phones.c.organization_id, organization_phones.c.phone)
+            .where(organization_phones.c.organization_id.in_(org_ids))
+        ):
+            phones.setdefault(org_id, []).append(phone)
+
+        for org_id, activity_id in db.execute(
+            select(organization_activities.c.organization_id, organization_activities.c.activity_id)
+            .where(organization_activities.c.organization_id.in_(org_ids))
+        ):
+            activity_ids.setdefault(org_id, []).append(activity_id)
+
+        return phones, activity_ids
 
 
 class BuildingService:
     """Сервис для работы со зданиями"""
 
     @staticmethod
-    def get_buildings(db: Session, pagination: PaginationParams) -> Dict[str, Any]:
+    def get_buildings(
+        db: Session, pagination: PaginationParams, fields: Optional[FrozenSet[str]] = None
+    ) -> Dict[str, Any]:
         """Получить список зданий"""
-        query = db.query(Building)
+        query = BuildingService._base_query(db, fields)
 
         total = query.count()
         buildings = query.offset((pagination.page - 1) * pagination.size).limit(pagination.size).all()
@@ -250,9 +960,129 @@ class BuildingService:
         }
 
     @staticmethod
-    def get_building_by_id(db: Session, building_id: UUID) -> Optional[Building]:
+    def get_building_by_id(
+        db: Session, building_id: UUID, fields: Optional[FrozenSet[str]] = None
+    ) -> Optional[Building]:
         """Получить здание по ID"""
-        return db.query(Building).filter(Building.id == building_id).first()
+        stmt = BuildingService._select(fields)
+        stmt += lambda s: s.where(Building.id == building_id)
+        return db.execute(stmt).scalars().first()
+
+    @staticmethod
+    def get_building_with_organizations(
+        db: Session, building_id: UUID, limit: int, cursor: Optional[UUID] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Получить здание с организациями, их телефонами и видами деятельности
+
+        Постоянное число запросов независимо от числа организаций: здание, организации
+        (по возрастанию ID, после cursor), их виды деятельности (selectinload) и телефоны.
+        Если организаций больше limit, next_cursor - ID последней выданной организации.
+        """
+        building = BuildingService.get_building_by_id(db, building_id)
+        if building is None:
+            return None
+
+        query = db.query(Organization).options(selectinload(Organization.activities)).filter(
+            Organization.building_id == building_id
+        )
+        if cursor is not None:
+            query = query.filter(Organization.id > cursor)
+        organizations = query.order_by(Organization.id).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(organizations) > limit:
+            organizations = organizations[:limit]
+            next_cursor = organizations[-1].id
+
+        return {
+            "building": building,
+            "organizations": organizations,
+            "phones": OrganizationService.get_phones(db, [org.id for org in organizations]),
+            "next_cursor": next_cursor
+        }
+
+    @staticmethod
+    def _load_options(fields: Optional[FrozenSet[str]] = None) -> Tuple[Any, ...]:
+        """Опции загрузки зданий: с fields выбираются только запрошенные колонки"""
+        if fields is None:
+            return ()
+        return (load_only(*(getattr(Building, name) for name in sorted(fields))),)
+
+    @staticmethod
+    def _base_query(db: Session, fields: Optional[FrozenSet[str]] = None):
+        """Запрос зданий; с fields выбираются только запрошенные колонки"""
+        return db.query(Building).options(*BuildingService._load_options(fields))
+
+    @staticmethod
+    def _select(fields: Optional[FrozenSet[str]] = None):
+        """Выборка зданий (lambda_stmt, см. OrganizationService._select)"""
+        options = BuildingService._load_options(fields)
+        stmt = lambda_stmt(lambda: select(Building))
+        return stmt.add_criteria(lambda s: s.options(*options), track_on=[fields])
+
+    @staticmethod
+    def create_building(db: Session, data: BuildingCreate) -> Building:
+        """
+        Создать здание
+
+        Raises:
+            ValueError: Если здание с таким адресом уже существует
+        """
+        building = Building(id=uuid.uuid4())
+        BuildingService._fill_building(building, data)
+        db.add(building)
+        BuildingService._commit(db)
+        return building
+
+    @staticmethod
+    def update_building(db: Session, building_id: UUID, data: BuildingCreate) -> Optional[Building]:
+        """
+        Обновить здание
+
+        Raises:
+            ValueError: Если здание с таким адресом уже существует
+        """
+        building = BuildingService.get_building_by_id(db, building_id)
+        if building is None:
+            return None
+        BuildingService._fill_building(building, data)
+        BuildingService._commit(db)
+        return building
+
+    @staticmethod
+    def delete_building(db: Session, building_id: UUID) -> bool:
+        """
+        Удалить здание
+
+        Raises:
+            ValueError: Если в здании есть организации
+        """
+        building = BuildingService.get_building_by_id(db, building_id)
+        if building is None:
+            return False
+        if db.query(Organization.id).filter(Organization.building_id == building_id).first() is not None:
+            raise ValueError("В здании есть организации, удаление невозможно")
+        db.delete(building)
+        db.commit()
+        return True
+
+    @staticmethod
+    def _fill_building(building: Building, data: BuildingCreate) -> None:
+        building.address = data.address
+        building.latitude = data.latitude
+        building.longitude = data.longitude
+        building.coordinates = f"SRID=4326;POINT({float(data.longitude)} {float(data.latitude)})"
+        # При смене ячейки организации здания переносятся каскадно (внешний ключ ON UPDATE CASCADE)
+        building.geo_cell = geo_cell(data.latitude, data.longitude)
+
+    @staticmethod
+    def _commit(db: Session) -> None:
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise ValueError("Здание с таким адресом уже существует")
 
 
 class ActivityService:
@@ -284,3 +1114,132 @@ class ActivityService:
     def get_activity_tree(db: Session) -> List[Activity]:
         """Получить дерево видов деятельности"""
         return db.query(Activity).options(joinedload(Activity.children)).filter(Activity.parent_id.is_(None)).all()
+
+    @staticmethod
+    def get_organization_counts(db: Session, org_ids=None) -> Dict[UUID, Tuple[int, int]]:
+        """
+        Число организаций по видам деятельности одним сгруппированным запросом
+
+        Материализованный путь связанного вида деятельности разворачивается в ID предков,
+        поэтому организация учитывается у своего вида деятельности и у каждого предка
+        один раз. Виды деятельности без организаций в результат не попадают.
+
+        Args:
+            org_ids: Запрос ID организаций для ограничения набора (None - все организации)
+
+        Returns:
+            dict: ID вида деятельности -> (организации с этим видом, организации во всём поддереве)
+        """
+        links = organization_activities.c
+        ancestors = func.unnest(func.string_to_array(Activity.path, "/")).table_valued(
+            "activity_id"
+        ).render_derived(name="ancestors")
+        ancestor_id = cast(ancestors.c.activity_id, PG_UUID(as_uuid=True))
+        organization_id = links.organization_id.distinct()
+        query = (
+            select(
+                ancestor_id,
+                func.count(organization_id).filter(ancestor_id == Activity.id),
+                func.count(organization_id)
+            )
+            .select_from(
+                organization_activities
+                .join(Activity, Activity.id == links.activity_id)
+                .join(ancestors, true())
+            )
+            .group_by(ancestor_id)
+        )
+        if org_ids is not None:
+            query = query.where(links.organization_id.in_(org_ids))
+        return {activity_id: (direct, subtree) for activity_id, direct, subtree in db.execute(query)}
+
+    @staticmethod
+    def get_tree_version(db: Session) -> int:
+        """
+        Версия дерева видов деятельности: последний change_seq среди изменений
+        и удалений видов деятельности не больше границы фиксации (0 для пустого справочника)
+
+        Изменения выше границы могут принадлежать ещё не зафиксированным транзакциям:
+        без ограничения версия по более позднему зафиксированному изменению не изменилась бы,
+        когда зафиксируется более раннее. Сессия должна быть подключена к primary.
+        """
+        watermark = ChangeService.get_watermark(db)
+        version = db.execute(lambda_stmt(lambda: select(func.greatest(
+            select(func.max(Activity.change_seq))
+            .where(Activity.change_seq <= watermark)
+            .scalar_subquery(),
+            select(func.max(deleted_records.c.change_seq))
+            .where(deleted_records.c.entity_type == 'activities', deleted_records.c.change_seq <= watermark)
+            .scalar_subquery()
+        )))).scalar()
+        return version or 0
+
+    @staticmethod
+    def create_activity(db: Session, data: ActivityCreate) -> Activity:
+        """
+        Создать вид деятельности (уровень и путь вычисляются триггером по родителю)
+
+        Raises:
+            ValueError: Если родитель не найден или превышена глубина дерева
+        """
+        activity = Activity(id=uuid.uuid4(), name=data.name, parent_id=data.parent_id)
+        db.add(activity)
+        ActivityService._commit(db)
+        return activity
+
+    @staticmethod
+    def update_activity(db: Session, activity_id: UUID, data: ActivityCreate) -> Optional[Activity]:
+        """
+        Обновить название и родителя вида деятельности (поддерево перестраивается триггером)
+
+        Raises:
+            ValueError: Если родитель не найден, образуется цикл или превышена глубина дерева
+        """
+        activity = db.query(Activity).filter(Activity.id == activity_id).first()
+        if activity is None:
+            return None
+
+        activity.name = data.name
+        activity.parent_id = data.parent_id
+        ActivityService._commit(db)
+        return activity
+
+    @staticmethod
+    def delete_activity(db: Session, activity_id: UUID) -> bool:
+        """
+        Удалить вид деятельности
+
+        Raises:
+            ValueError: Если у вида деятельности есть дочерние или связанные организации
+        """
+        activity = db.query(Activity).filter(Activity.id == activity_id).first()
+        if activity is None:
+            return False
+        if db.query(Activity.id).filter(Activity.parent_id == activity_id).first() is not None:
+            raise ValueError("У вида деятельности есть дочерние, удаление невозможно")
+        linked = db.execute(
+            select(organization_activities.c.organization_id)
+            .where(organization_activities.c.activity_id == activity_id)
+            .limit(1)
+        ).first()
+        if linked is not None:
+            raise ValueError("Вид деятельности связан с организациями, удаление невозможно")
+        db.delete(activity)
+        db.commit()
+        return True
+
+    @staticmethod
+    def _commit(db: Session) -> None:
+        """Зафиксировать изменения; ошибки проверок иерархии из триггера превращаются в ValueError"""
+        try:
+            db.commit()
+        except IntegrityError as e:
+            db.rollback()
+            diag = getattr(e.orig, "diag", None)
+            raise ValueError(getattr(diag, "message_primary", None) or str(e.orig))
+
+
+def _chunks(items: List[Any], size: int):
+    """Разбить список на порции"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
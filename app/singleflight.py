@@ -0,0 +1,67 @@
+import asyncio
+from typing import Any, Callable, Dict, Hashable
+from starlette.concurrency import run_in_threadpool
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных запросов (single-flight)
+
+    Первый запрос с данным ключом выполняет функцию в пуле потоков,
+    остальные запросы с тем же ключом ждут и получают тот же результат.
+    Функция должна возвращать уже сериализованный результат (Pydantic-модели),
+    не привязанный к сессии базы данных ведущего запроса.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Выполнить fn(*args, **kwargs) или дождаться уже выполняющегося вызова с тем же ключом
+
+        Вызов выполняется в отдельной задаче: отмена ведущего запроса (например, клиент
+        отключился) не отменяет вызов и не передаётся ожидающим запросам.
+        """
+        task = self._calls.get(key)
+        leader = task is None
+        if leader:
+            task = asyncio.ensure_future(run_in_threadpool(fn, *args, **kwargs))
+            self._calls[key] = task
+            self.executed += 1
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if leader and not task.done():
+                # fn работает с сессией ведущего запроса, которая закрывается после его
+                # отмены: ведущий запрос завершается только вместе с вызовом
+                await asyncio.wait([task])
+            raise
+
+    def _finish(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # exception() помечает исключение обработанным, чтобы не было предупреждения,
+        # если ожидающих запросов нет
+        if task.cancelled() or task.exception() is not None:
+            self.errors += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Метрики объединения запросов"""
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "in_flight": len(self._calls)
+        }
+
+
+# Общий экземпляр для сервисных запросов
+single_flight = SingleFlight()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Офлайн-снимки справочника для мобильных и edge-клиентов
+
+Снимок - сжатый gzip файл MessagePack со всем справочником в колоночном виде:
+здания с числовыми координатами, дерево видов деятельности и организации
+с телефонами и ID видов деятельности. UUID хранятся как 16 байт.
+Снимок собирается один раз на версию данных (граница фиксации change_seq,
+ChangeService.get_data_version), вместе с ним
+строятся дельты от предыдущих хранимых версий (добавленные/изменённые строки
+и удалённые ID по каждой таблице), чтобы клиенты докачивали только изменения.
+
+    python -m app.snapshots build
+
+Структура каталога settings.snapshot_dir:
+    manifest.json
+    snapshot-<version>.msgpack.gz
+    delta-<from>-<to>.msgpack.gz
+    .build.lock - блокировка сборки (fcntl), общая для всех процессов
+
+Сборка выполняется под блокировкой файла, поэтому воркеры gunicorn и команда build
+не собирают снимки одновременно. Файлы, на которые ссылался предыдущий манифест,
+удаляются только при следующей сборке: клиенты, успевшие прочитать старый
+манифест, ещё могут их скачать.
+"""
+
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Building, Activity, Organization, organization_phones, organization_activities
+from app.services import ChangeService
+import logging
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+
+# Колонки таблиц снимка; первая колонка - ID строки
+TABLE_COLUMNS = {
+    "buildings": ["id", "address", "latitude", "longitude"],
+    "activities": ["id", "name", "parent_id", "level"],
+    "organizations": ["id", "name", "building_id", "phones", "activity_ids"],
+}
+
+
+
+@contextmanager
+def _build_lock():
+    """Блокировка сборки снимков между процессами и потоками (на открытый файл)"""
+    os.makedirs(settings.snapshot_dir, exist_ok=True)
+    with open(os.path.join(settings.snapshot_dir, ".build.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _pack(payload: Dict[str, Any]) -> bytes:
+    import msgpack
+    return gzip.compress(msgpack.packb(payload, use_bin_type=True), compresslevel=9)
+
+
+def _unpack(data: bytes) -> Dict[str, Any]:
+    import msgpack
+    return msgpack.unpackb(gzip.decompress(data), raw=False)
+
+
+def _uuid_bytes(value) -> Optional[bytes]:
+    return value.bytes if value is not None else None
+
+
+def collect_snapshot(db: Session, version: int) -> Dict[str, Any]:
+    """Выгрузить справочник в колоночном виде (по одному запросу на таблицу)"""
+    buildings = {column: [] for column in TABLE_COLUMNS["buildings"]}
+    for row in db.execute(
+        select(Building.id, Building.address, Building.latitude, Building.longitude).order_by(Building.id)
+    ):
+        buildings["id"].append(row.id.bytes)
+        buildings["address"].append(row.address)
+        buildings["latitude"].append(float(row.latitude))
+        buildings["longitude"].append(float(row.longitude))
+
+    activities = {column: [] for column in TABLE_COLUMNS["activities"]}
+    for row in db.execute(
+        select(Activity.id, Activity.name, Activity.parent_id, Activity.level).order_by(Activity.path)
+    ):
+        activities["id"].append(row.id.bytes)
+        activities["name"].append(row.name)
+        activities["parent_id"].append(_uuid_bytes(row.parent_id))
+        activities["level"].append(row.level)
+
+    phones: Dict[Any, List[str]] = {}
+    for org_id, phone in db.execute(select(organization_phones.c.organization_id, organization_phones.c.phone)):
+        phones.setdefault(org_id, []).append(phone)
+
+    activity_ids: Dict[Any, List[bytes]] = {}
+    for org_id, activity_id in db.execute(
+        select(organization_activities.c.organization_id, organization_activities.c.activity_id)
+    ):
+        activity_ids.setdefault(org_id, []).append(activity_id.bytes)
+
+    organizations = {column: [] for column in TABLE_COLUMNS["organizations"]}
+    for row in db.execute(
+        select(Organization.id, Organization.name, Organization.building_id).order_by(Organization.id)
+    ):
+        organizations["id"].append(row.id.bytes)
+        organizations["name"].append(row.name)
+        organizations["building_id"].append(row.building_id.bytes)
+        organizations["phones"].append(sorted(phones.get(row.id, [])))
+        organizations["activity_ids"].append(sorted(activity_ids.get(row.id, [])))
+
+    return {
+        "format": SNAPSHOT_FORMAT,
+        "version": version,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "buildings": buildings,
+        "activities": activities,
+        "organizations": organizations,
+    }
+
+
+def _rows_by_id(table: Dict[str, List[Any]], columns: List[str]) -> Dict[bytes, tuple]:
+    return {
+        row[0]: row
+        for row in zip(*(table[column] for column in columns))
+    }
+
+
+def compute_delta(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Дельта между снимками: добавленные/изменённые строки (в колоночном виде) и удалённые ID"""
+    delta = {
+        "format": SNAPSHOT_FORMAT,
+        "from_version": old["version"],
+        "to_version": new["version"],
+    }
+    for table, columns in TABLE_COLUMNS.items():
+        old_rows = _rows_by_id(old[table], columns)
+        new_rows = _rows_by_id(new[table], columns)
+
+        upserts = {column: [] for column in columns}
+        for row_id, row in new_rows.items():
+            if old_rows.get(row_id) != row:
+                for column, value in zip(columns, row):
+                    upserts[column].append(value)
+
+        delta[table] = {
+            "upsert": upserts,
+            "delete": [row_id for row_id in old_rows if row_id not in new_rows],
+        }
+    return delta
+
+
+def _write_file(path: str, data: bytes) -> Dict[str, Any]:
+    """Атомарно записать файл (через временный файл в том же каталоге) и вернуть его описание"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return {
+        "file": os.path.basename(path),
+        "size": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }
+
+
+def load_manifest() -> Dict[str, Any]:
+    """Прочитать манифест снимков (пустой, если снимков ещё нет)"""
+    path = os.path.join(settings.snapshot_dir, "manifest.json")
+    if not os.path.exists(path):
+        return {"latest": None, "snapshots": {}, "deltas": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def build_snapshot(db: Session, force: bool = False) -> Dict[str, Any]:
+    """
+    Собрать снимок для текущей версии данных, если он ещё не собран
+
+    Сессия должна быть подключена к primary (версия - граница фиксации изменений).
+
+    Returns:
+        dict: Манифест снимков
+    """
+    with _build_lock():
+        version = ChangeService.get_data_version(db)
+        manifest = load_manifest()
+        if manifest["latest"] is not None and version <= manifest["latest"] and not force:
+            return manifest
+
+        payload = collect_snapshot(db, version)
+        snapshot_path = os.path.join(settings.snapshot_dir, f"snapshot-{version}.msgpack.gz")
+        entry = _write_file(snapshot_path, _pack(payload))
+        entry["generated_at"] = payload["generated_at"]
+
+        # Дельты от предыдущих хранимых версий к новой
+        previous_versions = sorted(
+            (int(v) for v in manifest["snapshots"] if int(v) != version), reverse=True
+        )[:max(settings.snapshot_keep - 1, 0)]
+        deltas = {}
+        for previous in previous_versions:
+            previous_path = os.path.join(settings.snapshot_dir, manifest["snapshots"][str(previous)]["file"])
+            with open(previous_path, "rb") as f:
+                previous_payload = _unpack(f.read())
+            delta_path = os.path.join(settings.snapshot_dir, f"delta-{previous}-{version}.msgpack.gz")
+            deltas[str(previous)] = _write_file(delta_path, _pack(compute_delta(previous_payload, payload)))
+
+        snapshots = {str(v): manifest["snapshots"][str(v)] for v in previous_versions}
+        snapshots[str(version)] = entry
+        new_manifest = {"latest": version, "snapshots": snapshots, "deltas": deltas}
+        _write_file(
+            os.path.join(settings.snapshot_dir, "manifest.json"),
+            json.dumps(new_manifest, indent=2).encode()
+        )
+
+        # Удаляем файлы, на которые не ссылаются ни новый, ни предыдущий манифест,
+        # и временные файлы прерванных сборок (другие сборки сейчас не выполняются)
+        referenced = set()
+        for item_manifest in (manifest, new_manifest):
+            referenced |= {item["file"] for item in item_manifest["snapshots"].values()}
+            referenced |= {item["file"] for item in item_manifest["deltas"].values()}
+        for name in os.listdir(settings.snapshot_dir):
+            if (name.endswith(".msgpack.gz") and name not in referenced) or name.endswith(".tmp"):
+                os.remove(os.path.join(settings.snapshot_dir, name))
+
+        logger.info(f"Собран снимок справочника версии {version} ({entry['size']} байт)")
+        return new_manifest
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Офлайн-снимки справочника")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--force", action="store_true", help="Пересобрать снимок текущей версии")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        manifest = build_snapshot(db, force=args.force)
+        print(json.dumps(manifest, indent=2))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
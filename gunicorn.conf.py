@@ -0,0 +1,54 @@
+"""
+Конфигурация gunicorn для продакшн-запуска: несколько воркеров uvicorn
+
+    gunicorn app.main:app -c gunicorn.conf.py
+
+Число воркеров задаётся WEB_CONCURRENCY (по умолчанию - число ядер). Значение
+передаётся приложению через окружение, по нему каждый воркер рассчитывает
+свою долю соединений с PostgreSQL (DB_MAX_CONNECTIONS, DB_RESERVED_CONNECTIONS).
+
+Приложение загружается в master-процессе (preload_app), там же до запуска
+воркеров загружаются дерево видов деятельности и API ключи: воркеры получают
+их через fork без повторных запросов и разделяют страницы памяти (copy-on-write).
+"""
+
+import gc
+import multiprocessing
+import os
+
+workers = int(os.environ.get("WEB_CONCURRENCY") or multiprocessing.cpu_count())
+# Должно быть задано до импорта приложения: по нему рассчитывается размер пула
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "5"))
+
+# Периодический перезапуск воркеров ограничивает рост памяти; разброс не даёт
+# всем воркерам перезапуститься одновременно
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+
+accesslog = os.environ.get("GUNICORN_ACCESSLOG")
+errorlog = "-"
+
+
+def when_ready(server):
+    """Master-процесс: загрузить статические данные до запуска воркеров"""
+    from app.main import preload_static_data
+
+    preload_static_data()
+    # Загруженные объекты не попадают в сборку мусора и не копируются при обходе GC в воркерах
+    gc.freeze()
+    server.log.info(f"Статические данные загружены, воркеров: {workers}")
+
+
+def post_fork(server, worker):
+    """Воркер: не использовать соединения, унаследованные от master-процесса"""
+    from app.main import dispose_engines
+
+    dispose_engines(close=False)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Замер холодного старта воркера
+
+Для каждого прогона в отдельном процессе измеряются:
+    import  - время импорта app.main (без сервера)
+    ready   - время от запуска uvicorn до первого успешного ответа /health
+              (импорт, lifespan с прогревом, открытие сокета)
+    first   - длительность первого запроса к --path после готовности
+    second  - длительность повторного такого же запроса
+
+    python scripts/bench_cold_start.py --runs 5
+    STARTUP_WARMUP=false python scripts/bench_cold_start.py --runs 5   # без прогрева
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def timed_get(url: str, api_key: str) -> float:
+    request = urllib.request.Request(url, headers={"X-API-Key": api_key})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+    except urllib.error.HTTPError as e:
+        # Ошибка тоже ответ: важна задержка, а не содержимое
+        e.read()
+    return time.perf_counter() - started
+
+
+def measure_import() -> float:
+    output = subprocess.check_output([sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, stderr=subprocess.DEVNULL)
+    return float(output.decode().strip().splitlines()[-1])
+
+
+def measure_boot(path: str, api_key: str, timeout: float):
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError("uvicorn завершился до готовности")
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError(f"сервер не ответил за {timeout} с")
+            try:
+                with urllib.request.urlopen(f"{base_url}/health", timeout=1) as response:
+                    if response.status == 200:
+                        break
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        ready = time.perf_counter() - started
+        first = timed_get(base_url + path, api_key)
+        second = timed_get(base_url + path, api_key)
+        return ready, first, second
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def summary(values):
+    values = sorted(values)
+    p90 = values[min(len(values) - 1, int(round(0.9 * (len(values) - 1))))]
+    return f"{statistics.median(values) * 1000:>9.1f} {p90 * 1000:>9.1f} {values[0] * 1000:>9.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер холодного старта воркера")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/api/activities/tree/", help="Эндпоинт для первого запроса")
+    parser.add_argument("--api-key", default=os.environ.get("API_KEY", "your-secret-api-key-here"))
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    results = {"import": [], "ready": [], "first": [], "second": []}
+    for run in range(args.runs):
+        results["import"].append(measure_import())
+        ready, first, second = measure_boot(args.path, args.api_key, args.timeout)
+        results["ready"].append(ready)
+        results["first"].append(first)
+        results["second"].append(second)
+        print(f"прогон {run + 1}: ready {ready * 1000:.1f} мс, first {first * 1000:.1f} мс", file=sys.stderr)
+
+    print(f"\n{'этап':<8} {'медиана':>9} {'p90':>9} {'мин':>9}  (мс)")
+    for name, values in results.items():
+        print(f"{name:<8} {summary(values)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Сравнение сжатия ответов: размер в байтах и время CPU на запрос
+
+Тела ответов берутся с работающего сервера (--url, можно несколько) или
+генерируются синтетически в формате страницы организаций и дерева видов
+деятельности. Для каждого тела и кодирования измеряется размер после сжатия,
+время сжатия и время отдачи из кэша сжатых тел (хэш тела + поиск в кэше).
+
+    python scripts/bench_compression.py
+    python scripts/bench_compression.py --url "http://localhost:8000/api/activities/tree" --api-key secret
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.request
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.compression import CompressedBodyCache, brotli, compress  # noqa: E402
+
+
+def synthetic_bodies():
+    """Синтетические ответы, похожие на реальные по структуре и повторяемости"""
+    activities = [
+        {"id": str(uuid.uuid4()), "name": name, "parent_id": None, "level": 1, "children": []}
+        for name in ("Еда", "Автомобили", "Услуги", "Образование")
+    ]
+    for parent in activities:
+        for i in range(5):
+            parent["children"].append({
+                "id": str(uuid.uuid4()), "name": f"{parent['name']} {i}",
+                "parent_id": parent["id"], "level": 2, "children": []
+            })
+
+    buildings = [
+        {"id": str(uuid.uuid4()), "address": f"г. Москва, ул. Ленина {i}, офис {i * 3}",
+         "latitude": 55.75 + i / 1000, "longitude": 37.61 + i / 1000}
+        for i in range(20)
+    ]
+    items = [
+        {
+            "id": str(uuid.uuid4()),
+            "name": f"ООО \"Организация {i}\"",
+            "building_id": buildings[i % len(buildings)]["id"],
+            "building": buildings[i % len(buildings)],
+            "phones": [{"phone": f"8-923-666-{i:02d}-{j:02d}"} for j in range(2)],
+            "activities": [child for child in activities[i % 4]["children"][:2]],
+        }
+        for i in range(100)
+    ]
+    page = {"items": items, "total": 10000, "page": 1, "size": 100, "pages": 100}
+    return {
+        "activities/tree": json.dumps(activities, ensure_ascii=False).encode(),
+        "organizations?size=100": json.dumps(page, ensure_ascii=False).encode(),
+    }
+
+
+def fetch_bodies(urls, api_key):
+    bodies = {}
+    for url in urls:
+        request = urllib.request.Request(url, headers={"X-API-Key": api_key, "Accept-Encoding": "identity"})
+        with urllib.request.urlopen(request) as response:
+            bodies[url] = response.read()
+    return bodies
+
+
+def measure(fn, repeat):
+    """Среднее время CPU одного вызова в микросекундах"""
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк сжатия ответов")
+    parser.add_argument("--url", action="append", default=[], help="URL эндпоинта (можно несколько)")
+    parser.add_argument("--api-key", default="your-secret-api-key-here")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    bodies = fetch_bodies(args.url, args.api_key) if args.url else synthetic_bodies()
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    if brotli is None:
+        print("brotli не установлен, измеряется только gzip\n")
+
+    print(f"{'тело':<40} {'код.':<5} {'байт':>9} {'сжато':>9} {'доля':>6} {'сжатие, мкс':>12} {'кэш, мкс':>9}")
+    for name, body in bodies.items():
+        for encoding in encodings:
+            compressed = compress(body, encoding)
+            compress_us = measure(lambda: compress(body, encoding), args.repeat)
+
+            cache = CompressedBodyCache(maxsize=16, ttl=None)
+            cache.get_or_compress(body, encoding)
+            cached_us = measure(lambda: cache.get_or_compress(body, encoding), args.repeat)
+
+            print(
+                f"{name[-40:]:<40} {encoding:<5} {len(body):>9} {len(compressed):>9} "
+                f"{len(compressed) / len(body):>6.1%} {compress_us:>12.1f} {cached_us:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Сравнение поиска рядом: индекс зданий в памяти (app.geo_index) и PostGIS
+
+Синтетический режим (без базы данных): индекс строится по --buildings случайным
+зданиям в пределах города, замеряется построение индекса и поиск в радиусе
+и прямоугольнике с разбиением на страницы; для сравнения - полный перебор NumPy.
+
+Режим --db: для одних и тех же случайных точек вокруг зданий из базы данных
+вызывается OrganizationService.get_organizations_nearby через PostGIS
+(ST_DWithin) и через индекс, выводятся задержки и число запросов к базе.
+
+    python scripts/bench_geo_index.py --buildings 200000
+    python scripts/bench_geo_index.py --db --queries 500 --radius 1
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.config import settings  # noqa: E402
+from app.geo_index import GeoIndex  # noqa: E402
+
+CENTER = (55.75, 37.62)
+SPREAD = 0.3
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(0.95 * len(timings)))]
+    print(f"{name:<36} {statistics.median(timings) * 1000:>9.3f} {p95 * 1000:>9.3f}")
+
+
+def synthetic(args):
+    rng = np.random.default_rng(42)
+    latitudes = rng.normal(CENTER[0], SPREAD / 3, args.buildings)
+    longitudes = rng.normal(CENTER[1], SPREAD / 2, args.buildings)
+    org_counts = rng.integers(0, 6, args.buildings)
+    ids = [uuid.uuid4() for _ in range(args.buildings)]
+
+    started = time.perf_counter()
+    index = GeoIndex(ids, latitudes, longitudes, org_counts, settings.geo_index_cell_degrees)
+    print(f"построение индекса: {args.buildings} зданий, {(time.perf_counter() - started) * 1000:.1f} мс")
+
+    points = np.column_stack([
+        rng.normal(CENTER[0], SPREAD / 3, args.queries),
+        rng.normal(CENTER[1], SPREAD / 2, args.queries),
+    ])
+    all_positions = np.arange(len(index))
+
+    radius_index, radius_brute, bbox_index = [], [], []
+    for latitude, longitude in points:
+        started = time.perf_counter()
+        positions = index.within_radius(latitude, longitude, args.radius)
+        index.page(positions, 1, 20)
+        radius_index.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        distances = index.distances(all_positions, latitude, longitude)
+        found = all_positions[distances <= args.radius * 1000]
+        found[np.argsort(distances[found])]
+        radius_brute.append(time.perf_counter() - started)
+
+        d = args.radius / 111.32
+        started = time.perf_counter()
+        positions = index.within_bbox(latitude - d, latitude + d, longitude - 2 * d, longitude + 2 * d, latitude, longitude)
+        index.page(positions, 1, 20)
+        bbox_index.append(time.perf_counter() - started)
+
+    print(f"\n{'запрос':<36} {'медиана':>9} {'p95':>9}  (мс)")
+    report(f"индекс: радиус {args.radius} км + страница", radius_index)
+    report(f"полный перебор: радиус {args.radius} км", radius_brute)
+    report("индекс: прямоугольник + страница", bbox_index)
+
+
+def database(args):
+    from sqlalchemy import event, select
+    from app.database import SessionLocal, engine
+    from app.geo_index import geo_index
+    from app.models import Building
+    from app.schemas import PaginationParams
+    from app.services import OrganizationService
+
+    statements = [0]
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_statements(*_):
+        statements[0] += 1
+
+    db = SessionLocal()
+    try:
+        coordinates = [(float(lat), float(lon)) for lat, lon in db.execute(
+            select(Building.latitude, Building.longitude)
+        )]
+        if not coordinates:
+            print("В базе нет зданий: заполните её (python -m app.seed_data)")
+            return
+        rng = np.random.default_rng(42)
+        points = [
+            (lat + rng.normal(0, 0.01), lon + rng.normal(0, 0.01))
+            for lat, lon in (coordinates[i] for i in rng.integers(0, len(coordinates), args.queries))
+        ]
+        pagination = PaginationParams(page=1, size=20)
+
+        # Построение индекса не входит в замер
+        settings.geo_index_enabled = True
+        geo_index.get()
+
+        print(f"{len(coordinates)} зданий, {args.queries} запросов, радиус {args.radius} км")
+        print(f"\n{'путь':<36} {'медиана':>9} {'p95':>9}  (мс)  запросов к БД на вызов")
+        for enabled, name in ((False, "PostGIS (ST_DWithin)"), (True, "индекс в памяти")):
+            settings.geo_index_enabled = enabled
+            timings = []
+            statements[0] = 0
+            for latitude, longitude in points:
+                started = time.perf_counter()
+                OrganizationService.get_organizations_nearby(
+                    db, latitude=latitude, longitude=longitude, radius_km=args.radius, pagination=pagination
+                )
+                timings.append(time.perf_counter() - started)
+                db.rollback()
+            report(name, timings)
+            print(f"{'':<58}{statements[0] / len(points):.2f}")
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк геоиндекса в памяти")
+    parser.add_argument("--buildings", type=int, default=100000, help="Число зданий (синтетический режим)")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--radius", type=float, default=1.0, help="Радиус поиска, км")
+    parser.add_argument("--db", action="store_true", help="Сравнить с PostGIS на данных из базы")
+    args = parser.parse_args()
+
+    if args.db:
+        database(args)
+    else:
+        synthetic(args)
+
+
+if __name__ == "__main__":
+    main()
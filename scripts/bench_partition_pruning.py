@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Отбор секций (partition pruning) при поиске организаций рядом
+
+Синтетический режим (без базы данных): здания распределяются вокруг крупных городов
+России (пропорционально населению) и равномерно по остальной территории, для
+случайных запросов в радиусе и в прямоугольной области вычисляются ячейки сетки
+(app.geo_cells) и секции - полосы широт, как в миграции 0011, - которые остаются в плане
+после отбора. Результат - сколько секций и какую долю строк (индексов и кучи) затрагивает
+запрос с отбором; без отбора - все непустые секции и 100%.
+
+Режим --db: база с секционированными таблицами (alembic upgrade geo_partitioning@head),
+--generate заполняет пустую базу тем же распределением. Каждый запрос выполняется
+методом сервиса с условиями отбора секций и без них: замеряется время, по EXPLAIN
+считаются секции в плане.
+
+    python scripts/bench_partition_pruning.py --buildings 20000000
+    GEO_PARTITIONING=true python scripts/bench_partition_pruning.py --db --generate --buildings 1000000
+    GEO_PARTITIONING=true python scripts/bench_partition_pruning.py --db --queries 200
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.config import settings  # noqa: E402
+from app.geo_cells import geo_cell, geo_cells_for_bbox, geo_cells_for_radius, geo_partition  # noqa: E402
+
+# Центры городов (широта, долгота) и вес - население, млн
+CITIES = [
+    (55.7558, 37.6176, 13.1), (59.9386, 30.3141, 5.6), (55.0084, 82.9357, 1.6), (56.8389, 60.6057, 1.5),
+    (55.7961, 49.1064, 1.3), (56.3269, 44.0059, 1.2), (55.1644, 61.4368, 1.2), (53.1959, 50.1002, 1.2),
+    (54.9885, 73.3242, 1.1), (47.2357, 39.7015, 1.1), (54.7388, 55.9721, 1.1), (56.0153, 92.8932, 1.2),
+    (51.6608, 39.2003, 1.0), (58.0105, 56.2502, 1.0), (48.7080, 44.5133, 1.0), (45.0355, 38.9753, 1.0),
+    (43.1155, 131.8855, 0.6), (52.2870, 104.3050, 0.6), (62.0281, 129.7326, 0.3), (64.5393, 40.5187, 0.3),
+]
+# Доля зданий вне городов (равномерно по территории) и границы территории
+RURAL_SHARE = 0.1
+TERRITORY = (43.0, 68.0, 28.0, 140.0)
+
+RADII_KM = (0.5, 1, 2, 5, 10, 25)
+BBOX_DEGREES = (0.01, 0.05, 0.1, 0.3, 1.0)
+
+
+def random_point(rng: random.Random) -> Tuple[float, float]:
+    """Точка здания: вокруг города (σ ~ 10-20 км) или равномерно по территории"""
+    if rng.random() < RURAL_SHARE:
+        min_lat, max_lat, min_lon, max_lon = TERRITORY
+        return rng.uniform(min_lat, max_lat), rng.uniform(min_lon, max_lon)
+    latitude, longitude, _ = rng.choices(CITIES, weights=[city[2] for city in CITIES])[0]
+    return latitude + rng.gauss(0, 0.12), longitude + rng.gauss(0, 0.2)
+
+
+def random_queries(rng: random.Random, count: int) -> List[Dict[str, Any]]:
+    """Запросы рядом: точки там же, где здания; половина - в радиусе, половина - в области"""
+    queries = []
+    for i in range(count):
+        latitude, longitude = random_point(rng)
+        if i % 2 == 0:
+            queries.append({"kind": "radius", "latitude": latitude, "longitude": longitude,
+                            "radius_km": rng.choice(RADII_KM)})
+        else:
+            size = rng.choice(BBOX_DEGREES)
+            queries.append({"kind": "bbox", "latitude": latitude, "longitude": longitude,
+                            "min_lat": latitude - size / 2, "max_lat": latitude + size / 2,
+                            "min_lon": longitude - size, "max_lon": longitude + size})
+    return queries
+
+
+def query_cells(query: Dict[str, Any]):
+    if query["kind"] == "radius":
+        return geo_cells_for_radius(query["latitude"], query["longitude"], query["radius_km"])
+    return geo_cells_for_bbox(query["min_lat"], query["max_lat"], query["min_lon"], query["max_lon"])
+
+
+def synthetic(args):
+    rng = random.Random(42)
+    sample = min(args.buildings, args.sample)
+    cells = Counter(geo_cell(*random_point(rng)) for _ in range(sample))
+    scale = args.buildings / sample
+    partition_rows = Counter()
+    for cell, count in cells.items():
+        partition_rows[geo_partition(cell)] += count * scale
+
+    print(f"{args.buildings} зданий (выборка {sample}), {len(cells)} непустых ячеек, "
+          f"{len(partition_rows)} непустых секций")
+    sizes = sorted(partition_rows.values())
+    print(f"строк в секции: мин. {sizes[0]:.0f}, медиана {statistics.median(sizes):.0f}, макс. {sizes[-1]:.0f}\n")
+
+    print(f"{'запрос':<8} {'секций (медиана)':>17} {'секций (макс.)':>15} {'доля строк':>11} {'без отбора':>11}")
+    queries = random_queries(rng, args.queries)
+    for kind in ("radius", "bbox"):
+        touched, shares, unpruned = [], [], 0
+        for query in (q for q in queries if q["kind"] == kind):
+            query_cell_list = query_cells(query)
+            if query_cell_list is None:
+                unpruned += 1
+                partitions = set(partition_rows)
+            else:
+                partitions = {geo_partition(cell) for cell in query_cell_list}
+            touched.append(len(partitions))
+            shares.append(sum(partition_rows[p] for p in partitions) / args.buildings)
+        print(
+            f"{kind:<8} {statistics.median(touched):>17.0f} {max(touched):>15} "
+            f"{statistics.mean(shares):>10.1%} {unpruned / len(touched):>10.1%}"
+        )
+
+
+def generate(db, buildings: int) -> None:
+    """Заполнить пустую базу зданиями (распределение как в синтетическом режиме) и организациями"""
+    from sqlalchemy import func, select, text
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+    from app.database import engine
+    from app.models import Building, Organization
+
+    if db.execute(select(func.count()).select_from(Building)).scalar():
+        raise SystemExit("База не пустая: для генерации нужна отдельная пустая база")
+
+    rng = random.Random(42)
+    chunk = 5000
+    organizations = 0
+    for start in range(0, buildings, chunk):
+        building_rows, organization_rows = [], []
+        for i in range(start, min(start + chunk, buildings)):
+            latitude, longitude = random_point(rng)
+            lat, lon = f"{latitude:.6f}", f"{longitude:.6f}"
+            building_rows.append({
+                "id": uuid.uuid4(), "address": f"Сгенерированный адрес {i}", "latitude": lat, "longitude": lon,
+                "coordinates": f"SRID=4326;POINT({lon} {lat})", "geo_cell": geo_cell(lat, lon),
+            })
+        for building in building_rows:
+            for _ in range(rng.randint(0, 4)):
+                organization_rows.append({
+                    "id": uuid.uuid4(), "name": f"ООО \"Организация {organizations}\"",
+                    "building_id": building["id"], "geo_cell": building["geo_cell"],
+                })
+                organizations += 1
+        db.execute(pg_insert(Building).values(building_rows))
+        if organization_rows:
+            db.execute(pg_insert(Organization).values(organization_rows))
+        db.commit()
+        print(f"\r{min(start + chunk, buildings)} / {buildings}", end="", flush=True)
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("ANALYZE"))
+    print(f"\nСгенерировано: {buildings} зданий, {organizations} организаций")
+
+
+def database(args):
+    from sqlalchemy import event
+    from app.database import SessionLocal, engine
+    from app.schemas import PaginationParams
+    from app.services import OrganizationService
+
+    if not settings.geo_partitioning:
+        raise SystemExit("Нужна база с секционированными таблицами и GEO_PARTITIONING=true")
+
+    db = SessionLocal()
+    if args.generate:
+        generate(db, args.buildings)
+
+    captured: List[Tuple[str, Any]] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "count(" in statement:
+            captured.append((statement, parameters))
+
+    def partitions_in_plan(statement, parameters) -> int:
+        cursor = db.connection().connection.cursor()
+        cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+        plan = cursor.fetchone()[0][0]["Plan"]
+        relations, stack = set(), [plan]
+        while stack:
+            node = stack.pop()
+            if node.get("Relation Name", "").startswith(("buildings_p", "organizations_p")):
+                relations.add(node["Relation Name"])
+            stack.extend(node.get("Plans", []))
+        return len(relations)
+
+    pagination = PaginationParams(page=1, size=20)
+    queries = random_queries(random.Random(7), args.queries)
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        print(f"{args.queries} запросов; мс на запрос (медиана), секций в плане (медиана)\n")
+        print(f"{'запрос':<8} {'с отбором':>10} {'без отбора':>11} {'ускорение':>10} {'секций':>7} {'без отбора':>11}")
+        for kind in ("radius", "bbox"):
+            timings = {True: [], False: []}
+            partitions = {True: [], False: []}
+            for i, query in enumerate(q for q in queries if q["kind"] == kind):
+                params = {key: value for key, value in query.items() if key != "kind"}
+                # Порядок чередуется, чтобы прогрев кэша не давал преимущества одному из вариантов
+                for pruning in ((True, False) if i % 2 else (False, True)):
+                    settings.geo_partitioning = pruning
+                    captured.clear()
+                    started = time.perf_counter()
+                    OrganizationService.get_organizations_nearby(db, pagination=pagination, **params)
+                    timings[pruning].append((time.perf_counter() - started) * 1000)
+                    db.rollback()
+                    if captured:
+                        partitions[pruning].append(partitions_in_plan(*captured[0]))
+                    db.rollback()
+            settings.geo_partitioning = True
+            with_pruning, without = statistics.median(timings[True]), statistics.median(timings[False])
+            print(
+                f"{kind:<8} {with_pruning:>10.2f} {without:>11.2f} {without / with_pruning:>9.2f}x "
+                f"{statistics.median(partitions[True] or [0]):>7.0f} {statistics.median(partitions[False] or [0]):>11.0f}"
+            )
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк отбора секций при поиске рядом")
+    parser.add_argument("--buildings", type=int, default=20000000, help="Число зданий")
+    parser.add_argument("--sample", type=int, default=200000, help="Размер выборки зданий (синтетический режим)")
+    parser.add_argument("--queries", type=int, default=2000, help="Число запросов")
+    parser.add_argument("--db", action="store_true", help="Замер на реальной базе данных")
+    parser.add_argument("--generate", action="store_true", help="Заполнить пустую базу (с --db)")
+    args = parser.parse_args()
+
+    if args.db:
+        database(args)
+    else:
+        synthetic(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Затраты CPU на подготовку запросов горячих путей: Query API и lambda_stmt
+
+Синтетический режим (без базы данных): сервисы вызываются с сессией-заглушкой,
+которая для каждого запроса делает то же, что движок SQLAlchemy до обращения
+к драйверу: вычисляет ключ кэша, ищет скомпилированный SQL в кэше и компилирует
+запрос при промахе. Для сравнения те же формы запросов строятся через Query API
+так, как это делали сервисы до перехода на lambda_stmt. Результат - CPU на один
+запрос к эндпоинту (все его SQL-запросы вместе), с кэшем и без него.
+
+Режим --db: те же вызовы выполняются на реальной базе данных, замеряется
+процессорное время (time.process_time, ожидание ответа базы в него не входит).
+
+    python scripts/bench_statement_cache.py --requests 5000
+    python scripts/bench_statement_cache.py --db --requests 500
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from sqlalchemy import and_, func, select, text  # noqa: E402
+from sqlalchemy.dialects import postgresql  # noqa: E402
+from sqlalchemy.orm import Query, joinedload  # noqa: E402
+
+from app.query_guard import explain  # noqa: E402
+from app.models import Activity, Building, Organization, organization_phones  # noqa: E402
+from app.schemas import PaginationParams, normalize_phone  # noqa: E402
+from app.services import OrganizationService  # noqa: E402
+
+PAGINATION = PaginationParams(page=2, size=20)
+POINT = (55.75, 37.62)
+
+
+class FakeResult:
+    """Пустой результат для любого способа чтения"""
+
+    _attributes = {}
+
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+    def one(self):
+        return (self.value,)
+
+    def unique(self):
+        return self
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return []
+
+    def first(self):
+        return None
+
+    def __iter__(self):
+        return iter([])
+
+
+class FakeSession:
+    """
+    Сессия без базы данных: ключ кэша, поиск в кэше и компиляция при промахе
+
+    cache=False - компиляция каждого запроса (как при query_cache_size=0).
+    """
+
+    def __init__(self, cache: bool = True):
+        self.dialect = postgresql.psycopg2.dialect()
+        self.cache = {} if cache else None
+        self.compiled = 0
+
+    def query(self, *entities):
+        return Query(entities, self)
+
+    def execute(self, statement, params=None, execution_options=None):
+        cache_key = statement._generate_cache_key() if self.cache is not None else None
+        key = cache_key.key if cache_key is not None else None
+        if key is None or key not in self.cache:
+            compiled = self.dialect.statement_compiler(self.dialect, statement, cache_key=cache_key)
+            self.compiled += 1
+            if key is not None:
+                self.cache[key] = compiled
+        if type(statement).__name__ == "Explain":
+            return FakeResult([{"Plan": {"Total Cost": 1.0, "Plan Rows": 1}}])
+        return FakeResult(0)
+
+
+def legacy_paginate(db, query):
+    """Пагинация на Query API (как OrganizationService._paginate)"""
+    explain(db, query.enable_eagerloads(False).order_by(None).statement)
+    query.count()
+    query.offset((PAGINATION.page - 1) * PAGINATION.size).limit(PAGINATION.size).all()
+
+
+def legacy_base(db):
+    return db.query(Organization).options(joinedload(Organization.building), joinedload(Organization.activities))
+
+
+# Формы запросов: (Query API как до перехода, текущий сервис)
+SHAPES = {
+    "by_building": (
+        lambda db, a: legacy_paginate(db, legacy_base(db).filter(Organization.building_id == a["id"])),
+        lambda db, a: OrganizationService.get_organizations_by_building(db, a["id"], PAGINATION),
+    ),
+    "by_activity": (
+        lambda db, a: legacy_paginate(
+            db, legacy_base(db).join(Organization.activities).filter(Activity.id == a["id"])
+        ),
+        lambda db, a: OrganizationService.get_organizations_by_activity(db, a["id"], PAGINATION),
+    ),
+    "by_phone": (
+        lambda db, a: legacy_paginate(db, legacy_base(db).filter(Organization.id.in_(
+            select(organization_phones.c.organization_id)
+            .where(organization_phones.c.phone_normalized == normalize_phone(a["phone"]))
+        ))),
+        lambda db, a: OrganizationService.get_organizations_by_phone(db, a["phone"], PAGINATION),
+    ),
+    "search": (
+        lambda db, a: legacy_paginate(db, legacy_base(db).filter(Organization.name.ilike(f"%{a['name']}%"))),
+        lambda db, a: OrganizationService.search_organizations_by_name(db, a["name"], PAGINATION),
+    ),
+    "nearby_radius": (
+        lambda db, a: legacy_paginate(db, legacy_base(db).join(Organization.building).filter(
+            func.ST_DWithin(
+                Building.coordinates,
+                func.ST_SetSRID(func.ST_MakePoint(a["lon"], a["lat"]), 4326),
+                a["radius"] * 1000
+            )
+        )),
+        lambda db, a: OrganizationService.get_organizations_nearby(
+            db, a["lat"], a["lon"], radius_km=a["radius"], pagination=PAGINATION
+        ),
+    ),
+    "nearby_bbox": (
+        lambda db, a: legacy_paginate(db, legacy_base(db).join(Organization.building).filter(
+            and_(
+                text("CAST(buildings.latitude AS NUMERIC) >= :min_lat"),
+                text("CAST(buildings.latitude AS NUMERIC) <= :max_lat"),
+                text("CAST(buildings.longitude AS NUMERIC) >= :min_lon"),
+                text("CAST(buildings.longitude AS NUMERIC) <= :max_lon")
+            )
+        ).params(min_lat=a["lat"] - 0.01, max_lat=a["lat"] + 0.01, min_lon=a["lon"] - 0.02, max_lon=a["lon"] + 0.02)),
+        lambda db, a: OrganizationService.get_organizations_nearby(
+            db, a["lat"], a["lon"], min_lat=a["lat"] - 0.01, max_lat=a["lat"] + 0.01,
+            min_lon=a["lon"] - 0.02, max_lon=a["lon"] + 0.02, pagination=PAGINATION
+        ),
+    ),
+    "by_id": (
+        lambda db, a: legacy_base(db).filter(Organization.id == a["id"]).first(),
+        lambda db, a: OrganizationService.get_organization_by_id(db, a["id"]),
+    ),
+}
+
+
+def request_args(rng_state: int):
+    """Параметры запроса: новые значения на каждый запрос, форма запроса та же"""
+    return {
+        "id": uuid.uuid4(),
+        "phone": f"8 (9{rng_state % 100:02d}) 123-45-{rng_state % 100:02d}",
+        "name": f"Рога {rng_state}",
+        "lat": POINT[0] + (rng_state % 100) / 10000,
+        "lon": POINT[1] + (rng_state % 100) / 10000,
+        "radius": 1.0 + (rng_state % 5) / 10,
+    }
+
+
+def measure(db, call, requests: int, warmup: int = 50):
+    """CPU на запрос (мкс) и время отклика (мкс), медианы по пачкам из 100 запросов"""
+    for i in range(warmup):
+        call(db, request_args(i))
+    cpu, wall = [], []
+    batch = 100
+    for start in range(0, requests, batch):
+        args = [request_args(i) for i in range(start, start + batch)]
+        cpu_started, wall_started = time.process_time(), time.perf_counter()
+        for a in args:
+            call(db, a)
+            if hasattr(db, "rollback"):
+                db.rollback()
+        cpu.append((time.process_time() - cpu_started) / batch)
+        wall.append((time.perf_counter() - wall_started) / batch)
+    return statistics.median(cpu) * 1e6, statistics.median(wall) * 1e6
+
+
+def synthetic(args):
+    print(f"{args.requests} запросов на форму; CPU на запрос, мкс\n")
+    print(f"{'форма':<16} {'Query':>10} {'lambda':>10} {'выигрыш':>9} {'без кэша':>10}  компиляций (Query / lambda)")
+    for name in select_shapes(args):
+        legacy, current = SHAPES[name]
+        legacy_db, current_db, uncached_db = FakeSession(), FakeSession(), FakeSession(cache=False)
+        legacy_cpu, _ = measure(legacy_db, legacy, args.requests)
+        current_cpu, _ = measure(current_db, current, args.requests)
+        uncached_cpu, _ = measure(uncached_db, current, max(100, args.requests // 10))
+        print(
+            f"{name:<16} {legacy_cpu:>10.1f} {current_cpu:>10.1f} {legacy_cpu / current_cpu:>8.2f}x "
+            f"{uncached_cpu:>10.1f}  {legacy_db.compiled} / {current_db.compiled}"
+        )
+
+
+def database(args):
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(f"{args.requests} запросов на форму; мкс на запрос\n")
+        print(f"{'форма':<16} {'CPU Query':>10} {'CPU lambda':>11} {'выигрыш':>9} {'время Query':>12} {'время lambda':>13}")
+        for name in select_shapes(args):
+            legacy, current = SHAPES[name]
+            legacy_cpu, legacy_wall = measure(db, legacy, args.requests)
+            current_cpu, current_wall = measure(db, current, args.requests)
+            print(
+                f"{name:<16} {legacy_cpu:>10.1f} {current_cpu:>11.1f} {legacy_cpu / current_cpu:>8.2f}x "
+                f"{legacy_wall:>12.1f} {current_wall:>13.1f}"
+            )
+    finally:
+        db.close()
+
+
+def select_shapes(args):
+    return [args.shape] if args.shape else list(SHAPES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк подготовки запросов: Query API и lambda_stmt")
+    parser.add_argument("--requests", type=int, default=2000, help="Число запросов на каждую форму")
+    parser.add_argument("--shape", choices=sorted(SHAPES), help="Только одна форма запроса")
+    parser.add_argument("--db", action="store_true", help="Замер на реальной базе данных")
+    args = parser.parse_args()
+
+    if args.db:
+        database(args)
+    else:
+        synthetic(args)
+
+
+if __name__ == "__main__":
+    main()
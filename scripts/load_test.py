@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест: масштабирование пропускной способности с числом воркеров
+
+Для каждого числа воркеров из --workers запускается gunicorn с gunicorn.conf.py
+(WEB_CONCURRENCY=N), после готовности /health клиентские процессы в течение
+--duration секунд отправляют запросы по keep-alive соединениям. Для каждого
+запуска выводятся RPS, задержки p50/p99, доля ошибок и эффективность
+масштабирования относительно одного воркера.
+
+    python scripts/load_test.py --workers 1,2,4 --duration 20 --clients 4 --connections 16
+    python scripts/load_test.py --path /api/organizations/?size=20 --path /api/activities/tree/
+
+Клиентам нужны свободные ядра: при запуске на одной машине с сервером
+результаты ограничены ядрами, занятыми генератором нагрузки.
+"""
+
+import argparse
+import http.client
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, port: int, timeout: float) -> subprocess.Popen:
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{port}")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app.main:app", "-c", "gunicorn.conf.py"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError("gunicorn завершился до готовности")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1):
+                return process
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError(f"сервер не ответил за {timeout} с")
+
+
+def _connection_loop(port, paths, headers, deadline, latencies, errors):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    index = 0
+    while time.perf_counter() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors.append(response.status)
+            latencies.append(time.perf_counter() - started)
+        except (OSError, http.client.HTTPException):
+            errors.append(0)
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    connection.close()
+
+
+def client_process(args):
+    """Клиентский процесс: connections потоков, каждый со своим keep-alive соединением"""
+    port, paths, api_key, duration, connections = args
+    headers = {"X-API-Key": api_key, "Accept-Encoding": "gzip"}
+    deadline = time.perf_counter() + duration
+    latencies, errors = [], []
+    threads = [
+        threading.Thread(target=_connection_loop, args=(port, paths, headers, deadline, latencies, errors))
+        for _ in range(connections)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, len(errors)
+
+
+def run_load(port, paths, api_key, duration, clients, connections):
+    per_client = max(1, connections // clients)
+    with multiprocessing.Pool(clients) as pool:
+        results = pool.map(client_process, [(port, paths, api_key, duration, per_client)] * clients)
+    latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+    errors = sum(client_errors for _, client_errors in results)
+    return latencies, errors
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест с разным числом воркеров")
+    parser.add_argument("--workers", default=f"1,{os.cpu_count()}", help="Числа воркеров через запятую")
+    parser.add_argument("--path", action="append", default=[], help="Путь запроса (можно несколько)")
+    parser.add_argument("--api-key", default=os.environ.get("API_KEY", "your-secret-api-key-here"))
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--warmup", type=float, default=2.0, help="Прогревочная нагрузка перед замером, с")
+    parser.add_argument("--clients", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    paths = args.path or ["/api/activities/tree/"]
+    worker_counts = sorted({int(value) for value in args.workers.split(",")})
+
+    rows = []
+    for workers in worker_counts:
+        port = free_port()
+        process = start_server(workers, port, args.timeout)
+        try:
+            if args.warmup > 0:
+                run_load(port, paths, args.api_key, args.warmup, args.clients, args.connections)
+            latencies, errors = run_load(port, paths, args.api_key, args.duration, args.clients, args.connections)
+        finally:
+            process.terminate()
+            process.wait()
+
+        rps = len(latencies) / args.duration
+        rows.append((workers, rps, percentile(latencies, 0.5), percentile(latencies, 0.99), errors, len(latencies)))
+        print(f"воркеров {workers}: {rps:.0f} RPS", file=sys.stderr)
+
+    base_rps = rows[0][1] / rows[0][0] if rows and rows[0][1] else None
+    print(f"\n{'воркеры':>7} {'RPS':>9} {'p50, мс':>9} {'p99, мс':>9} {'ошибки':>7} {'эффективность':>14}")
+    for workers, rps, p50, p99, errors, total in rows:
+        efficiency = rps / (base_rps * workers) if base_rps else float("nan")
+        print(
+            f"{workers:>7} {rps:>9.0f} {p50 * 1000:>9.1f} {p99 * 1000:>9.1f} "
+            f"{errors / max(total, 1):>7.1%} {efficiency:>14.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import APIRouter, FastAPI
+
+from app import admission
+from app.admission import AdmissionLimiter, admission_dependency
+
+
+def _slow_app() -> FastAPI:
+    """Приложение с синхронным медленным эндпоинтом под admission_dependency"""
+    router = APIRouter(dependencies=[admission_dependency])
+
+    @router.get("/slow")
+    def slow():
+        time.sleep(0.5)
+        return {"ok": True}
+
+    app = FastAPI()
+    app.include_router(router)
+    return app
+
+
+async def _get(app, path: str):
+    """Выполнить GET-запрос к ASGI-приложению, вернуть статус и заголовки"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [],
+        "client": ("test", 1),
+        "server": ("test", 80),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start = messages[0]
+    return start["status"], {name.decode(): value.decode() for name, value in start["headers"]}
+
+
+def test_limit_overflow_gets_503_with_retry_after(monkeypatch):
+    limit = 3
+    monkeypatch.setattr(
+        admission, "admission_limiter", AdmissionLimiter(default_limit=0, limits={"slow": limit}, wait_timeout=0.1)
+    )
+    app = _slow_app()
+
+    async def scenario():
+        return await asyncio.gather(*(_get(app, "/slow") for _ in range(limit + 1)))
+
+    responses = asyncio.run(scenario())
+
+    statuses = sorted(status for status, _ in responses)
+    assert statuses == [200] * limit + [503]
+    rejected = next(headers for status, headers in responses if status == 503)
+    assert rejected["retry-after"] == str(admission.settings.admission_retry_after)
+    stats = admission.admission_limiter.stats()["slow"]
+    assert stats["admitted"] == limit
+    assert stats["rejected"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_waiting_request_is_admitted_after_release():
+    limiter = AdmissionLimiter(default_limit=1, limits={}, wait_timeout=1.0)
+
+    async def scenario():
+        assert await limiter.acquire("route")
+        waiting = asyncio.ensure_future(limiter.acquire("route"))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        limiter.release("route")
+        return await waiting
+
+    assert asyncio.run(scenario()) is True
+
+
+@pytest.mark.parametrize("limits, capacity, expected", [
+    ({"route": 8}, 0, 8),
+    ({"route": 8}, 4, 4),
+    ({"route": 2}, 4, 2),
+    ({"route": 0}, 4, 0),
+    ({}, 4, 4),
+])
+def test_limit_for_is_capped_by_capacity(limits, capacity, expected):
+    limiter = AdmissionLimiter(default_limit=16, limits=limits, wait_timeout=0.1, capacity=capacity)
+    assert limiter.limit_for("route") == expected
+
+
+def test_unlimited_route_is_not_tracked():
+    limiter = AdmissionLimiter(default_limit=0, limits={}, wait_timeout=0.1)
+
+    async def scenario():
+        return [await limiter.acquire("route") for _ in range(100)]
+
+    assert all(asyncio.run(scenario()))
+    assert limiter.stats() == {}
@@ -0,0 +1,108 @@
+import gzip
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app import compression
+from app.compression import CompressedBodyCache, CompressionMiddleware, choose_encoding
+
+LARGE = {"items": [{"name": f"Организация {i}", "phones": ["2-222-222"]} for i in range(200)]}
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip", "gzip"),
+    ("br", "br"),
+    ("gzip, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("GZIP", "gzip"),
+    ("*", "br"),
+    ("*;q=0.5, gzip;q=0.1", "br"),
+    ("gzip;q=0, br;q=0", None),
+    ("*, br;q=0", "gzip"),
+    ("deflate, identity", None),
+    ("gzip;q=abc", None),
+])
+def test_choose_encoding(monkeypatch, accept_encoding, expected):
+    # Для выбора кодирования достаточно признака установленного модуля brotli
+    monkeypatch.setattr(compression, "brotli", object())
+    assert choose_encoding(accept_encoding) == expected
+
+
+def test_choose_encoding_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert choose_encoding("br, gzip;q=0.1") == "gzip"
+    assert choose_encoding("br") is None
+
+
+@pytest.fixture
+def cache():
+    return CompressedBodyCache(maxsize=16, ttl=60)
+
+
+@pytest.fixture
+def client(cache):
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1024, cache=cache)
+
+    @app.get("/large")
+    def large():
+        return JSONResponse(LARGE)
+
+    @app.get("/small")
+    def small():
+        return JSONResponse({"ok": True})
+
+    @app.get("/binary")
+    def binary():
+        return Response(b"\0" * 4096, media_type="image/png")
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b"[", b"1" * 4096, b"]"]), media_type="application/json")
+
+    return TestClient(app)
+
+
+def _get(client, path, accept_encoding):
+    return client.get(path, headers={"Accept-Encoding": accept_encoding})
+
+
+def test_large_json_is_gzipped(client):
+    response = _get(client, "/large", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.json() == LARGE
+
+
+def test_brotli_is_preferred(client):
+    pytest.importorskip("brotli")
+    response = _get(client, "/large", "gzip, br")
+    assert response.headers["content-encoding"] == "br"
+    assert int(response.headers["content-length"]) < len(JSONResponse(LARGE).body)
+
+
+@pytest.mark.parametrize("path, accept_encoding", [
+    ("/small", "gzip"),
+    ("/binary", "gzip"),
+    ("/stream", "gzip"),
+    ("/large", "identity"),
+])
+def test_response_is_passed_through(client, path, accept_encoding):
+    response = _get(client, path, accept_encoding)
+    assert "content-encoding" not in response.headers
+
+
+def test_compressed_body_is_cached(client, cache):
+    first = _get(client, "/large", "gzip")
+    second = _get(client, "/large", "gzip")
+    assert first.content == second.content
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_gzip_is_deterministic():
+    body = JSONResponse(LARGE).body
+    assert compression.compress(body, "gzip") == compression.compress(body, "gzip")
+    assert gzip.decompress(compression.compress(body, "gzip")) == body
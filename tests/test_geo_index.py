@@ -0,0 +1,91 @@
+import math
+import random
+import uuid
+
+import numpy as np
+import pytest
+
+from app.geo_index import EARTH_RADIUS_M, GeoIndex
+
+
+def _haversine_m(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def _index(points, counts=None, cell_degrees=0.01):
+    ids = [uuid.uuid4() for _ in points]
+    return GeoIndex(
+        ids=ids,
+        latitudes=np.array([point[0] for point in points]),
+        longitudes=np.array([point[1] for point in points]),
+        org_counts=np.array(counts if counts is not None else [1] * len(points)),
+        cell_degrees=cell_degrees,
+    ), ids
+
+
+@pytest.fixture(scope="module")
+def city():
+    rng = random.Random(42)
+    points = [(55.75 + rng.gauss(0, 0.05), 37.62 + rng.gauss(0, 0.08)) for _ in range(3000)]
+    index, ids = _index(points)
+    return index, ids, points
+
+
+@pytest.mark.parametrize("latitude, longitude, radius_km", [
+    (55.75, 37.62, 0.5),
+    (55.75, 37.62, 3),
+    (55.70, 37.50, 10),
+    (56.50, 38.00, 1),
+])
+def test_within_radius_matches_brute_force(city, latitude, longitude, radius_km):
+    index, ids, points = city
+    positions = index.within_radius(latitude, longitude, radius_km)
+
+    expected = {
+        building_id for building_id, point in zip(ids, points)
+        if _haversine_m(latitude, longitude, *point) <= radius_km * 1000
+    }
+    assert {index.ids[position] for position in positions} == expected
+    distances = index.distances(positions, latitude, longitude)
+    assert np.all(np.diff(distances) >= 0)
+
+
+def test_within_radius_crosses_antimeridian():
+    index, ids = _index([(0.0, 179.99), (0.0, -179.99), (0.0, 179.0)])
+    found = {index.ids[position] for position in index.within_radius(0.0, 180.0, 5)}
+    assert found == {ids[0], ids[1]}
+
+
+def test_within_bbox_is_sorted_by_distance_from_point(city):
+    index, ids, points = city
+    positions = index.within_bbox(55.74, 55.76, 37.60, 37.64, 55.75, 37.62)
+
+    expected = {
+        building_id for building_id, (lat, lon) in zip(ids, points)
+        if 55.74 <= lat <= 55.76 and 37.60 <= lon <= 37.64
+    }
+    assert {index.ids[position] for position in positions} == expected
+    assert np.all(np.diff(index.distances(positions, 55.75, 37.62)) >= 0)
+
+
+def test_page_splits_organizations_of_buildings():
+    index, ids = _index([(55.75, 37.62 + i * 0.001) for i in range(4)], counts=[3, 0, 2, 4])
+    positions = index.within_radius(55.75, 37.62, 1)
+    order = [index.ids[position] for position in positions]
+    assert order == ids
+
+    assert index.page(positions, 1, 2) == (9, [ids[0]], 0)
+    # Здание без организаций не попадает на страницу
+    assert index.page(positions, 2, 2) == (9, [ids[0], ids[2]], 2)
+    assert index.page(positions, 3, 2) == (9, [ids[2], ids[3]], 1)
+    assert index.page(positions, 5, 2) == (9, [ids[3]], 3)
+    assert index.page(positions, 6, 2) == (9, [], 0)
+
+
+def test_empty_index():
+    index, _ = _index([])
+    positions = index.within_radius(55.75, 37.62, 1)
+    assert len(positions) == 0
+    assert index.page(positions, 1, 20) == (0, [], 0)
@@ -0,0 +1,12 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+def test_get_building_documents_both_response_shapes():
+    schema = TestClient(app).get("/openapi.json").json()
+    response = schema["paths"]["/api/buildings/{building_id}"]["get"]["responses"]["200"]
+    variants = response["content"]["application/json"]["schema"]["anyOf"]
+    assert {variant["$ref"].rsplit("/", 1)[-1] for variant in variants} == {
+        "BuildingResponse", "BuildingWithOrganizationsResponse"
+    }
@@ -0,0 +1,62 @@
+import importlib.util
+import os
+import re
+
+import pytest
+
+from app.models import PHONE_NORMALIZED_SQL
+from app.schemas import normalize_phone
+
+REGEXP_REPLACE = re.compile(r"^regexp_replace\((?P<source>.*?), '(?P<pattern>[^']*)', '(?P<replacement>[^']*)'(?:, '(?P<flags>[a-z]*)')?\)$")
+
+
+def _evaluate_sql(expression: str, phone: str) -> str:
+    """
+    Вычислить выражение из вложенных regexp_replace над колонкой phone
+
+    Используемые шаблоны (классы символов, якоря, квантификаторы, ссылка \\1) в POSIX ARE
+    PostgreSQL и в re совпадают; без флага g заменяется только первое вхождение.
+    """
+    if expression == "phone":
+        return phone
+    match = REGEXP_REPLACE.match(expression)
+    assert match, f"неподдерживаемое выражение: {expression}"
+    source = _evaluate_sql(match["source"], phone)
+    count = 0 if "g" in (match["flags"] or "") else 1
+    return re.sub(match["pattern"], match["replacement"], source, count=count)
+
+
+def _migration_sql() -> str:
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "alembic", "versions", "0005_phone_normalized.py")
+    spec = importlib.util.spec_from_file_location("migration_0005", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.PHONE_NORMALIZED_SQL
+
+
+def test_model_and_migration_use_the_same_expression():
+    assert _migration_sql() == PHONE_NORMALIZED_SQL
+
+
+@pytest.mark.parametrize("phone, expected", [
+    ("8-923-666-13-13", "79236661313"),
+    ("+7 (923) 666-13-13", "79236661313"),
+    ("89236661313", "79236661313"),
+    ("2-222-222", "2222222"),
+    ("3-333-333", "3333333"),
+    ("8-800-555-35-3", "8800555353"),
+    ("8 (800) 555-35-35 доб. 1", "880055535351"),
+    ("", ""),
+    ("нет телефона", ""),
+])
+def test_normalize_phone(phone, expected):
+    assert normalize_phone(phone) == expected
+
+
+@pytest.mark.parametrize("phone", [
+    "8-923-666-13-13", "+7 (923) 666-13-13", "89236661313", "79236661313", "2-222-222",
+    "8", "88", "8-800-555-35-3", "8 (800) 555-35-35 доб. 1", "+8 923 666 13 13",
+    "008-923-666-13-13", "8923666131", "892366613131", "", "нет телефона", "8\n9236661313",
+])
+def test_normalize_phone_matches_generated_column(phone):
+    assert normalize_phone(phone) == _evaluate_sql(PHONE_NORMALIZED_SQL, phone)
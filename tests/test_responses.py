@@ -0,0 +1,54 @@
+import msgpack
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.responses import ContentNegotiationMiddleware, NegotiatedResponse, negotiate_format
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("application/msgpack", "msgpack"),
+    ("application/x-msgpack", "msgpack"),
+    ("application/vnd.msgpack", "msgpack"),
+    ("Application/MsgPack", "msgpack"),
+    ("application/json", "json"),
+    ("*/*", "json"),
+    ("text/html", "json"),
+    ("", "json"),
+    # При равном приоритете побеждает тип, указанный раньше
+    ("application/msgpack, application/json", "msgpack"),
+    ("application/json, application/msgpack", "json"),
+    # q-параметры
+    ("application/json;q=0.5, application/msgpack", "msgpack"),
+    ("application/msgpack;q=0.5, application/json;q=0.9", "json"),
+    ("application/msgpack; q=0.9, */*; q=0.1", "msgpack"),
+    ("application/msgpack;q=0", "json"),
+    ("application/msgpack;q=abc, application/json;q=0.1", "json"),
+])
+def test_negotiate_format(accept, expected):
+    assert negotiate_format(accept) == expected
+
+
+@pytest.fixture(scope="module")
+def client():
+    app = FastAPI(default_response_class=NegotiatedResponse)
+    app.add_middleware(ContentNegotiationMiddleware)
+
+    @app.get("/item")
+    def item():
+        return {"name": "Склад", "phones": ["2-222-222"]}
+
+    return TestClient(app)
+
+
+def test_response_in_msgpack(client):
+    response = client.get("/item", headers={"Accept": "application/msgpack"})
+    assert response.headers["content-type"] == "application/msgpack"
+    assert response.headers["vary"] == "Accept"
+    assert msgpack.unpackb(response.content) == {"name": "Склад", "phones": ["2-222-222"]}
+
+
+def test_response_in_json_by_default(client):
+    response = client.get("/item")
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == {"name": "Склад", "phones": ["2-222-222"]}
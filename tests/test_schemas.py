@@ -0,0 +1,100 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from app.auth import verify_api_key
+from app.main import app
+from app.responses import render
+from app.schemas import (
+    BUILDING_FIELDS, ORGANIZATION_FIELDS, BuildingPartialResponse, OrganizationBulkRequest, OrganizationCreate,
+    parse_fields
+)
+
+
+def _organization(**overrides):
+    data = {
+        "name": 'ООО "Рога и Копыта"',
+        "building_id": str(uuid.uuid4()),
+        "phones": ["2-222-222"],
+        "activity_ids": [],
+    }
+    data.update(overrides)
+    return data
+
+
+@pytest.mark.parametrize("overrides, field", [
+    ({"name": "x" * 301}, "name"),
+    ({"phones": ["2-222-222", "8" * 21]}, "phones"),
+])
+def test_organization_rejects_values_longer_than_columns(overrides, field):
+    with pytest.raises(ValidationError) as error:
+        OrganizationCreate(**_organization(**overrides))
+    assert error.value.errors()[0]["loc"][0] == field
+
+
+def test_organization_accepts_values_at_column_limits():
+    organization = OrganizationCreate(**_organization(name="x" * 300, phones=["8" * 20]))
+    assert len(organization.name) == 300
+
+
+def test_bulk_request_reports_invalid_item_position():
+    app.dependency_overrides[verify_api_key] = lambda: True
+    try:
+        response = TestClient(app).post("/api/organizations/bulk", json={"items": [
+            _organization(), _organization(name="x" * 301), _organization(phones=["8" * 21]),
+        ]})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 422
+    locations = sorted(tuple(error["loc"][:4]) for error in response.json()["detail"])
+    assert locations == [("body", "items", 1, "name"), ("body", "items", 2, "phones")]
+
+
+def test_bulk_request_validates_items_independently():
+    with pytest.raises(ValidationError) as error:
+        OrganizationBulkRequest(items=[_organization(name="x" * 301), _organization()])
+    assert [item["loc"][:2] for item in error.value.errors()] == [("items", 0)]
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None),
+    ("name", {"id", "name"}),
+    ("name,phones", {"id", "name", "phones"}),
+    (" name , phones ,", {"id", "name", "phones"}),
+    ("id", {"id"}),
+    ("", {"id"}),
+    ("name,name", {"id", "name"}),
+])
+def test_parse_fields(value, expected):
+    assert parse_fields(value, ORGANIZATION_FIELDS) == (frozenset(expected) if expected is not None else None)
+
+
+@pytest.mark.parametrize("value", ["address", "name,bogus", "Name"])
+def test_parse_fields_rejects_unknown_fields(value):
+    with pytest.raises(ValueError, match="Неизвестные поля"):
+        parse_fields(value, ORGANIZATION_FIELDS)
+
+
+def test_partial_response_contains_only_selected_fields():
+    building = SimpleNamespace(
+        id=uuid.uuid4(), address="ул. Ленина 1", latitude="55.75", longitude="37.62", coordinates="POINT(37.62 55.75)"
+    )
+    response = render(
+        BuildingPartialResponse.from_building(building, parse_fields("address", BUILDING_FIELDS)), exclude_unset=True
+    )
+    assert response.body == f'{{"id":"{building.id}","address":"ул. Ленина 1"}}'.encode()
+
+
+def test_unknown_field_is_rejected_before_querying():
+    app.dependency_overrides[verify_api_key] = lambda: True
+    try:
+        response = TestClient(app).get("/api/buildings/", params={"fields": "address,bogus"})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 400
+    assert "bogus" in response.json()["detail"]
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.singleflight import SingleFlight
+
+
+def _slow(value, started: threading.Event, delay: float = 0.2):
+    started.set()
+    time.sleep(delay)
+    return value
+
+
+def test_concurrent_calls_are_coalesced():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        def load():
+            calls.append(1)
+            time.sleep(0.1)
+            return "tree"
+
+        results = await asyncio.gather(*(flight.do(("tree",), load) for _ in range(5)))
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(scenario())
+    assert results == ["tree"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"executed": 1, "coalesced": 4, "errors": 0, "in_flight": 0}
+
+
+def test_error_is_shared_with_followers():
+    async def scenario():
+        flight = SingleFlight()
+
+        def fail():
+            time.sleep(0.1)
+            raise ValueError("boom")
+
+        return flight, await asyncio.gather(flight.do("k", fail), flight.do("k", fail), return_exceptions=True)
+
+    flight, results = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.stats()["errors"] == 1
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_leader_cancellation_does_not_fail_followers():
+    async def scenario():
+        flight = SingleFlight()
+        started = threading.Event()
+        leader = asyncio.ensure_future(flight.do("k", _slow, "result", started))
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(flight.do("k", _slow, "other", started))
+        await asyncio.sleep(0.01)
+
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return flight, await follower
+
+    flight, result = asyncio.run(scenario())
+    assert result == "result"
+    assert flight.stats() == {"executed": 1, "coalesced": 1, "errors": 0, "in_flight": 0}
+
+
+def test_cancelled_leader_waits_for_call_to_finish():
+    async def scenario():
+        flight = SingleFlight()
+        started = threading.Event()
+        finished = []
+
+        def load():
+            started.set()
+            time.sleep(0.2)
+            finished.append(True)
+
+        leader = asyncio.ensure_future(flight.do("k", load))
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return finished
+
+    # Сессия ведущего запроса закрывается после его отмены - к этому моменту вызов завершён
+    assert asyncio.run(scenario()) == [True]
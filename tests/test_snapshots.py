@@ -0,0 +1,83 @@
+import uuid
+
+from app.snapshots import TABLE_COLUMNS, _pack, _rows_by_id, _unpack, compute_delta
+
+
+def _id():
+    return uuid.uuid4().bytes
+
+
+def _snapshot(version, buildings=(), activities=(), organizations=()):
+    """Снимок в колоночном виде из списков строк (порядок колонок - TABLE_COLUMNS)"""
+    snapshot = {"format": 1, "version": version}
+    for table, rows in (("buildings", buildings), ("activities", activities), ("organizations", organizations)):
+        columns = TABLE_COLUMNS[table]
+        snapshot[table] = {column: [row[i] for row in rows] for i, column in enumerate(columns)}
+    return snapshot
+
+
+def _apply(snapshot, delta):
+    """Применить дельту к снимку так, как это делает клиент: строки по ID"""
+    result = {}
+    for table, columns in TABLE_COLUMNS.items():
+        rows = _rows_by_id(snapshot[table], columns)
+        for row_id in delta[table]["delete"]:
+            del rows[row_id]
+        rows.update(_rows_by_id(delta[table]["upsert"], columns))
+        result[table] = rows
+    return result
+
+
+def _rows(snapshot):
+    return {table: _rows_by_id(snapshot[table], columns) for table, columns in TABLE_COLUMNS.items()}
+
+
+def test_delta_contains_changed_rows_and_deleted_ids():
+    kept, moved, removed, added = _id(), _id(), _id(), _id()
+    root, child = _id(), _id()
+    org_kept, org_changed, org_removed = _id(), _id(), _id()
+
+    old = _snapshot(
+        10,
+        buildings=[(kept, "ул. Ленина 1", 55.75, 37.62), (moved, "ул. Блюхера 32", 56.84, 60.65),
+                   (removed, "ул. Мира 5", 55.0, 37.0)],
+        activities=[(root, "Еда", None, 1), (child, "Молочная продукция", root, 2)],
+        organizations=[(org_kept, "Рога и Копыта", kept, ["2-222-222"], [child]),
+                       (org_changed, "Молоко", kept, ["3-333-333"], [child]),
+                       (org_removed, "Закрытая", removed, [], [])],
+    )
+    new = _snapshot(
+        12,
+        buildings=[(kept, "ул. Ленина 1", 55.75, 37.62), (moved, "ул. Блюхера 32", 56.85, 60.65),
+                   (added, "ул. Новая 1", 54.0, 36.0)],
+        activities=[(root, "Еда", None, 1), (child, "Молочная продукция", root, 2)],
+        organizations=[(org_kept, "Рога и Копыта", kept, ["2-222-222"], [child]),
+                       (org_changed, "Молоко", moved, ["3-333-333", "8-800-000"], [child])],
+    )
+
+    delta = compute_delta(old, new)
+    assert (delta["from_version"], delta["to_version"]) == (10, 12)
+    assert delta["buildings"]["upsert"]["id"] == [moved, added]
+    assert delta["buildings"]["delete"] == [removed]
+    assert delta["activities"] == {"upsert": {column: [] for column in TABLE_COLUMNS["activities"]}, "delete": []}
+    assert delta["organizations"]["upsert"]["id"] == [org_changed]
+    assert delta["organizations"]["delete"] == [org_removed]
+    assert _apply(old, delta) == _rows(new)
+
+
+def test_delta_survives_serialization():
+    building = _id()
+    old = _snapshot(1, buildings=[(building, "ул. Ленина 1", 55.75, 37.62)])
+    new = _snapshot(2, buildings=[(building, "ул. Ленина 1", 55.75, 37.62), (_id(), "ул. Мира 5", 55.0, 37.0)],
+                    organizations=[(_id(), "Рога и Копыта", building, ["2-222-222"], [])])
+
+    delta = _unpack(_pack(compute_delta(old, new)))
+    assert _apply(_unpack(_pack(old)), delta) == _rows(_unpack(_pack(new)))
+
+
+def test_delta_between_equal_snapshots_is_empty():
+    snapshot = _snapshot(5, buildings=[(_id(), "ул. Ленина 1", 55.75, 37.62)])
+    delta = compute_delta(snapshot, snapshot)
+    for table in TABLE_COLUMNS:
+        assert delta[table]["delete"] == []
+        assert all(values == [] for values in delta[table]["upsert"].values())